@@ -1,66 +1,141 @@
 """Creates a Flask app that provides the backend for the musicCRS application.
 
-The app coordinates the current playlist, as well as the endpoints of the app
-and the reloading for the frontend.
+The app exposes the PlaylistService (which holds the current playlist) over
+HTTP, for the frontend and for agents running in a separate process.
 
 To run execute the following command from the root directory:
 
 `python -m musicCrs.backend.app`
 """
 
-import os
-import random
-from typing import List, Tuple, Union
+import gzip
+import json
+import time
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 
-from musicCRS.data import database_manager
-from musicCRS.data import recommendations as rec
-from musicCRS.models.playlist import Playlist
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is used without it
+    brotli = None
+
+from musicCRS import config, log, metrics
+from musicCRS.backend.jobs import Job
+from musicCRS.backend.playlist_service import get_default_service
 from musicCRS.models.song import Song
-from musicCRS.nlu import mappings, post_processing
 
-DB_PATH = os.path.abspath("data/final_database.db")
+log.setup_logging()
 
 app = Flask(__name__)
 CORS(app)
 
-# Populate playlist initially with some songs
-playlist = Playlist("My Playlist")
+# The state of the backend (playlist, suggestions and recommendations)
+service = get_default_service()
+if config.PRELOAD_RESOURCES:
+    service.resources.warm_up()
+
+REQUEST_SECONDS = metrics.histogram(
+    "musiccrs_http_request_duration_seconds",
+    "Duration of the requests of the backend by route.",
+    ["route", "method"],
+)
+REQUESTS = metrics.counter(
+    "musiccrs_http_requests_total",
+    "Requests of the backend by route and status code.",
+    ["route", "method", "status"],
+)
+metrics.ACTIVE_SESSIONS.set_function(service.events.session_count, kind="events")
+
+
+@app.before_request
+def start_timer():
+    """Remembers when the request started."""
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response: Response) -> Response:
+    """Records the latency and the status code of the request."""
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - g.request_start, route=route, method=request.method
+    )
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Returns the status of the shared resources.
+
+    The status code is 503 if a check fails, so it can be used as a
+    readiness probe.
+    """
+    body = service.resources.health()
+    return jsonify(body), 200 if body["status"] == "ok" else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Returns the metrics of the backend in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+
+def conditional_response(view: str) -> Response:
+    """Returns a rendered view of the service, or 304 if the client has it.
+
+    The response carries an ETag. A client that sends it back in
+    `If-None-Match` gets an empty 304 response while the view is unchanged.
+
+    Args:
+        view: Name of the view, see `PlaylistService.render`.
+    """
+    etag, payload = service.render(view)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(payload, status=200, mimetype="application/json")
+    response.set_etag(etag)
+    # The client may cache the response, but has to revalidate it every time
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def compressed_response(body: bytes, status: int = 200) -> Response:
+    """Creates a JSON response, compressed if the client accepts it.
+
+    Brotli is preferred if it is installed, otherwise gzip is used. Bodies
+    smaller than `config.COMPRESS_MIN_BYTES` are sent as they are.
 
-suggestions = Playlist("Suggestions")
-# suggestions.add_song(Song(track_name="Yesterday", artist_0="The Beatles"))
-# suggestions.add_song(Song(track_name="Hey Jude", artist_0="The Beatles"))
+    Args:
+        body: The encoded JSON body.
+        status (optional): HTTP status code. Defaults to 200.
+    """
+    encoding = None
+    if len(body) >= config.COMPRESS_MIN_BYTES:
+        if brotli is not None and "br" in request.accept_encodings:
+            encoding, body = "br", brotli.compress(body)
+        elif "gzip" in request.accept_encodings:
+            encoding, body = "gzip", gzip.compress(body, compresslevel=5)
 
-recommendations = Playlist("Recommendations")
-# recommendations.add_song(Song(track_name="Let It Be", artist_0="The Beatles"))
+    response = Response(body, status=status, mimetype="application/json")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
 
 
 @app.route("/songs", methods=["GET"])
 def get_songs():
     """Returns the playlist as strings, one for each song."""
-    # Usa il metodo __str__ per ogni oggetto Song
-    playlist_strings = [str(song) for song in playlist.songs]
-    return jsonify(playlist_strings)
+    return conditional_response("songs")
 
 
 @app.route("/suggestions", methods=["GET"])
 def get_suggestions():
     """Returns the suggestions as strings with an indication if they are in the playlist."""
-
-    playlist_track_ids = {song.track_id for song in playlist.songs}
-
-    suggestions_data = []
-    for song in suggestions.songs:
-        suggestion_entry = {
-            "message": str(song),
-            "disabled": song.track_id
-            in playlist_track_ids,  # Disable the button if the song is in the playlist
-        }
-        suggestions_data.append(suggestion_entry)
-
-    return jsonify(suggestions_data), 200
+    return conditional_response("suggestions")
 
 
 @app.route("/recommendations", methods=["GET"])
@@ -70,98 +145,51 @@ def get_recommendations():
 
     It is called from the `index.html` file to update the recommendations list.
     """
+    return conditional_response("recommendations")
 
-    playlist_track_ids = {song.track_id for song in playlist.songs}
 
-    recommendations_data = []
-    for song in recommendations.songs:
-        recommendation_entry = {
-            "message": str(song),
-            "disabled": song.track_id
-            in playlist_track_ids,  # Disable the button if the song is in the playlist
-        }
-        recommendations_data.append(recommendation_entry)
+@app.route("/events", methods=["GET"])
+def events():
+    """Streams the changes of the playlists as Server-Sent Events.
 
-    return jsonify(recommendations_data), 200
+    The stream starts with a snapshot of all lists, followed by small diff
+    events (added, removed, reordered, cleared, replaced). All streams receive
+    all changes, as the backend serves one playlist shared by all clients. The
+    optional `session` query parameter groups the streams of one user in the
+    count of active sessions.
+    """
+    subscription = service.events.subscribe(request.args.get("session"))
+    stream = service.events.stream(
+        subscription, service.snapshot, heartbeat=config.EVENTS_HEARTBEAT
+    )
+    response = Response(stream_with_context(stream), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Keeps reverse proxies from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 @app.route("/add_song", methods=["POST"])
 def add_song():
     """Adds a new song to the playlist."""
     data = request.get_json()
+    body, status = service.add_song(Song.deserialize(data))
+    return jsonify(body), status
 
-    # Extract song data from the request
-    new_song = Song(
-        album_id=data.get("album_id"),
-        album_name=data.get("album_name"),
-        album_popularity=data.get("album_popularity"),
-        album_type=data.get("album_type"),
-        artists=data.get("artists"),
-        artist_0=data.get("artist_0"),
-        artist_1=data.get("artist_1"),
-        artist_2=data.get("artist_2"),
-        artist_3=data.get("artist_3"),
-        artist_4=data.get("artist_4"),
-        artist_id=data.get("artist_id"),
-        duration_sec=data.get("duration_sec"),
-        label=data.get("label"),
-        release_date=data.get("release_date"),
-        total_tracks=data.get("total_tracks"),
-        track_id=data.get("track_id"),
-        track_name=data.get("track_name"),
-        track_number=data.get("track_number"),
-        artist_genres=data.get("artist_genres"),
-        artist_popularity=data.get("artist_popularity"),
-        followers=data.get("followers"),
-        name=data.get("name"),
-        genre_0=data.get("genre_0"),
-        genre_1=data.get("genre_1"),
-        genre_2=data.get("genre_2"),
-        genre_3=data.get("genre_3"),
-        genre_4=data.get("genre_4"),
-        acousticness=data.get("acousticness"),
-        analysis_url=data.get("analysis_url"),
-        danceability=data.get("danceability"),
-        duration_ms=data.get("duration_ms"),
-        energy=data.get("energy"),
-        instrumentalness=data.get("instrumentalness"),
-        key=data.get("key"),
-        liveness=data.get("liveness"),
-        loudness=data.get("loudness"),
-        mode=data.get("mode"),
-        speechiness=data.get("speechiness"),
-        tempo=data.get("tempo"),
-        time_signature=data.get("time_signature"),
-        track_href=data.get("track_href"),
-        track_type=data.get("track_type"),
-        uri=data.get("uri"),
-        valence=data.get("valence"),
-        explicit=data.get("explicit"),
-        track_popularity=data.get("track_popularity"),
-        release_year=data.get("release_year"),
-        release_month=data.get("release_month"),
-        rn=data.get("rn"),
-    )
 
-    # Add the song to the playlist
-    result = playlist.add_song(new_song)
-    if result == -1:
-        return (
-            jsonify(
-                {
-                    "error": f"'{data.get('track_name')}' by {data.get('artist_0')} is already in the playlist"
-                }
-            ),
-            401,
-        )
-    return (
-        jsonify(
-            {
-                "message": f"'{data.get('track_name')}' by {data.get('artist_0')} added to the playlist"
-            }
-        ),
-        201,
-    )
+@app.route("/add_song_by_id", methods=["POST"])
+def add_song_by_id():
+    """Adds the song with the given track id to the playlist.
+
+    The song is looked up in the catalog, so the request only carries the
+    track id instead of all attributes of the song.
+    """
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid data format. Expected a track_id."}), 400
+
+    body, status = service.add_song_by_id(data.get("track_id"))
+    return jsonify(body), status
 
 
 @app.route("/add_suggestions", methods=["POST"])
@@ -172,321 +200,132 @@ def add_suggestions():
     if not isinstance(data, list):
         return jsonify({"error": "Invalid data format. Expected a list of songs."}), 400
 
-    results = []
-    suggestions.clear()  # clear suggestions
-
-    for song_data in data:
-        new_song = Song(
-            album_id=song_data.get("album_id"),
-            album_name=song_data.get("album_name"),
-            album_popularity=song_data.get("album_popularity"),
-            album_type=song_data.get("album_type"),
-            artists=song_data.get("artists"),
-            artist_0=song_data.get("artist_0"),
-            artist_1=song_data.get("artist_1"),
-            artist_2=song_data.get("artist_2"),
-            artist_3=song_data.get("artist_3"),
-            artist_4=song_data.get("artist_4"),
-            artist_id=song_data.get("artist_id"),
-            duration_sec=song_data.get("duration_sec"),
-            label=song_data.get("label"),
-            release_date=song_data.get("release_date"),
-            total_tracks=song_data.get("total_tracks"),
-            track_id=song_data.get("track_id"),
-            track_name=song_data.get("track_name"),
-            track_number=song_data.get("track_number"),
-            artist_genres=song_data.get("artist_genres"),
-            artist_popularity=song_data.get("artist_popularity"),
-            followers=song_data.get("followers"),
-            name=song_data.get("name"),
-            genre_0=song_data.get("genre_0"),
-            genre_1=song_data.get("genre_1"),
-            genre_2=song_data.get("genre_2"),
-            genre_3=song_data.get("genre_3"),
-            genre_4=song_data.get("genre_4"),
-            acousticness=song_data.get("acousticness"),
-            analysis_url=song_data.get("analysis_url"),
-            danceability=song_data.get("danceability"),
-            duration_ms=song_data.get("duration_ms"),
-            energy=song_data.get("energy"),
-            instrumentalness=song_data.get("instrumentalness"),
-            key=song_data.get("key"),
-            liveness=song_data.get("liveness"),
-            loudness=song_data.get("loudness"),
-            mode=song_data.get("mode"),
-            speechiness=song_data.get("speechiness"),
-            tempo=song_data.get("tempo"),
-            time_signature=song_data.get("time_signature"),
-            track_href=song_data.get("track_href"),
-            track_type=song_data.get("track_type"),
-            uri=song_data.get("uri"),
-            valence=song_data.get("valence"),
-            explicit=song_data.get("explicit"),
-            track_popularity=song_data.get("track_popularity"),
-            release_year=song_data.get("release_year"),
-            release_month=song_data.get("release_month"),
-            rn=song_data.get("rn"),
+    new_songs = [Song.deserialize(song_data) for song_data in data]
+    body, status = service.add_suggestions(new_songs)
+    return jsonify(body), status
+
+
+@app.route("/add_suggestions_by_ids", methods=["POST"])
+def add_suggestions_by_ids():
+    """Replaces the suggestions with the songs with the given track ids."""
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid data format. Expected track_ids."}), 400
+
+    body, status = service.add_suggestions_by_ids(data.get("track_ids"))
+    return jsonify(body), status
+
+
+def wants_background_job() -> bool:
+    """Checks whether the client asked to run the request as a job.
+
+    Either with the header `Prefer: respond-async` or the query parameter
+    `async=1`.
+    """
+    prefer = request.headers.get("Prefer", "")
+    return "respond-async" in prefer or request.args.get("async") in ("1", "true")
+
+
+def job_response(job: Job):
+    """Answers a request that is run as a job.
+
+    If the client asked for a background job, it gets 202 with the id of the
+    job to poll at `/jobs/<id>`. Otherwise the request waits for the job.
+    """
+    if wants_background_job():
+        response = jsonify(
+            {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
         )
+        response.status_code = 202
+        response.headers["Location"] = f"/jobs/{job.id}"
+        return response
 
-        result = suggestions.add_song(new_song)
-        if result == -1:
-            results.append(
-                {
-                    "error": f"'{song_data.get('track_name')}' by {song_data.get('artist_0')} is already in suggestions"
-                }
-            )
-        else:
-            results.append(
-                {
-                    "message": f"'{song_data.get('track_name')}' by {song_data.get('artist_0')} added to suggestions"
-                }
-            )
-    suggestions.songs.sort(
-        key=lambda song: (
-            song.track_popularity if song.track_popularity is not None else 0
-        ),
-        reverse=True,
-    )
-    return jsonify(results), 201
+    service.jobs.wait(job)
+    return jsonify(job.body), job.status_code
 
 
 @app.route("/create_playlist", methods=["POST"])
 def create_entire_playlist():
-    """Adds multiple songs to the playlist."""
+    """Replaces the playlist with songs that match the description."""
     data = request.get_json()
-
-    # Extract the parameters from the request
-    valence = mappings.VALENCE_MAPPING[post_processing.extract_valence(data)]
-    energy = mappings.ENERGY_MAPPING[post_processing.extract_energy(data)]
-    danceability = mappings.DANCEABILITY_MAPPING[
-        post_processing.extract_danceability(data)
-    ]
-    tempo = mappings.TEMPO_MAPPING[post_processing.extract_tempo(data)]
-    genres = post_processing.extract_genres(data)
-    duration = post_processing.extract_duration(data)
-
-    # Query the database
-    db_manager = database_manager.DatabaseManager(DB_PATH)
-    playlist.clear()
-    playlist.songs = db_manager.query_songs_for_playlist_generation(
-        tempo, danceability, valence, energy, genres, duration
-    )
-
-    results = []
-    return jsonify(results), 201
+    return job_response(service.create_playlist_job(data))
 
 
 @app.route("/add_recommendations", methods=["GET"])
 def add_recommendations():
     """Adds multiple songs to the recommendations list."""
+    return job_response(service.add_recommendations_job())
 
-    track_ids = [song.track_id for song in playlist.songs]
-    db_path = os.path.abspath(
-        os.path.join(os.path.dirname(__file__), "../data/final_database.db")
-    )
-
-    # Get recommendations
-    recommendation_ids = rec.get_recommendations(
-        db_path=db_path, playlist_track_ids=track_ids
-    )
 
-    # Fetch song data from the database using track ids
-    db_manager = database_manager.DatabaseManager(db_path)
-    recommendation_songs = db_manager.fetch_songs_by_track_ids(recommendation_ids)
-
-    results = []
-    recommendations.clear()  # clear suggestions
-
-    for song in recommendation_songs:
-        result = recommendations.add_song(song)
-        if result == -1:
-            results.append(
-                {
-                    "error": f"'{song.track_name}' by {song.artist_0} is already in suggestions"
-                }
-            )
-        else:
-            results.append(
-                {
-                    "message": f"'{song.track_name}' by {song.artist_0} added to suggestions"
-                }
-            )
-    # recommendations.songs.sort(
-    #     key=lambda song: (
-    #         song.track_popularity if song.track_popularity is not None else 0
-    #     ),
-    #     reverse=True,
-    # )
-    return jsonify(results), 201
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id: str):
+    """Returns the status and, once finished, the result of a job."""
+    body, status = service.get_job(job_id)
+    return jsonify(body), status
 
 
 @app.route("/delete_song", methods=["DELETE"])
 def delete_song():
     """Delete a song from the playlist by track name."""
     data = request.get_json()
-    track_name = data.get("track_name")
-
-    if not track_name:
-        return jsonify({"error": "track_name is required"}), 400
-
-    result = playlist.remove_song(track_name)
-
-    if result == -1:
-        db_path = os.path.abspath(
-            os.path.join(os.path.dirname(__file__), "../data/final_database.db")
-        )
-        db_manager = database_manager.DatabaseManager(db_path)
-
-        results_db = db_manager.fetch_transformed_song_name(track_name)
-
-        if results_db is None:
-            return jsonify({"error": "The song is not in the playlist"}), 401
-
-        for song_name in results_db:
-            result = playlist.remove_song(song_name[0])
-
-            if result != -1:
-                break
-
-        if result == -1:  # Still not found
-            return (jsonify({"error": "The song is not in the playlist"}), 401)
-
-    return (
-        jsonify({"message": f"'{track_name}' has been removed from the playlist"}),
-        200,
-    )
+    body, status = service.delete_song(data.get("track_name"))
+    return jsonify(body), status
 
 
 @app.route("/delete_songs_by_positions", methods=["DELETE"])
 def delete_songs():
     """Delete songs from the playlist by positions."""
     data = request.get_json()
-    positions = data.get("positions")
+    body, status = service.delete_songs_by_positions(data.get("positions"))
+    return jsonify(body), status
 
-    if not positions:
-        return jsonify({"error": "track_name is required"}), 400
 
-    result = playlist.remove_songs_by_positions(positions)
+@app.route("/state", methods=["GET"])
+def get_state():
+    """Returns the playlist, the suggestions and the recommendations at once.
 
-    if result == -1:
-        return (jsonify({"error": "These positions are not available"}), 401)
-
-    return (
-        jsonify(
-            {
-                "message": f"Songs in positions:'{positions}' has been removed from the playlist"
-            }
-        ),
-        200,
+    Query parameters:
+        fields: Comma-separated lists to return. Defaults to all of them.
+        limit: Maximum number of entries per list.
+        cursor: The `next_cursor` of the previous page.
+    """
+    fields = request.args.get("fields")
+    limit = request.args.get("limit", config.STATE_PAGE_SIZE, type=int)
+    body, status = service.get_state(
+        fields=fields.split(",") if fields else None,
+        cursor=request.args.get("cursor"),
+        limit=min(limit, config.STATE_MAX_PAGE_SIZE),
     )
+    return compressed_response(json.dumps(body, separators=(",", ":")).encode(), status)
 
 
 @app.route("/songs_string", methods=["GET"])
 def get_songs_as_string():
     """Returns all songs in a single string, separated by a delimiter."""
-    # Uses the __str__ method for each Song object
-    songs_string = " // ".join([str(song) for song in playlist.songs])
-    return songs_string, 200
+    return service.get_songs_string(), 200
 
 
 @app.route("/clear_playlist", methods=["DELETE"])
 def clear_playlist():
     """Delete all songs from the playlist."""
-    playlist.clear()  # Clear the playlist
-    return jsonify({"message": "All songs have been removed from the playlist"}), 200
-
-
-def parse_song_string(song_str: str) -> Tuple[Union[str, None], List[str]]:
-    """Parses a song string to extract the track name and artists.
-
-    Args:
-        song_str: String of the song with the format
-          "<song_name> by <artist_name_1>, <artist_name_2>, ..."
-
-    Returns:
-        A tuple consisting of the track name and a list of artists. Or None if
-        the song string is not in the correct format.
-    """
-    if " by " not in song_str:
-        return None, []
-    track_name, artists_str = song_str.split(" by ", 1)
-    artists = [artist.strip() for artist in artists_str.split(",")]
-    return track_name.strip(), artists
+    body, status = service.clear_playlist()
+    return jsonify(body), status
 
 
 @app.route("/add_to_playlist", methods=["POST"])
 def add_to_playlist():
     """Adds a song from the suggestions to the playlist."""
     data = request.get_json()
-    song_str = data.get("song")
-
-    track_name, artists = parse_song_string(song_str)
-
-    if not track_name or not artists:
-        return jsonify({"error": "Invalid song format"}), 400
-
-    song = suggestions.find_song(track_name, artists)
-    if song:
-        suggestions.remove_song(track_name, artists)
-        playlist.add_song(song)
-
-        suggestions.songs.clear()
-
-        return (
-            jsonify({"message": "Song moved to playlist and suggestions cleared"}),
-            200,
-        )
-    else:
-        return jsonify({"error": "Song not found in suggestions"}), 404
+    body, status = service.add_to_playlist(data.get("song"))
+    return jsonify(body), status
 
 
 @app.route("/add_recommendation_to_playlist", methods=["POST"])
 def add_recommendation_to_playlist():
     """Adds songs in the recommendations to the playlist."""
     data = request.get_json()
-    songs_data = data.get("songs")  # Lista di canzoni da aggiungere alla playlist
-
-    if not songs_data:
-        return jsonify({"error": "No songs provided"}), 400
-
-    added_songs = []  # Lista per tracciare le canzoni aggiunte
-    not_found_songs = []  # Lista per tracciare le canzoni non trovate
-
-    for song_str in songs_data:
-        track_name, artists = parse_song_string(song_str)
-
-        if not track_name or not artists:
-            not_found_songs.append(song_str)
-            continue
-
-        # Trova la canzone nelle raccomandazioni
-        song = recommendations.find_song(track_name, artists)
-        if song:
-            recommendations.remove_song(track_name, artists)
-            playlist.add_song(song)
-            added_songs.append(song)
-        else:
-            not_found_songs.append(song_str)
-
-    if added_songs:
-        # Se almeno una canzone è stata aggiunta alla playlist
-        response_message = f"{len(added_songs)} recommendations added to the playlist"
-    else:
-        # Se nessuna canzone è stata trovata o aggiunta
-        response_message = "No valid songs found to add to the playlist"
-
-    recommendations.clear()  # Clear the recommendations
-
-    return (
-        jsonify(
-            {
-                "message": response_message,
-                "added_songs": [song.serialize() for song in added_songs],
-                "not_found_songs": not_found_songs,
-            }
-        ),
-        200,
-    )
+    body, status = service.add_recommendations_to_playlist(data.get("songs"))
+    return jsonify(body), status
 
 
 @app.route("/move_first_to_playlist", methods=["GET"])
@@ -494,14 +333,8 @@ def move_first_to_playlist():
     """
     Moves the first suggestion to the playlist.
     """
-    if not suggestions:
-        return jsonify({"error": "No suggestions available"}), 400
-
-    # Pop the first song from suggestions and add it to the playlist
-    song = suggestions.songs.pop(0)
-    playlist.songs.append(song)
-
-    return jsonify({"message": f"'{song}' moved to playlist"}), 200
+    body, status = service.move_first_to_playlist()
+    return jsonify(body), status
 
 
 @app.route("/move_recommendation", methods=["POST"])
@@ -514,37 +347,9 @@ def move_recommendation():
     if not data or "artists" not in data:
         return jsonify({"error": "Please provide a list of artists"}), 400
 
-    artists = data["artists"]
-    if not isinstance(artists, list) or not all(
-        isinstance(artist, str) for artist in artists
-    ):
-        return jsonify({"error": "Invalid artists list"}), 400
-
-    if not recommendations:
-        return jsonify({"error": "No recommendations available"}), 400
-
-    # Find a matching recommendation
-    matches = [rec for rec in recommendations.songs if rec.artist_0 in artists]
-
-    # If no match, pick a random recommendation
-    if not matches:
-        matches = [random.choice(recommendations.songs)]
-
-    # Move the selected recommendation to the playlist
-    for match in matches:
-        playlist.songs.append(match)
-
-    matches_str = [str(match) for match in matches]
-
-    return (
-        jsonify(
-            {
-                "songs": matches_str,
-            }
-        ),
-        200,
-    )
+    body, status = service.move_recommendation(data["artists"])
+    return jsonify(body), status
 
 
 if __name__ == "__main__":
-    app.run(port=5002)
+    app.run(port=config.BACKEND_PORT)
@@ -0,0 +1,134 @@
+"""Asynchronous variant of the playlist agent.
+
+The synchronous agent blocks its thread for the whole turn: one or two LLM
+calls, several database queries and several backend calls. This agent hands
+every utterance to an event loop shared by all conversations of the process
+and returns immediately. The LLM calls are awaited with the async Ollama
+client, the database and backend calls run in a bounded thread pool. The
+utterances of one conversation are still handled in order.
+
+Set `MUSICCRS_AGENT_MODE=async` to run it with `run_agent`.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Union
+
+from dialoguekit.core.utterance import Utterance
+
+from musicCRS import config
+from musicCRS.backend.playlist_agent import PlaylistAgent
+from musicCRS.nlu import nlu, post_processing
+
+logger = logging.getLogger(__name__)
+
+_loop: Union[asyncio.AbstractEventLoop, None] = None
+_executor: Union[ThreadPoolExecutor, None] = None
+_setup_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Returns the event loop shared by all agents of the process.
+
+    It runs in a daemon thread that is started on first use.
+    """
+    global _loop
+    with _setup_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="agent-event-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the thread pool for the blocking work of the agents.
+
+    Its size is set by `config.AGENT_EXECUTOR_WORKERS`.
+    """
+    global _executor
+    with _setup_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.AGENT_EXECUTOR_WORKERS,
+                thread_name_prefix="agent-worker",
+            )
+        return _executor
+
+
+def _log_failure(future: Future) -> None:
+    """Logs the exception of a turn that failed."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Handling the utterance failed", exc_info=future.exception())
+
+
+class AsyncPlaylistAgent(PlaylistAgent):
+    """Represents a playlist agent that handles utterances asynchronously."""
+
+    def __init__(self, agent_id: str):
+        """Asynchronous playlist agent.
+
+        Args:
+            agent_id: Agent id.
+        """
+        super().__init__(agent_id)
+        # Created on the event loop, it keeps the turns of this agent in order
+        self._turn_lock: Union[asyncio.Lock, None] = None
+
+    def receive_utterance(self, utterance: Utterance) -> None:
+        """Schedules the handling of a user utterance and returns.
+
+        Args:
+            utterance: User utterance.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self.areceive_utterance(utterance), get_event_loop()
+        )
+        future.add_done_callback(_log_failure)
+
+    async def areceive_utterance(self, utterance: Utterance) -> None:
+        """Handles a user utterance.
+
+        Args:
+            utterance: User utterance.
+        """
+        if self._turn_lock is None:
+            self._turn_lock = asyncio.Lock()
+
+        async with self._turn_lock:
+            start = time.perf_counter()
+            if await self._run_blocking(self.handle_command, utterance.text):
+                self.log_turn(start, "command", utterance.text)
+                return
+
+            nlu_processor = nlu.NLUProcessor()
+            ollama_response = await nlu_processor.aprocess_input(utterance.text)
+            logger.debug(
+                "NLU response",
+                extra={"session_id": self.session_id, "response": ollama_response},
+            )
+
+            # The second LLM call of the `create` intent is awaited here, so
+            # handle_intent must not make it again if it failed
+            playlist_parameters = None
+            if post_processing.extract_intent(ollama_response) == "create":
+                description = post_processing.extract_description(ollama_response)
+                if description:
+                    playlist_parameters = await nlu_processor.agenerate_playlist(
+                        description
+                    )
+
+            await self._run_blocking(
+                self.handle_intent, ollama_response, playlist_parameters, False
+            )
+            self.log_turn(start, "nlu", ollama_response)
+
+    async def _run_blocking(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Runs a blocking function in the thread pool and awaits the result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), partial(function, *args))
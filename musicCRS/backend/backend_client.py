@@ -0,0 +1,196 @@
+"""Contains the clients the playlist agent uses to talk to the backend.
+
+There are two transports with the same interface:
+
+- `HTTPBackend` calls the endpoints of the Flask app in `app.py`. Songs are
+  sent as track ids, the backend looks them up in its catalog.
+- `LocalBackend` calls a PlaylistService in the same process, which avoids the
+  serialization and the round trip when agent and backend are co-located.
+
+Which one is used is set by `config.BACKEND_TRANSPORT`.
+"""
+
+from typing import Any, List, NamedTuple, Union
+
+import requests
+
+from musicCRS import config
+from musicCRS.backend.http_client import HTTPClient, get_client
+from musicCRS.backend.playlist_service import (
+    PlaylistService,
+    ServiceResponse,
+    get_default_service,
+)
+from musicCRS.models.song import Song
+
+
+class BackendResponse(NamedTuple):
+    """Response of the backend.
+
+    Attributes:
+        status_code: HTTP status code of the response.
+        data: Decoded body of the response.
+    """
+
+    status_code: int
+    data: Any
+
+
+def _to_response(result: ServiceResponse) -> BackendResponse:
+    """Converts the (body, status) tuple of the service into a response."""
+    body, status_code = result
+    return BackendResponse(status_code, body)
+
+
+class LocalBackend:
+    """Calls the PlaylistService directly."""
+
+    def __init__(self, service: PlaylistService) -> None:
+        """Local backend.
+
+        Args:
+            service: The service that holds the playlists.
+        """
+        self.service = service
+
+    def add_song(self, song: Song) -> BackendResponse:
+        """Adds a song to the playlist."""
+        return _to_response(self.service.add_song(song))
+
+    def add_suggestions(self, songs: List[Song]) -> BackendResponse:
+        """Replaces the suggestions with the given songs."""
+        return _to_response(self.service.add_suggestions(songs))
+
+    def get_songs_string(self) -> BackendResponse:
+        """Returns the playlist as a single string."""
+        return BackendResponse(200, self.service.get_songs_string())
+
+    def delete_song(self, track_name: str) -> BackendResponse:
+        """Deletes a song from the playlist by name."""
+        return _to_response(self.service.delete_song(track_name))
+
+    def delete_songs_by_positions(self, positions: List[int]) -> BackendResponse:
+        """Deletes songs from the playlist by positions."""
+        return _to_response(self.service.delete_songs_by_positions(positions))
+
+    def clear_playlist(self) -> BackendResponse:
+        """Deletes all songs from the playlist."""
+        return _to_response(self.service.clear_playlist())
+
+    def add_recommendations(self) -> BackendResponse:
+        """Replaces the recommendations based on the playlist."""
+        return _to_response(self.service.add_recommendations())
+
+    def create_playlist(self, parameters: Any) -> BackendResponse:
+        """Replaces the playlist with songs matching the parameters."""
+        return _to_response(self.service.create_playlist(parameters))
+
+    def move_first_to_playlist(self) -> BackendResponse:
+        """Moves the first suggestion to the playlist."""
+        return _to_response(self.service.move_first_to_playlist())
+
+    def move_recommendation(self, artists: List[str]) -> BackendResponse:
+        """Moves recommendations by the given artists to the playlist."""
+        return _to_response(self.service.move_recommendation(artists))
+
+
+class HTTPBackend:
+    """Calls the endpoints of the backend server."""
+
+    def __init__(self, client: HTTPClient) -> None:
+        """HTTP backend.
+
+        Args:
+            client: The pooled client for the backend server.
+        """
+        self.client = client
+
+    def _request(
+        self, method: str, endpoint: str, json: Any = None, idempotent: bool = False
+    ) -> BackendResponse:
+        """Sends a request and decodes the response.
+
+        If the backend cannot be reached, a response with the status code 503
+        is returned instead of raising.
+        """
+        try:
+            response = self.client.request(
+                method, endpoint, json=json, idempotent=idempotent
+            )
+        except requests.RequestException as e:
+            return BackendResponse(503, {"error": f"Backend not reachable: {e}"})
+        try:
+            data = response.json()
+        except ValueError:
+            data = response.text
+        return BackendResponse(response.status_code, data)
+
+    def add_song(self, song: Song) -> BackendResponse:
+        """Adds a song to the playlist."""
+        return self._request(
+            "POST", "/add_song_by_id", json={"track_id": song.track_id}
+        )
+
+    def add_suggestions(self, songs: List[Song]) -> BackendResponse:
+        """Replaces the suggestions with the given songs."""
+        return self._request(
+            "POST",
+            "/add_suggestions_by_ids",
+            json={"track_ids": [song.track_id for song in songs]},
+        )
+
+    def get_songs_string(self) -> BackendResponse:
+        """Returns the playlist as a single string."""
+        return self._request("GET", "/songs_string", idempotent=True)
+
+    def delete_song(self, track_name: str) -> BackendResponse:
+        """Deletes a song from the playlist by name."""
+        return self._request("DELETE", "/delete_song", json={"track_name": track_name})
+
+    def delete_songs_by_positions(self, positions: List[int]) -> BackendResponse:
+        """Deletes songs from the playlist by positions."""
+        return self._request(
+            "DELETE", "/delete_songs_by_positions", json={"positions": positions}
+        )
+
+    def clear_playlist(self) -> BackendResponse:
+        """Deletes all songs from the playlist."""
+        return self._request("DELETE", "/clear_playlist", idempotent=True)
+
+    def add_recommendations(self) -> BackendResponse:
+        """Replaces the recommendations based on the playlist."""
+        # Not retried, the backend may have added them before the error
+        return self._request("GET", "/add_recommendations")
+
+    def create_playlist(self, parameters: Any) -> BackendResponse:
+        """Replaces the playlist with songs matching the parameters."""
+        return self._request("POST", "/create_playlist", json=parameters)
+
+    def move_first_to_playlist(self) -> BackendResponse:
+        """Moves the first suggestion to the playlist."""
+        return self._request("GET", "/move_first_to_playlist")
+
+    def move_recommendation(self, artists: List[str]) -> BackendResponse:
+        """Moves recommendations by the given artists to the playlist."""
+        return self._request("POST", "/move_recommendation", json={"artists": artists})
+
+
+def get_backend(transport: Union[str, None] = None) -> Union[LocalBackend, HTTPBackend]:
+    """Creates the backend client for the configured transport.
+
+    Args:
+        transport (optional): "http" or "local". Defaults to
+          `config.BACKEND_TRANSPORT`.
+
+    Returns:
+        The backend client.
+
+    Raises:
+        ValueError: If the transport is unknown.
+    """
+    transport = transport or config.BACKEND_TRANSPORT
+    if transport == "local":
+        return LocalBackend(get_default_service())
+    if transport == "http":
+        return HTTPBackend(get_client(config.BACKEND_URL))
+    raise ValueError(f"Unknown backend transport: {transport}")
@@ -0,0 +1,171 @@
+"""Contains the EventBroker class.
+
+The broker fans the change events of the playlists out to the subscribed
+clients (see the `/events` endpoint in `app.py`). The backend holds a single
+playlist shared by all clients, so every client receives every event; the
+session id of a subscription only groups the connections of one client.
+
+Every client has a bounded buffer. A client that does not keep up loses its
+buffered events and is sent a fresh snapshot of the state instead, so a slow
+client never blocks the backend.
+"""
+
+import json
+import queue
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Union
+
+
+class Subscription:
+    """Subscription of a client to the change events.
+
+    Attributes:
+        session_id: Id of the session of the client.
+        stale: Whether events were dropped and the client needs a snapshot.
+    """
+
+    def __init__(self, session_id: str, max_queued: int) -> None:
+        """Subscription.
+
+        Args:
+            session_id: Id of the session of the client.
+            max_queued: Maximum number of buffered events.
+        """
+        self.session_id = session_id
+        self.stale = False
+        self._queue: queue.Queue[Dict[str, Any]] = queue.Queue(max_queued)
+
+    def put(self, event: Dict[str, Any]) -> None:
+        """Buffers an event, or marks the subscription as stale if it is full."""
+        if self.stale:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.stale = True
+
+    def get(self, timeout: float) -> Union[Dict[str, Any], None]:
+        """Returns the next event, or None if there was none within the timeout.
+
+        After events were dropped, the buffer is emptied and None is returned.
+        """
+        if self.stale:
+            self.drain()
+            return None
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self) -> None:
+        """Drops all buffered events."""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class EventBroker:
+    """Fans every event out to all subscriptions.
+
+    The subscriptions are grouped by session to count the connected sessions.
+    """
+
+    def __init__(self, max_queued: int = 100) -> None:
+        """Event broker.
+
+        Args:
+            max_queued (optional): Maximum number of buffered events per client.
+              Defaults to 100.
+        """
+        self.max_queued = max_queued
+        self._sessions: Dict[str, List[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, session_id: Union[str, None] = None) -> Subscription:
+        """Subscribes a client to the events.
+
+        Args:
+            session_id (optional): Id of the session. Defaults to a new id.
+
+        Returns:
+            The subscription of the client.
+        """
+        subscription = Subscription(session_id or uuid.uuid4().hex, self.max_queued)
+        with self._lock:
+            self._sessions.setdefault(subscription.session_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Removes a subscription.
+
+        Args:
+            subscription: The subscription to remove.
+        """
+        with self._lock:
+            subscriptions = self._sessions.get(subscription.session_id, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self._sessions.pop(subscription.session_id, None)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Sends an event to all subscriptions.
+
+        Args:
+            event: The event. It has to be JSON serializable.
+        """
+        with self._lock:
+            for subscriptions in self._sessions.values():
+                for subscription in subscriptions:
+                    subscription.put(event)
+
+    def session_count(self) -> int:
+        """Returns the number of sessions with at least one subscription."""
+        with self._lock:
+            return len(self._sessions)
+
+    def stream(
+        self,
+        subscription: Subscription,
+        snapshot: Callable[[], Dict[str, Any]],
+        heartbeat: float = 15.0,
+    ) -> Iterator[str]:
+        """Yields the events of a subscription in the Server-Sent Events format.
+
+        The stream starts with a snapshot of the state. A new snapshot is sent
+        whenever the subscription dropped events. A comment is sent when there
+        was no event for `heartbeat` seconds, which also detects closed
+        connections.
+
+        Args:
+            subscription: The subscription of the client.
+            snapshot: Function that returns the full state.
+            heartbeat (optional): Seconds between two keep-alive comments.
+              Defaults to 15.0.
+        """
+        try:
+            yield format_event({"type": "snapshot", **snapshot()})
+            while True:
+                if subscription.stale:
+                    subscription.drain()
+                    subscription.stale = False
+                    yield format_event({"type": "snapshot", **snapshot()})
+                event = subscription.get(timeout=heartbeat)
+                if event is not None:
+                    yield format_event(event)
+                elif not subscription.stale:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    """Formats an event as a Server-Sent Event.
+
+    Args:
+        event: The event with its name under the key "type".
+    """
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,187 @@
+"""Contains the HTTP client used to call the backend server.
+
+All calls share one `requests.Session` per base URL, so the TCP connections
+are pooled and kept alive between the turns. Every call has a deadline, and
+calls that are marked as idempotent are retried with exponential backoff and
+jitter on connection errors, timeouts and 502/503/504 responses. The
+duration and the failures of the calls are recorded in the metrics registry
+per endpoint.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Dict, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from musicCRS import config, metrics
+
+# Status codes after which an idempotent call is retried
+RETRY_STATUS_CODES = (502, 503, 504)
+
+CALL_SECONDS = metrics.histogram(
+    "musiccrs_http_client_duration_seconds",
+    "Duration of the calls of the HTTP client by endpoint, including retries.",
+    ["endpoint"],
+)
+CALL_FAILURES = metrics.counter(
+    "musiccrs_http_client_failures_total",
+    "Calls of the HTTP client without a response or with a 5xx status code.",
+    ["endpoint"],
+)
+
+
+class HTTPClient:
+    """Pooled keep-alive HTTP client with deadlines and retries."""
+
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff: float = 0.1,
+        pool_size: int = 10,
+    ) -> None:
+        """HTTP client.
+
+        Args:
+            base_url: URL of the server, e.g. "http://localhost:5002".
+            connect_timeout (optional): Seconds to wait for a connection.
+              Defaults to 2.0.
+            read_timeout (optional): Seconds to wait for a response. It is also
+              the default deadline of a call. Defaults to 30.0.
+            max_retries (optional): Retries of an idempotent call. Defaults
+              to 2.
+            backoff (optional): Base delay in seconds between two retries.
+              Defaults to 0.1.
+            pool_size (optional): Number of kept-alive connections. Defaults
+              to 10.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        json: Any = None,
+        idempotent: bool = False,
+        deadline: Union[float, None] = None,
+    ) -> requests.Response:
+        """Sends a request.
+
+        Args:
+            method: HTTP method.
+            path: Path of the endpoint, e.g. "/songs".
+            json (optional): JSON body of the request. Defaults to None.
+            idempotent (optional): Whether the call may be retried. Defaults to
+              False.
+            deadline (optional): Seconds the call may take in total, including
+              retries. Defaults to the read timeout.
+
+        Returns:
+            The response of the server.
+
+        Raises:
+            requests.RequestException: If the server could not be reached
+              before the deadline.
+        """
+        endpoint = f"{method} {path}"
+        deadline = self.read_timeout if deadline is None else deadline
+        start = time.monotonic()
+        attempts = 1 + (self.max_retries if idempotent else 0)
+
+        for attempt in range(attempts):
+            remaining = deadline - (time.monotonic() - start)
+            try:
+                response = self.session.request(
+                    method,
+                    f"{self.base_url}{path}",
+                    json=json,
+                    timeout=self._timeout(remaining),
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if not self._can_retry(attempt, attempts, start, deadline):
+                    self._observe(endpoint, start, failed=True)
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or not (
+                    self._can_retry(attempt, attempts, start, deadline)
+                ):
+                    self._observe(endpoint, start, failed=response.status_code >= 500)
+                    return response
+            self._sleep_before_retry(attempt, start, deadline)
+
+        # Not reachable, the last attempt either returns or raises
+        raise requests.RequestException(f"{endpoint} failed")
+
+    def _observe(self, endpoint: str, start: float, failed: bool) -> None:
+        """Records the duration and the outcome of a call.
+
+        Args:
+            endpoint: Method and path of the call, e.g. "GET /songs".
+            start: Monotonic time at which the call started.
+            failed: Whether the call failed.
+        """
+        CALL_SECONDS.observe(time.monotonic() - start, endpoint=endpoint)
+        if failed:
+            CALL_FAILURES.inc(endpoint=endpoint)
+
+    def _timeout(self, remaining: float) -> Tuple[float, float]:
+        """Returns the (connect, read) timeout that fits into the deadline."""
+        remaining = max(remaining, 0.001)
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+    def _can_retry(
+        self, attempt: int, attempts: int, start: float, deadline: float
+    ) -> bool:
+        """Checks whether there is an attempt and time left for a retry."""
+        return attempt + 1 < attempts and time.monotonic() - start < deadline
+
+    def _sleep_before_retry(self, attempt: int, start: float, deadline: float) -> None:
+        """Waits with exponential backoff and jitter, within the deadline."""
+        delay = self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+        remaining = deadline - (time.monotonic() - start)
+        time.sleep(max(0.0, min(delay, remaining)))
+
+    def close(self) -> None:
+        """Closes the pooled connections."""
+        self.session.close()
+
+
+_clients: Dict[str, HTTPClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url: Union[str, None] = None) -> HTTPClient:
+    """Returns the shared client for a server.
+
+    The client is created on first use with the settings from `config`.
+
+    Args:
+        base_url (optional): URL of the server. Defaults to
+          `config.BACKEND_URL`.
+    """
+    base_url = base_url or config.BACKEND_URL
+    with _clients_lock:
+        if base_url not in _clients:
+            _clients[base_url] = HTTPClient(
+                base_url,
+                connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+                read_timeout=config.HTTP_READ_TIMEOUT,
+                max_retries=config.HTTP_MAX_RETRIES,
+                backoff=config.HTTP_RETRY_BACKOFF,
+                pool_size=config.HTTP_POOL_SIZE,
+            )
+        return _clients[base_url]
@@ -0,0 +1,165 @@
+"""Contains the JobQueue class.
+
+Heavy work of the backend (generating a playlist, computing recommendations)
+runs as a job on a bounded thread pool instead of in the request thread.
+Identical requests that arrive while a job is in flight share that job
+instead of starting the same work again.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent import futures
+from typing import Any, Callable, Dict, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Response body and HTTP status code, like the methods of the PlaylistService
+JobResult = Tuple[Any, int]
+
+
+class Job:
+    """A unit of work of the job queue.
+
+    Attributes:
+        id: Id of the job.
+        key: Deduplication key. Jobs with the same key share the work.
+        status: "queued", "running", "succeeded" or "failed".
+        body: Response body of the finished job.
+        status_code: HTTP status code of the finished job.
+        created_at: Time the job was submitted (seconds since the epoch).
+        finished_at: Time the job finished, or None.
+    """
+
+    def __init__(self, key: str) -> None:
+        """Job.
+
+        Args:
+            key: Deduplication key.
+        """
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.body: Any = None
+        self.status_code: Union[int, None] = None
+        self.created_at = time.time()
+        self.finished_at: Union[float, None] = None
+        self.future: Union[futures.Future, None] = None
+
+    @property
+    def done(self) -> bool:
+        """Whether the job finished."""
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the job as a dictionary for the API."""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "result": self.body,
+            "status_code": self.status_code,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Runs jobs on a bounded thread pool and deduplicates them."""
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_finished: int = 100,
+        on_finished: Union[Callable[[Job], None], None] = None,
+    ) -> None:
+        """Job queue.
+
+        Args:
+            max_workers (optional): Number of jobs that run at the same time.
+              Defaults to 2.
+            max_finished (optional): Number of finished jobs that are kept
+              for polling. Defaults to 100.
+            on_finished (optional): Called with every job that finished.
+              Defaults to None.
+        """
+        self.max_finished = max_finished
+        self.on_finished = on_finished
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job-worker"
+        )
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._in_flight: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, function: Callable[..., JobResult], *args: Any) -> Job:
+        """Submits a job, or returns the in-flight job with the same key.
+
+        Args:
+            key: Deduplication key of the work.
+            function: Function that does the work and returns the response
+              body and the HTTP status code.
+            *args: Arguments of the function.
+
+        Returns:
+            The job.
+        """
+        with self._lock:
+            if key in self._in_flight:
+                return self._in_flight[key]
+            job = Job(key)
+            self._in_flight[key] = job
+            self._jobs[job.id] = job
+            self._evict_finished()
+            job.future = self._executor.submit(self._run, job, function, *args)
+        return job
+
+    def get(self, job_id: str) -> Union[Job, None]:
+        """Returns the job with the given id, or None if it is unknown."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job: Job, timeout: Union[float, None] = None) -> bool:
+        """Waits until a job finished.
+
+        Args:
+            job: The job.
+            timeout (optional): Seconds to wait. Defaults to None (no limit).
+
+        Returns:
+            Whether the job finished within the timeout.
+        """
+        if job.future is not None:
+            try:
+                job.future.result(timeout)
+            except futures.TimeoutError:
+                pass
+        return job.done
+
+    def shutdown(self) -> None:
+        """Waits for the running jobs and stops the workers."""
+        self._executor.shutdown(wait=True)
+
+    def _run(self, job: Job, function: Callable[..., JobResult], *args: Any) -> None:
+        """Runs a job and records its result."""
+        job.status = "running"
+        try:
+            job.body, job.status_code = function(*args)
+            job.status = "succeeded"
+        except Exception as e:
+            logger.exception("Job failed", extra={"job_id": job.id, "key": job.key})
+            job.body, job.status_code = {"error": str(e)}, 500
+            job.status = "failed"
+        job.finished_at = time.time()
+
+        with self._lock:
+            self._in_flight.pop(job.key, None)
+        if self.on_finished is not None:
+            self.on_finished(job)
+
+    def _evict_finished(self) -> None:
+        """Forgets the oldest finished jobs beyond `max_finished`."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
@@ -1,20 +1,30 @@
 """The playlist agent for the music conversational recommender system."""
 
-import os
+import logging
 import random
-from typing import List, Tuple, Union
+import time
+import uuid
+from typing import Any, Dict, List, Tuple, Union
 
-import requests
 from dialoguekit.core.annotated_utterance import AnnotatedUtterance
 from dialoguekit.core.dialogue_act import DialogueAct
 from dialoguekit.core.utterance import Utterance
 from dialoguekit.participant.agent import Agent
 from dialoguekit.participant.participant import DialogueParticipant
 
-from musicCRS.backend import parsing
-from musicCRS.data.database_manager import DatabaseManager
+from musicCRS import metrics
+from musicCRS.backend import backend_client, parsing
+from musicCRS.backend.resources import get_resources
 from musicCRS.nlu import nlu, post_processing
 
+logger = logging.getLogger(__name__)
+
+TURN_SECONDS = metrics.histogram(
+    "musiccrs_agent_turn_duration_seconds",
+    "Duration of the agent turns by handler (command or nlu).",
+    ["handler"],
+)
+
 
 class PlaylistAgent(Agent):
     """Represents a playlist agent."""
@@ -29,10 +39,13 @@ class PlaylistAgent(Agent):
             agent_id: Agent id.
         """
         super().__init__(agent_id)
-        db_path = os.path.abspath(
-            os.path.join(os.path.dirname(__file__), "../data/final_database.db")
-        )
-        self.dbmanager = DatabaseManager(db_path)
+        # Identifies the conversation in the logs
+        self.session_id = uuid.uuid4().hex[:12]
+        # The same database as the backend, see `config.DB_PATH`
+        self.dbmanager = get_resources().db_manager
+
+        # Client for the playlist backend, over HTTP or in-process
+        self.backend = backend_client.get_backend()
 
         self.commands_not_utilized = [
             "add",
@@ -111,6 +124,7 @@ class PlaylistAgent(Agent):
 
     def welcome(self) -> None:
         """Sends the agent's welcome message."""
+        metrics.ACTIVE_SESSIONS.inc(kind="agent")
         utterance = AnnotatedUtterance(
             """Hello, I'm a Playlist agent, I can help you with your music playlist.
              \nYou can add a song to the playlist by typing '/add <song_name>'
@@ -125,6 +139,7 @@ class PlaylistAgent(Agent):
 
     def goodbye(self) -> None:
         """Sends the agent's goodbye message."""
+        metrics.ACTIVE_SESSIONS.dec(kind="agent")
         utterance = AnnotatedUtterance(
             "It was nice talking to you. Bye",
             dialogue_acts=[DialogueAct(intent=self.stop_intent)],
@@ -183,11 +198,7 @@ class PlaylistAgent(Agent):
         if songs:  # Song exists
             if len(songs) < 2:
                 # Add one song to the playlist
-                song_data = songs[0].serialize()
-
-                # Send POST request to Flask server
-                url = "http://localhost:5002/add_song"
-                response = requests.post(url, json=song_data)
+                response = self.backend.add_song(songs[0])
 
                 if response.status_code == 401:
                     utterance = AnnotatedUtterance(
@@ -197,7 +208,13 @@ class PlaylistAgent(Agent):
                     self._dialogue_connector.register_agent_utterance(utterance)
                     return
                 elif response.status_code != 201:
-                    print(f"Error: {response.status_code}")
+                    logger.error(
+                        "Adding the song failed",
+                        extra={
+                            "session_id": self.session_id,
+                            "status_code": response.status_code,
+                        },
+                    )
                     return
 
                 utterance = AnnotatedUtterance(
@@ -206,15 +223,17 @@ class PlaylistAgent(Agent):
                 )
                 self._dialogue_connector.register_agent_utterance(utterance)
             else:  # Call suggestions
-                # Serialize the songs
-                songs_data = [song.serialize() for song in songs]
-
-                # Send POST request to Flask server
-                url = "http://localhost:5002/add_suggestions"
-                response = requests.post(url, json=songs_data)
+                # Show the songs in the suggestions list
+                response = self.backend.add_suggestions(songs)
 
                 if response.status_code != 201:
-                    print(f"Error: {response.status_code}")
+                    logger.error(
+                        "Adding the suggestions failed",
+                        extra={
+                            "session_id": self.session_id,
+                            "status_code": response.status_code,
+                        },
+                    )
                     return
 
                 utterance = AnnotatedUtterance(
@@ -232,15 +251,18 @@ class PlaylistAgent(Agent):
     def view_playlist(self) -> None:
         """Shows the current playlist."""
 
-        url = "http://localhost:5002/songs_string"
-
-        # Send GET request
-        response = requests.get(url)
+        response = self.backend.get_songs_string()
 
-        utterance = AnnotatedUtterance(
-            f"Here is the current playlist: {response.text}",
-            participant=DialogueParticipant.AGENT,
-        )
+        if response.status_code == 200:
+            utterance = AnnotatedUtterance(
+                f"Here is the current playlist: {response.data}",
+                participant=DialogueParticipant.AGENT,
+            )
+        else:
+            utterance = AnnotatedUtterance(
+                "Error: The playlist could not be loaded",
+                participant=DialogueParticipant.AGENT,
+            )
         self._dialogue_connector.register_agent_utterance(utterance)
 
     def delete_song(self, song_name: str) -> None:
@@ -249,13 +271,7 @@ class PlaylistAgent(Agent):
         Args:
             song_name: Name of the song to delete.
         """
-        # Endpoint URL
-        url = "http://localhost:5002/delete_song"
-
-        # Create JSON payload with song name
-        delete_data = {"track_name": song_name}
-
-        response = requests.delete(url, json=delete_data)
+        response = self.backend.delete_song(song_name)
         if response.status_code == 200:
             utterance = AnnotatedUtterance(
                 f"The song {song_name}  has been removed from the playlist",
@@ -266,6 +282,11 @@ class PlaylistAgent(Agent):
                 f"The song {song_name} is not in the playlist",
                 participant=DialogueParticipant.AGENT,
             )
+        else:
+            utterance = AnnotatedUtterance(
+                f"Error: The song {song_name} could not be removed",
+                participant=DialogueParticipant.AGENT,
+            )
         self._dialogue_connector.register_agent_utterance(utterance)
 
     # position is a list of integers
@@ -275,13 +296,7 @@ class PlaylistAgent(Agent):
         Args:
             position: List of positions of the songs to delete.
         """
-        # Endpoint URL
-        url = "http://localhost:5002/delete_songs_by_positions"
-
-        # Create JSON payload with song name
-        delete_data = {"positions": position}
-
-        response = requests.delete(url, json=delete_data)
+        response = self.backend.delete_songs_by_positions(position)
         if response.status_code == 200:
             utterance = AnnotatedUtterance(
                 "The songs have been removed from the playlist",
@@ -292,15 +307,16 @@ class PlaylistAgent(Agent):
                 "Please, provide correct positions for the songs that you want to delete.",
                 participant=DialogueParticipant.AGENT,
             )
+        else:
+            utterance = AnnotatedUtterance(
+                "Error: The songs could not be removed",
+                participant=DialogueParticipant.AGENT,
+            )
         self._dialogue_connector.register_agent_utterance(utterance)
 
     def clear_playlist(self) -> None:
         """Deletes the current playlist."""
-        # Endpoint URL to delete all songs
-        url = "http://localhost:5002/clear_playlist"
-
-        # Send DELETE request to clear playlist
-        response = requests.delete(url)
+        response = self.backend.clear_playlist()
 
         if response.status_code == 200:
             utterance = AnnotatedUtterance(
@@ -457,29 +473,78 @@ class PlaylistAgent(Agent):
         """Gets called each time there is a new user utterance.
 
         If the received message is "/exit" it will close the conversation.
+        Commands and questions are handled directly, everything else is sent
+        to the NLU first.
 
         Args:
             utterance: User utterance.
         """
-        if self.separate_utterance(utterance.text)[0] == "/exit":
-            self.goodbye()
+        start = time.perf_counter()
+        if self.handle_command(utterance.text):
+            self.log_turn(start, "command", utterance.text)
             return
 
-        if self.separate_utterance(utterance.text)[0] == "/add":
+        nlu_processor = nlu.NLUProcessor()
+        ollama_response = nlu_processor.process_input(utterance.text)
+        logger.debug(
+            "NLU response",
+            extra={"session_id": self.session_id, "response": ollama_response},
+        )
+        self.handle_intent(ollama_response)
+        self.log_turn(start, "nlu", ollama_response)
+
+    def log_turn(self, start: float, handler: str, handled: Any) -> None:
+        """Logs a finished turn and records its latency.
+
+        Args:
+            start: Start of the turn as returned by `time.perf_counter`.
+            handler: "command" or "nlu".
+            handled: The text of a command, or the response of the NLU.
+        """
+        latency = time.perf_counter() - start
+        TURN_SECONDS.observe(latency, handler=handler)
+        if handler == "command":
+            first_word = handled.split(" ", 1)[0]
+            intent = first_word if first_word.startswith("/") else "question"
+        else:
+            intent = post_processing.extract_intent(handled or {})
+        logger.info(
+            "turn",
+            extra={
+                "session_id": self.session_id,
+                "handler": handler,
+                "intent": intent,
+                "latency_ms": round(latency * 1000, 1),
+            },
+        )
+
+    def handle_command(self, text: str) -> bool:
+        """Handles the utterance if it is a command or a known question.
+
+        Args:
+            text: Text of the user utterance.
+
+        Returns:
+            True if the utterance was handled, False if it has to be sent to
+            the NLU.
+        """
+        if self.separate_utterance(text)[0] == "/exit":
+            self.goodbye()
+            return True
+
+        if self.separate_utterance(text)[0] == "/add":
             self.counter += 1
             if "add" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("add")
-            if len(self.separate_utterance(utterance.text)) < 2:
+            if len(self.separate_utterance(text)) < 2:
                 utterance = AnnotatedUtterance(
                     "Please provide the name of the song you want to add",
                     participant=DialogueParticipant.AGENT,
                 )
                 self._dialogue_connector.register_agent_utterance(utterance)
                 self.suggest_command_not_utilized()
-                return
-            song_title, artist = self.parse_command(
-                self.separate_utterance(utterance.text)[1]
-            )
+                return True
+            song_title, artist = self.parse_command(self.separate_utterance(text)[1])
             if song_title:
                 self.add_song(song_title, artist)
             else:
@@ -489,52 +554,52 @@ class PlaylistAgent(Agent):
                 )
                 self._dialogue_connector.register_agent_utterance(response)
             self.suggest_command_not_utilized()
-            return
+            return True
 
-        if self.separate_utterance(utterance.text)[0] == "/view":
+        if self.separate_utterance(text)[0] == "/view":
             self.counter += 1
             if "view" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("view")
             self.view_playlist()
             self.suggest_command_not_utilized()
-            return
+            return True
 
-        if self.separate_utterance(utterance.text)[0] == "/clear":
+        if self.separate_utterance(text)[0] == "/clear":
             self.counter += 1
             if "clear" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("clear")
             self.clear_playlist()
             self.suggest_command_not_utilized()
-            return
+            return True
 
-        if self.separate_utterance(utterance.text)[0] == "/delete":
+        if self.separate_utterance(text)[0] == "/delete":
             self.counter += 1
             if "delete" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("delete")
-            if len(self.separate_utterance(utterance.text)) < 2:
+            if len(self.separate_utterance(text)) < 2:
                 utterance = AnnotatedUtterance(
                     "Please provide the name of the song you want to delete",
                     participant=DialogueParticipant.AGENT,
                 )
                 self._dialogue_connector.register_agent_utterance(utterance)
                 self.suggest_command_not_utilized()
-                return
-            self.delete_song(self.separate_utterance(utterance.text)[1])
+                return True
+            self.delete_song(self.separate_utterance(text)[1])
             self.suggest_command_not_utilized()
-            return
+            return True
 
-        if self.separate_utterance(utterance.text)[0] == "/help":
+        if self.separate_utterance(text)[0] == "/help":
             self.counter += 1
             if "help" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("help")
             self.welcome()
             self.suggest_command_not_utilized()
-            return
+            return True
         # TODO
-        if self.separate_utterance(utterance.text)[0] == "/recommend":
+        if self.separate_utterance(text)[0] == "/recommend":
             self.counter += 1
             # Suggest another command after sending recommendations
-            requests.get("http://localhost:5002/add_recommendations")
+            self.backend.add_recommendations()
 
             response = AnnotatedUtterance(
                 """I have displayed the recommendations in the recommendation
@@ -545,18 +610,18 @@ class PlaylistAgent(Agent):
             self.dialogue_connector.register_agent_utterance(response)
 
             self.suggest_command_not_utilized()
-            return
+            return True
 
         # ---- Handle questions ----
-        if "When was album" in utterance.text:  # A bit hard-coded but works for now
+        if "When was album" in text:  # A bit hard-coded but works for now
             self.counter += 1
             if "Q1" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("Q1")
-            album_name = parsing.extract_album_from_question(utterance.text)
+            album_name = parsing.extract_album_from_question(text)
             if album_name:
                 self.find_album_release_date(album_name)
                 self.suggest_command_not_utilized()
-                return
+                return True
             # Tell user album does not exist
             response = AnnotatedUtterance(
                 f"Sorry, I couldn't find the album {album_name} in the database",
@@ -564,15 +629,15 @@ class PlaylistAgent(Agent):
             )
             self.dialogue_connector.register_agent_utterance(response)
 
-        if "How many albums has artist" in utterance.text:
+        if "How many albums has artist" in text:
             self.counter += 1
             if "Q2" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("Q2")
-            artist_name = parsing.extract_artist_from_question(utterance.text)
+            artist_name = parsing.extract_artist_from_question(text)
             if artist_name:
                 self.find_number_of_albums_by_artist(artist_name)
                 self.suggest_command_not_utilized()
-                return
+                return True
             # Tell user artist does not exist
             response = AnnotatedUtterance(
                 f"Sorry, I couldn't find any albums by {artist_name}",
@@ -580,15 +645,15 @@ class PlaylistAgent(Agent):
             )
             self.dialogue_connector.register_agent_utterance(response)
 
-        if "Which album features song" in utterance.text:
+        if "Which album features song" in text:
             self.counter += 1
             if "Q3" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("Q3")
-            song_name = parsing.extract_song_from_question_for_album(utterance.text)
+            song_name = parsing.extract_song_from_question_for_album(text)
             if song_name:
                 self.find_album_for_song(song_name)
                 self.suggest_command_not_utilized()
-                return
+                return True
             # Tell user song does not exist
             response = AnnotatedUtterance(
                 f"Sorry, I couldn't find the album for the song {song_name}",
@@ -596,15 +661,15 @@ class PlaylistAgent(Agent):
             )
             self.dialogue_connector.register_agent_utterance(response)
 
-        if "How many songs does album" in utterance.text:
+        if "How many songs does album" in text:
             self.counter += 1
             if "Q4" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("Q4")
-            album_name = parsing.extract_num_songs_on_album(utterance.text)
+            album_name = parsing.extract_num_songs_on_album(text)
             if album_name:
                 self.how_many_songs_on_album(album_name)
                 self.suggest_command_not_utilized()
-                return
+                return True
             # Tell user album does not exist
             response = AnnotatedUtterance(
                 f"Sorry, I couldn't find the album {album_name}",
@@ -612,15 +677,15 @@ class PlaylistAgent(Agent):
             )
             self.dialogue_connector.register_agent_utterance(response)
 
-        if "How long is album" in utterance.text:
+        if "How long is album" in text:
             self.counter += 1
             if "Q5" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("Q5")
-            album_name = parsing.extract_album_name_for_duration(utterance.text)
+            album_name = parsing.extract_album_name_for_duration(text)
             if album_name:
                 self.how_long_is_album(album_name)
                 self.suggest_command_not_utilized()
-                return
+                return True
             # Tell user album does not exist
             response = AnnotatedUtterance(
                 f"Sorry, I couldn't find the album {album_name}",
@@ -628,15 +693,15 @@ class PlaylistAgent(Agent):
             )
             self.dialogue_connector.register_agent_utterance(response)
 
-        if "What is the most popular song by" in utterance.text:
+        if "What is the most popular song by" in text:
             self.counter += 1
             if "Q6" in self.commands_not_utilized:
                 self.commands_not_utilized.remove("Q6")
-            artist_name = parsing.extract_artist_for_most_popular_song(utterance.text)
+            artist_name = parsing.extract_artist_for_most_popular_song(text)
             if artist_name:
                 self.most_popular_song_by_artist(artist_name)
                 self.suggest_command_not_utilized()
-                return
+                return True
             # Tell user artist does not exist
             response = AnnotatedUtterance(
                 f"Sorry, I couldn't find any songs by {artist_name}",
@@ -644,11 +709,24 @@ class PlaylistAgent(Agent):
             )
             self.dialogue_connector.register_agent_utterance(response)
 
-        # TODO call ollama
+        return False
 
-        nlu_processor = nlu.NLUProcessor()
-        ollama_response = nlu_processor.process_input(utterance.text)
-        print(f"Ollama response: {ollama_response}")
+    def handle_intent(
+        self,
+        ollama_response: Union[Dict[str, Any], None],
+        playlist_parameters: Union[Dict[str, Any], None] = None,
+        generate_playlist: bool = True,
+    ) -> None:
+        """Handles the intent and entities detected by the NLU.
+
+        Args:
+            ollama_response: The post-processed response of the NLU.
+            playlist_parameters (optional): The playlist parameters for the
+              `create` intent. Defaults to None.
+            generate_playlist (optional): Whether missing playlist parameters
+              are generated by the NLU. False if the caller already tried.
+              Defaults to True.
+        """
         intent = post_processing.extract_intent(ollama_response)
 
         if intent == "add":
@@ -692,7 +770,7 @@ class PlaylistAgent(Agent):
             return
         elif intent == "recommend":
             self.counter += 1
-            requests.get("http://localhost:5002/add_recommendations")
+            self.backend.add_recommendations()
 
             response = AnnotatedUtterance(
                 """I have displayed the recommendations in the recommendation
@@ -805,11 +883,14 @@ class PlaylistAgent(Agent):
             self.counter += 1
             description = post_processing.extract_description(ollama_response)
             if description:
-                description_response = nlu_processor.generate_playlist(description)
-                resp = requests.post(
-                    "http://localhost:5002/create_playlist", json=description_response
+                if playlist_parameters is None and generate_playlist:
+                    playlist_parameters = nlu.NLUProcessor().generate_playlist(
+                        description
+                    )
+                created = playlist_parameters is not None and (
+                    self.backend.create_playlist(playlist_parameters).status_code == 201
                 )
-                if resp.status_code == 201:
+                if created:
                     response = AnnotatedUtterance(
                         "I created the playlist that best fits your description",
                         participant=DialogueParticipant.AGENT,
@@ -0,0 +1,805 @@
+"""Contains the PlaylistService class.
+
+The service owns the state of the backend: the playlist, the suggestions and
+the recommendations. The Flask app in `app.py` is a thin HTTP adapter around
+it, and the playlist agent can call it directly when it runs in the same
+process (see `backend_client.py`).
+
+Every method returns a tuple of the response body and the HTTP status code,
+so that both transports behave the same.
+
+The lists polled by the frontend are rendered once per version of the
+playlists (see `render`), so polling an unchanged state is cheap. Clients
+that subscribe to `events` are pushed the changes instead.
+"""
+
+import base64
+import binascii
+import json
+import random
+import threading
+import uuid
+from typing import Any, Dict, List, Tuple, Union
+
+from musicCRS import config, metrics
+from musicCRS.backend.events import EventBroker
+from musicCRS.backend.jobs import Job, JobQueue
+from musicCRS.backend.resources import Resources, get_resources
+from musicCRS.data import recommendations as rec
+from musicCRS.data.playlist_journal import PlaylistJournal
+from musicCRS.models.playlist import Playlist
+from musicCRS.models.song import Song
+from musicCRS.nlu import mappings, post_processing
+
+ServiceResponse = Tuple[Any, int]
+
+
+def parse_song_string(song_str: str) -> Tuple[Union[str, None], List[str]]:
+    """Parses a song string to extract the track name and artists.
+
+    Args:
+        song_str: String of the song with the format
+          "<song_name> by <artist_name_1>, <artist_name_2>, ..."
+
+    Returns:
+        A tuple consisting of the track name and a list of artists. Or None if
+        the song string is not in the correct format.
+    """
+    if " by " not in song_str:
+        return None, []
+    track_name, artists_str = song_str.split(" by ", 1)
+    artists = [artist.strip() for artist in artists_str.split(",")]
+    return track_name.strip(), artists
+
+
+class PlaylistService:
+    """Playlist service.
+
+    Attributes:
+        db_path: Path to the music database.
+        resources: Database manager, caches and features shared with other
+          users of the database.
+        catalog: Looks up songs by track id.
+        playlist: The playlist of the user.
+        suggestions: Songs the user can choose from after an ambiguous add.
+        recommendations: Songs recommended based on the playlist.
+        events: Broker that pushes the changes of the playlists to clients.
+        jobs: Queue that runs the heavy operations in the background.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        journal: Union[PlaylistJournal, None] = None,
+        resources: Union[Resources, None] = None,
+        events: Union[EventBroker, None] = None,
+        jobs: Union[JobQueue, None] = None,
+    ):
+        """Playlist service.
+
+        Args:
+            db_path: Path to the music database.
+            journal (optional): Journal to restore and persist the playlists.
+              Defaults to None.
+            resources (optional): The shared resources for the database.
+              Defaults to the resources of this process.
+            events (optional): Broker for the change events. Defaults to a new
+              broker.
+            jobs (optional): Queue for the background jobs. Defaults to a new
+              queue.
+        """
+        self.db_path = db_path
+        self.resources = resources if resources is not None else get_resources(db_path)
+        self.catalog = self.resources.catalog
+        self.playlist = Playlist("My Playlist")
+        self.suggestions = Playlist("Suggestions")
+        self.recommendations = Playlist("Recommendations")
+
+        if journal is not None:
+            for persisted_playlist in (
+                self.playlist,
+                self.suggestions,
+                self.recommendations,
+            ):
+                journal.attach(persisted_playlist)
+
+        self.events = events if events is not None else EventBroker()
+        self._list_names = {
+            id(self.playlist): "playlist",
+            id(self.suggestions): "suggestions",
+            id(self.recommendations): "recommendations",
+        }
+        for observed_playlist in (
+            self.playlist,
+            self.suggestions,
+            self.recommendations,
+        ):
+            observed_playlist.listeners.append(self._publish_change)
+
+        self.jobs = jobs if jobs is not None else JobQueue()
+        self.jobs.on_finished = self._publish_job
+
+        # Serializes the changes coming from the agent and the HTTP threads
+        self._lock = threading.RLock()
+
+        # Rendered views by name: (versions, ETag, JSON payload). The ETags
+        # contain an id of this instance, so that they change on a restart.
+        self._instance_id = uuid.uuid4().hex[:8]
+        self._rendered: Dict[str, Tuple[Tuple[int, ...], str, bytes]] = {}
+
+    # ----- Read access -----
+
+    def get_songs(self) -> List[str]:
+        """Returns the playlist as strings, one for each song."""
+        return [str(song) for song in self.playlist.songs]
+
+    def get_songs_string(self) -> str:
+        """Returns all songs in a single string, separated by a delimiter."""
+        return " // ".join([str(song) for song in self.playlist.songs])
+
+    def get_suggestions(self) -> List[Dict[str, Any]]:
+        """Returns the suggestions with an indication if they are in the playlist."""
+        return self._entries_with_playlist_flag(self.suggestions)
+
+    def get_recommendations(self) -> List[Dict[str, Any]]:
+        """Returns the recommendations with an indication if they are in the
+        playlist."""
+        return self._entries_with_playlist_flag(self.recommendations)
+
+    def _entries_with_playlist_flag(
+        self, songs: Playlist, start: int = 0, stop: Union[int, None] = None
+    ) -> List[Dict[str, Any]]:
+        """Renders songs with a flag that disables the ones in the playlist.
+
+        Only the songs from `start` to `stop` are rendered.
+        """
+        playlist_track_ids = {song.track_id for song in self.playlist.songs}
+        return [
+            {
+                "message": str(song),
+                # Disable the button if the song is in the playlist
+                "disabled": song.track_id in playlist_track_ids,
+            }
+            for song in songs.songs[start:stop]
+        ]
+
+    def get_state(
+        self,
+        fields: Union[List[str], None] = None,
+        cursor: Union[str, None] = None,
+        limit: int = 100,
+    ) -> ServiceResponse:
+        """Returns several lists in one response, one page at a time.
+
+        Every list is rendered like its own endpoint and comes with its
+        version and total length. If a list has more entries than `limit`,
+        the response contains a `next_cursor` for the following page.
+
+        Args:
+            fields (optional): Lists to return, out of "playlist",
+              "suggestions" and "recommendations". Defaults to all of them.
+            cursor (optional): Cursor of the previous page. It selects the
+              lists and offsets and takes precedence over `fields`. Defaults to
+              None (first page).
+            limit (optional): Maximum number of entries per list. Defaults
+              to 100.
+        """
+        lists = {
+            "playlist": self.playlist,
+            "suggestions": self.suggestions,
+            "recommendations": self.recommendations,
+        }
+        if limit < 1:
+            return {"error": "limit has to be positive"}, 400
+
+        if cursor is not None:
+            try:
+                positions = _decode_cursor(cursor)
+            except ValueError:
+                return {"error": "Invalid cursor"}, 400
+        else:
+            fields = list(lists) if fields is None else fields
+            positions = {field: (None, 0) for field in fields}
+        unknown = [field for field in positions if field not in lists]
+        if unknown:
+            return {"error": f"Unknown fields: {', '.join(unknown)}"}, 400
+
+        state: Dict[str, Any] = {}
+        next_positions = {}
+        with self._lock:
+            for field, (version, offset) in positions.items():
+                songs = lists[field]
+                if version is not None and version != songs.version:
+                    return {"error": f"'{field}' changed, restart the paging"}, 409
+
+                stop = offset + limit
+                if field == "playlist":
+                    entries = [str(song) for song in songs.songs[offset:stop]]
+                else:
+                    entries = self._entries_with_playlist_flag(songs, offset, stop)
+                state[field] = {
+                    "version": songs.version,
+                    "total": len(songs.songs),
+                    "entries": entries,
+                }
+                if stop < len(songs.songs):
+                    next_positions[field] = (songs.version, stop)
+
+        state["next_cursor"] = (
+            _encode_cursor(next_positions) if next_positions else None
+        )
+        return state, 200
+
+    def render(self, view: str) -> Tuple[str, bytes]:
+        """Renders a list polled by the frontend as JSON.
+
+        The rendered payload is cached until one of the playlists it depends
+        on changes.
+
+        Args:
+            view: "songs", "suggestions" or "recommendations".
+
+        Returns:
+            A tuple of the ETag of the payload and the payload.
+
+        Raises:
+            ValueError: If the view is unknown.
+        """
+        renderers = {
+            "songs": (self.get_songs, (self.playlist,)),
+            "suggestions": (self.get_suggestions, (self.suggestions, self.playlist)),
+            "recommendations": (
+                self.get_recommendations,
+                (self.recommendations, self.playlist),
+            ),
+        }
+        if view not in renderers:
+            raise ValueError(f"Unknown view: {view}")
+        renderer, dependencies = renderers[view]
+
+        with self._lock:
+            versions = tuple(playlist.version for playlist in dependencies)
+            cached = self._rendered.get(view)
+            if cached is not None and cached[0] == versions:
+                metrics.CACHE_REQUESTS.inc(cache="views", result="hit")
+                return cached[1], cached[2]
+            metrics.CACHE_REQUESTS.inc(cache="views", result="miss")
+
+            etag = f"{self._instance_id}-{'-'.join(map(str, versions))}"
+            payload = json.dumps(renderer(), separators=(",", ":")).encode()
+            self._rendered[view] = (versions, etag, payload)
+        return etag, payload
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the full state for the change events.
+
+        Every list comes with its version. Events with a version up to it are
+        already contained in the snapshot.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "version": playlist.version,
+                    "entries": [_event_entry(song) for song in playlist.songs],
+                }
+                for name, playlist in (
+                    ("playlist", self.playlist),
+                    ("suggestions", self.suggestions),
+                    ("recommendations", self.recommendations),
+                )
+            }
+
+    def _publish_change(self, playlist: Playlist, operation: str, payload: Any) -> None:
+        """Publishes a change of one of the playlists as a small diff event."""
+        event: Dict[str, Any] = {
+            "list": self._list_names[id(playlist)],
+            "version": playlist.version,
+        }
+        if operation == "add":
+            # The song was appended before the change was recorded
+            event.update(
+                type="added",
+                position=len(playlist.songs) - 1,
+                entry=_event_entry(playlist.songs[-1]),
+            )
+        elif operation == "delete":
+            event.update(type="removed", positions=payload)
+        elif operation == "reorder":
+            event.update(type="reordered", order=payload)
+        elif operation == "replace":
+            event.update(
+                type="replaced",
+                entries=[_event_entry(song) for song in playlist.songs],
+            )
+        else:
+            event.update(type="cleared")
+        self.events.publish(event)
+
+    def _publish_job(self, job: Job) -> None:
+        """Publishes that a background job finished."""
+        self.events.publish(
+            {
+                "type": "job",
+                "id": job.id,
+                "status": job.status,
+                "status_code": job.status_code,
+            }
+        )
+
+    # ----- Background jobs -----
+
+    def create_playlist_job(self, data: Dict[str, Any]) -> Job:
+        """Runs `create_playlist` as a background job.
+
+        A request with the same parameters as a job in flight joins that job.
+
+        Args:
+            data: The playlist parameters extracted by the NLU.
+        """
+        key = f"create_playlist:{json.dumps(data, sort_keys=True, default=str)}"
+        return self.jobs.submit(key, self.create_playlist, data)
+
+    def add_recommendations_job(self, top_n: int = 10) -> Job:
+        """Runs `add_recommendations` as a background job.
+
+        The job recommends for the tracks of the playlist at submission. A
+        request for the same tracks as a job in flight joins that job.
+
+        Args:
+            top_n (optional): Number of recommendations. Defaults to 10.
+        """
+        with self._lock:
+            track_ids = [song.track_id for song in self.playlist.songs]
+        key = f"add_recommendations:{rec.playlist_fingerprint(track_ids, top_n)}"
+        return self.jobs.submit(key, self.add_recommendations, track_ids, top_n)
+
+    def get_job(self, job_id: str) -> ServiceResponse:
+        """Returns the status and, once finished, the result of a job.
+
+        Args:
+            job_id: Id of the job.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {"error": f"Unknown job '{job_id}'"}, 404
+        return job.to_dict(), 200
+
+    # ----- Changes -----
+
+    def add_song(self, song: Song) -> ServiceResponse:
+        """Adds a new song to the playlist.
+
+        Args:
+            song: The song to add.
+        """
+        with self._lock:
+            result = self.playlist.add_song(song)
+        if result == -1:
+            return (
+                {
+                    "error": f"'{song.track_name}' by {song.artist_0} is already in the playlist"
+                },
+                401,
+            )
+        return (
+            {
+                "message": f"'{song.track_name}' by {song.artist_0} added to the playlist"
+            },
+            201,
+        )
+
+    def add_song_by_id(self, track_id: str) -> ServiceResponse:
+        """Adds the song with the given track id to the playlist.
+
+        Args:
+            track_id: Track id of the song.
+        """
+        if not track_id:
+            return {"error": "track_id is required"}, 400
+
+        song = self.catalog.get_song(track_id)
+        if song is None:
+            return {"error": f"Unknown track id '{track_id}'"}, 404
+        return self.add_song(song)
+
+    def add_suggestions(self, songs: List[Song]) -> ServiceResponse:
+        """Replaces the suggestions with the given songs.
+
+        The suggestions are sorted by popularity.
+
+        Args:
+            songs: The songs to suggest.
+        """
+        unique_songs, results = _deduplicate(songs)
+        unique_songs.sort(
+            key=lambda song: (
+                song.track_popularity if song.track_popularity is not None else 0
+            ),
+            reverse=True,
+        )
+        with self._lock:
+            # One change, instead of a clear, an add per song and a reorder
+            self.suggestions.set_songs(unique_songs)
+        return results, 201
+
+    def add_suggestions_by_ids(self, track_ids: List[str]) -> ServiceResponse:
+        """Replaces the suggestions with the songs with the given track ids.
+
+        Args:
+            track_ids: Track ids of the songs to suggest.
+        """
+        if not isinstance(track_ids, list):
+            return {"error": "Invalid data format. Expected a list of track ids."}, 400
+
+        songs = self.catalog.get_songs(track_ids)
+        body, status = self.add_suggestions(songs)
+
+        known_ids = {song.track_id for song in songs}
+        for track_id in dict.fromkeys(track_ids):
+            if track_id not in known_ids:
+                body.append({"error": f"Unknown track id '{track_id}'"})
+        return body, status
+
+    def create_playlist(self, data: Dict[str, Any]) -> ServiceResponse:
+        """Replaces the playlist with songs that match a description.
+
+        Args:
+            data: The playlist parameters extracted by the NLU.
+        """
+        # Extract the parameters from the request
+        valence = mappings.VALENCE_MAPPING[post_processing.extract_valence(data)]
+        energy = mappings.ENERGY_MAPPING[post_processing.extract_energy(data)]
+        danceability = mappings.DANCEABILITY_MAPPING[
+            post_processing.extract_danceability(data)
+        ]
+        tempo = mappings.TEMPO_MAPPING[post_processing.extract_tempo(data)]
+        genres = post_processing.extract_genres(data)
+        duration = post_processing.extract_duration(data)
+
+        # Query the database
+        songs = self.resources.db_manager.query_songs_for_playlist_generation(
+            tempo, danceability, valence, energy, genres, duration
+        )
+        with self._lock:
+            self.playlist.set_songs(songs)
+
+        return [], 201
+
+    def add_recommendations(
+        self, track_ids: Union[List[str], None] = None, top_n: int = 10
+    ) -> ServiceResponse:
+        """Replaces the recommendations based on the current playlist.
+
+        If re-ranking is enabled in `config`, a larger pool of candidates is
+        generated and the recommendations are picked from it for diversity.
+
+        Args:
+            track_ids (optional): The tracks to recommend for. Defaults to
+              None (the tracks of the playlist).
+            top_n (optional): Number of recommendations. Defaults to 10.
+        """
+        if track_ids is None:
+            with self._lock:
+                track_ids = [song.track_id for song in self.playlist.songs]
+        rerank = bool(
+            config.RERANK_DIVERSITY > 0
+            or config.RERANK_MAX_PER_ARTIST
+            or config.RERANK_MAX_PER_ALBUM
+        )
+        pool = max(top_n, config.RERANK_POOL) if rerank else top_n
+
+        # Get recommendations
+        if config.RECOMMENDATION_MODE == "centroid":
+            recommendation_ids = rec.get_centroid_recommendations(
+                self.resources.features,
+                track_ids,
+                top_n=pool,
+                ann_index=self.resources.ann_index,
+                probes=config.ANN_PROBES,
+            )
+        else:
+            recommendation_ids = rec.get_recommendations(
+                db_path=self.db_path,
+                playlist_track_ids=track_ids,
+                top_n=pool,
+                neighbour_cache=self.resources.neighbours,
+                result_cache=self.resources.recommendations,
+                neighbour_writer=self.resources.writer,
+                neighbours_k=config.NEIGHBOURS_K,
+                feature_store=self.resources.features,
+                ann_index=self.resources.ann_index,
+                probes=config.ANN_PROBES,
+            )
+
+        # Fetch song data using track ids
+        recommendation_songs = self.catalog.get_songs(recommendation_ids)
+        if rerank:
+            recommendation_songs = self._diversify(recommendation_songs, top_n)
+
+        unique_songs, results = _deduplicate(recommendation_songs)
+        with self._lock:
+            self.recommendations.set_songs(unique_songs)
+        return results, 201
+
+    def _diversify(self, songs: List[Song], top_n: int) -> List[Song]:
+        """Picks diverse songs from ranked candidates (see `rec.rerank_mmr`).
+
+        Args:
+            songs: The candidates, best first.
+            top_n: Number of songs to pick.
+        """
+        by_id = {song.track_id: song for song in songs}
+        picked = rec.rerank_mmr(
+            list(by_id),
+            self.resources.features,
+            artists={song.track_id: song.artist_0 for song in songs},
+            albums={song.track_id: song.album_name for song in songs},
+            top_n=top_n,
+            diversity=config.RERANK_DIVERSITY,
+            max_per_artist=config.RERANK_MAX_PER_ARTIST,
+            max_per_album=config.RERANK_MAX_PER_ALBUM,
+        )
+        return [by_id[track_id] for track_id in picked]
+
+    def delete_song(self, track_name: str) -> ServiceResponse:
+        """Deletes a song from the playlist by track name.
+
+        If the name is not found, the alternative spellings are tried.
+
+        Args:
+            track_name: Name of the song.
+        """
+        if not track_name:
+            return {"error": "track_name is required"}, 400
+
+        with self._lock:
+            result = self.playlist.remove_song(track_name)
+
+        if result == -1:
+            results_db = self.resources.db_manager.fetch_transformed_song_name(
+                track_name
+            )
+
+            if results_db is None:
+                return {"error": "The song is not in the playlist"}, 401
+
+            with self._lock:
+                for song_name in results_db:
+                    result = self.playlist.remove_song(song_name[0])
+
+                    if result != -1:
+                        break
+
+            if result == -1:  # Still not found
+                return {"error": "The song is not in the playlist"}, 401
+
+        return {"message": f"'{track_name}' has been removed from the playlist"}, 200
+
+    def delete_songs_by_positions(self, positions: List[int]) -> ServiceResponse:
+        """Deletes songs from the playlist by positions.
+
+        Args:
+            positions: Positions of the songs, starting at 0.
+        """
+        if not positions:
+            return {"error": "track_name is required"}, 400
+
+        with self._lock:
+            result = self.playlist.remove_songs_by_positions(positions)
+
+        if result == -1:
+            return {"error": "These positions are not available"}, 401
+
+        return (
+            {
+                "message": f"Songs in positions:'{positions}' has been removed from the playlist"
+            },
+            200,
+        )
+
+    def clear_playlist(self) -> ServiceResponse:
+        """Deletes all songs from the playlist."""
+        with self._lock:
+            self.playlist.clear()  # Clear the playlist
+        return {"message": "All songs have been removed from the playlist"}, 200
+
+    def add_to_playlist(self, song_str: str) -> ServiceResponse:
+        """Moves a song from the suggestions to the playlist.
+
+        The remaining suggestions are cleared.
+
+        Args:
+            song_str: The song as rendered in the suggestions list.
+        """
+        track_name, artists = parse_song_string(song_str)
+
+        if not track_name or not artists:
+            return {"error": "Invalid song format"}, 400
+
+        with self._lock:
+            song = self.suggestions.find_song(track_name, artists)
+            if not song:
+                return {"error": "Song not found in suggestions"}, 404
+
+            self.suggestions.remove_song(track_name, artists)
+            self.playlist.add_song(song)
+
+            self.suggestions.clear()
+
+        return {"message": "Song moved to playlist and suggestions cleared"}, 200
+
+    def add_recommendations_to_playlist(self, songs_data: List[str]) -> ServiceResponse:
+        """Moves songs from the recommendations to the playlist.
+
+        The remaining recommendations are cleared.
+
+        Args:
+            songs_data: The songs as rendered in the recommendations list.
+        """
+        if not songs_data:
+            return {"error": "No songs provided"}, 400
+
+        added_songs = []  # Lista per tracciare le canzoni aggiunte
+        not_found_songs = []  # Lista per tracciare le canzoni non trovate
+
+        with self._lock:
+            for song_str in songs_data:
+                track_name, artists = parse_song_string(song_str)
+
+                if not track_name or not artists:
+                    not_found_songs.append(song_str)
+                    continue
+
+                # Trova la canzone nelle raccomandazioni
+                song = self.recommendations.find_song(track_name, artists)
+                if song:
+                    self.recommendations.remove_song(track_name, artists)
+                    self.playlist.add_song(song)
+                    added_songs.append(song)
+                else:
+                    not_found_songs.append(song_str)
+
+            self.recommendations.clear()  # Clear the recommendations
+
+        if added_songs:
+            # Se almeno una canzone è stata aggiunta alla playlist
+            response_message = (
+                f"{len(added_songs)} recommendations added to the playlist"
+            )
+        else:
+            # Se nessuna canzone è stata trovata o aggiunta
+            response_message = "No valid songs found to add to the playlist"
+
+        return (
+            {
+                "message": response_message,
+                "added_songs": [song.serialize() for song in added_songs],
+                "not_found_songs": not_found_songs,
+            },
+            200,
+        )
+
+    def move_first_to_playlist(self) -> ServiceResponse:
+        """Moves the first suggestion to the playlist."""
+        with self._lock:
+            if not self.suggestions.songs:
+                return {"error": "No suggestions available"}, 400
+
+            # Pop the first song from suggestions and add it to the playlist
+            song = self.suggestions.pop_song(0)
+            self.playlist.add_song(song)
+
+        return {"message": f"'{song}' moved to playlist"}, 200
+
+    def move_recommendation(self, artists: Any) -> ServiceResponse:
+        """Moves recommendations to the playlist based on artist match.
+
+        If no recommendation matches the artists, a random one is moved.
+
+        Args:
+            artists: List of artist names.
+        """
+        if not isinstance(artists, list) or not all(
+            isinstance(artist, str) for artist in artists
+        ):
+            return {"error": "Invalid artists list"}, 400
+
+        with self._lock:
+            if not self.recommendations.songs:
+                return {"error": "No recommendations available"}, 400
+
+            # Find a matching recommendation
+            matches = [
+                song for song in self.recommendations.songs if song.artist_0 in artists
+            ]
+
+            # If no match, pick a random recommendation
+            if not matches:
+                matches = [random.choice(self.recommendations.songs)]
+
+            # Move the selected recommendation to the playlist
+            for match in matches:
+                self.playlist.add_song(match)
+
+        return {"songs": [str(match) for match in matches]}, 200
+
+
+def _encode_cursor(positions: Dict[str, Tuple[int, int]]) -> str:
+    """Encodes the versions and offsets of the lists as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(positions).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Dict[str, Tuple[int, int]]:
+    """Decodes a cursor created by `_encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {
+            field: (int(version), int(offset))
+            for field, (version, offset) in positions.items()
+        }
+    except (TypeError, AttributeError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _deduplicate(songs: List[Song]) -> Tuple[List[Song], List[Dict[str, str]]]:
+    """Drops repeated songs of a list of suggestions.
+
+    Returns:
+        The songs without repetitions and a result message for each song.
+    """
+    unique_songs: List[Song] = []
+    results = []
+    for song in songs:
+        if song in unique_songs:
+            results.append(
+                {
+                    "error": f"'{song.track_name}' by {song.artist_0} is already in suggestions"
+                }
+            )
+        else:
+            unique_songs.append(song)
+            results.append(
+                {
+                    "message": f"'{song.track_name}' by {song.artist_0} added to suggestions"
+                }
+            )
+    return unique_songs, results
+
+
+def _event_entry(song: Song) -> Dict[str, Any]:
+    """Renders a song for the change events."""
+    return {"track_id": song.track_id, "message": str(song)}
+
+
+_default_service: Union[PlaylistService, None] = None
+_default_service_lock = threading.Lock()
+
+
+def get_default_service() -> PlaylistService:
+    """Returns the service shared by the backend and a co-located agent.
+
+    It is created on first use with the settings from `config`.
+    """
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            journal = None
+            if config.PERSIST_PLAYLISTS:
+                journal = PlaylistJournal(
+                    config.PLAYLIST_STORE_PATH,
+                    flush_interval=config.JOURNAL_FLUSH_INTERVAL,
+                    snapshot_every=config.JOURNAL_SNAPSHOT_EVERY,
+                )
+            _default_service = PlaylistService(
+                config.DB_PATH,
+                journal=journal,
+                events=EventBroker(max_queued=config.EVENTS_QUEUE_SIZE),
+                jobs=JobQueue(
+                    max_workers=config.JOB_WORKERS, max_finished=config.JOB_HISTORY
+                ),
+            )
+        return _default_service
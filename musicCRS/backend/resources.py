@@ -0,0 +1,244 @@
+"""Contains the Resources class.
+
+The resources are the long-lived objects a backend worker needs to answer
+requests: the database manager, the song catalog, the feature matrix for
+the recommendations, the caches of neighbours and recommendations and the
+background writer of computed neighbours. They are created once per
+process and shared by all requests (and by a co-located agent), instead of
+being rebuilt in every request. If the feature store was built, its matrix is
+memory-mapped and shared by all processes, otherwise the features are loaded
+from the database once per process.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple, Union
+
+import pandas as pd
+
+from musicCRS import config
+from musicCRS.data.ann_index import LSHIndex, get_ann_index
+from musicCRS.data.database_manager import DatabaseManager
+from musicCRS.data.feature_store import FeatureStore, get_feature_store, read_features
+from musicCRS.data.neighbour_writer import NeighbourWriter
+from musicCRS.data.recommendations import Neighbours
+from musicCRS.data.song_catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache."""
+
+    def __init__(self, max_size: int = 10000) -> None:
+        """LRU cache.
+
+        Args:
+            max_size (optional): Maximum number of entries. Defaults to 10000.
+        """
+        self.max_size = max_size
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """Returns the entry of a key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: Any) -> None:
+        """Stores the entry of a key."""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        """Returns the number of entries."""
+        return len(self._entries)
+
+
+class NeighbourCache(LRUCache):
+    """Bounded LRU cache of the neighbours of tracks.
+
+    The keys are built by `recommendations.neighbour_cache_key`, so the
+    entries of replaced neighbours are no longer found and age out.
+    """
+
+    def get(self, key: str) -> Union[Neighbours, None]:
+        """Returns the cached neighbours of a key, or None."""
+        return super().get(key)
+
+
+class RecommendationCache(LRUCache):
+    """Bounded LRU cache of recommendations by playlist fingerprint.
+
+    An entry holds the summed scores of the candidates and the ranked
+    recommendations (see `recommendations.get_recommendations`).
+    """
+
+    def get(self, fingerprint: str) -> Union[Tuple[pd.Series, List[str]], None]:
+        """Returns the cached entry of a playlist fingerprint, or None."""
+        return super().get(fingerprint)
+
+
+class Resources:
+    """Shared resources of a backend worker.
+
+    Attributes:
+        db_path: Path to the music database.
+        db_manager: Manager for the queries of the music database.
+        catalog: Looks up songs by track id.
+        neighbours: Cache of the neighbours of tracks.
+        recommendations: Cache of the recommendations of playlists.
+        writer: Writes the computed neighbours in the background.
+        store_dir: Directory of the feature store.
+    """
+
+    def __init__(self, db_path: str, store_dir: Union[str, None] = None) -> None:
+        """Resources.
+
+        Args:
+            db_path: Path to the music database.
+            store_dir (optional): Directory of the feature store. Defaults to
+              `config.FEATURE_STORE_DIR`.
+        """
+        self.db_path = db_path
+        self.store_dir = store_dir or config.FEATURE_STORE_DIR
+        self.db_manager = DatabaseManager(db_path)
+        self.catalog = get_catalog(db_path)
+        self.neighbours = NeighbourCache(config.NEIGHBOUR_CACHE_SIZE)
+        self.recommendations = RecommendationCache(config.RECOMMENDATION_CACHE_SIZE)
+        self.writer = NeighbourWriter(
+            db_path,
+            flush_interval=config.NEIGHBOUR_FLUSH_INTERVAL,
+            busy_timeout=config.DB_BUSY_TIMEOUT,
+        )
+        self._features: Union[FeatureStore, None] = None
+        self._lock = threading.Lock()
+
+    @property
+    def features(self) -> FeatureStore:
+        """The standardized features of all songs.
+
+        The built feature store is memory-mapped. Without it, the features are
+        loaded from the database on first use.
+        """
+        store = get_feature_store(self.store_dir)
+        if store is not None:
+            return store
+        with self._lock:
+            if self._features is None:
+                start = time.perf_counter()
+                self._features = FeatureStore.from_dataframe(
+                    read_features(self.db_path)
+                )
+                logger.info(
+                    "Loaded the song features",
+                    extra={
+                        "songs": len(self._features),
+                        "seconds": round(time.perf_counter() - start, 3),
+                    },
+                )
+            return self._features
+
+    @property
+    def ann_index(self) -> Union[LSHIndex, None]:
+        """The memory-mapped ANN index of the features, or None if not built."""
+        return get_ann_index(config.ANN_INDEX_DIR, self.features)
+
+    def warm_up(self) -> None:
+        """Loads the resources that are otherwise loaded on first use.
+
+        Failures are logged and not raised, so that the worker starts anyway
+        and reports the problem in `health`.
+        """
+        try:
+            # The properties load the features and the index on first access
+            _ = self.features
+            _ = self.ann_index
+        except Exception:
+            logger.exception("Loading the song features failed")
+
+    def health(self) -> Dict[str, Any]:
+        """Checks the resources.
+
+        Returns:
+            A dictionary with the overall status ("ok" or "failing") and the
+            result of each check.
+        """
+        checks: Dict[str, Any] = {}
+        try:
+            connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            try:
+                connection.execute("SELECT 1 FROM music LIMIT 1").fetchall()
+            finally:
+                connection.close()
+            checks["database"] = "ok"
+        except sqlite3.Error as e:
+            checks["database"] = f"failing: {e}"
+
+        mapped = get_feature_store(self.store_dir)
+        with self._lock:
+            store = mapped if mapped is not None else self._features
+            checks["features"] = (
+                f"ok: {len(store)} songs" if store is not None else "not loaded"
+            )
+        checks["feature_store"] = "mapped" if mapped is not None else "not built"
+        index = (
+            get_ann_index(config.ANN_INDEX_DIR, store) if store is not None else None
+        )
+        checks["ann_index"] = (
+            f"ok: {len(index)} songs" if index is not None else "not built"
+        )
+        checks["cached_songs"] = len(self.catalog)
+        checks["cached_neighbours"] = len(self.neighbours)
+        checks["cached_recommendations"] = len(self.recommendations)
+        checks["pending_neighbours"] = len(self.writer)
+
+        failing = any(
+            isinstance(value, str) and value.startswith("failing")
+            for value in checks.values()
+        )
+        return {"status": "failing" if failing else "ok", "checks": checks}
+
+
+_resources: Dict[str, Resources] = {}
+_resources_lock = threading.Lock()
+
+
+def get_resources(db_path: Union[str, None] = None) -> Resources:
+    """Returns the resources of this process for a database.
+
+    Args:
+        db_path (optional): Path to the music database. Defaults to
+          `config.DB_PATH`.
+    """
+    db_path = db_path or config.DB_PATH
+    with _resources_lock:
+        if db_path not in _resources:
+            _resources[db_path] = Resources(db_path)
+        return _resources[db_path]
+
+
+def clear_resources() -> None:
+    """Forgets the resources of this process, so they are created again.
+
+    It is used to pick up a rebuilt database without restarting the server.
+    The pending neighbours of the old resources are written first.
+    """
+    with _resources_lock:
+        for resources in _resources.values():
+            resources.writer.close()
+        _resources.clear()
@@ -1,11 +1,33 @@
 """Module contains the code to start the server for the playlist agent."""
 
+import threading
+
 from dialoguekit.platforms import FlaskSocketPlatform
 
+from musicCRS import config, log, metrics
+from musicCRS.backend.async_playlist_agent import AsyncPlaylistAgent
 from musicCRS.backend.playlist_agent import PlaylistAgent
 
 if __name__ == "__main__":
+    log.setup_logging()
+
+    if config.BACKEND_TRANSPORT == "local":
+        # The agent calls the PlaylistService directly. The backend server runs
+        # in this process as well, so the frontend sees the same playlists.
+        from musicCRS.backend.app import app
+
+        threading.Thread(
+            target=app.run,
+            kwargs={"port": config.BACKEND_PORT},
+            name="backend",
+            daemon=True,
+        ).start()
+
+    # The metrics of the agent are served on a port of their own
+    metrics.start_http_server(config.AGENT_METRICS_PORT, config.AGENT_METRICS_HOST)
+
     # Just like the backend, we create a FlaskSocketPlatform instance and start it
     # with the PlaylistAgent class.
-    platform = FlaskSocketPlatform(PlaylistAgent)
+    agent_class = AsyncPlaylistAgent if config.AGENT_MODE == "async" else PlaylistAgent
+    platform = FlaskSocketPlatform(agent_class)
     platform.start()
@@ -0,0 +1,133 @@
+"""Runs the backend with a production WSGI server.
+
+`python -m musicCRS.backend.app` starts Flask's development server. This
+module serves the same app with gunicorn: `SERVE_WORKERS` worker processes
+with `SERVE_THREADS` threads each. The shared read-only resources (song
+features and neighbours) are loaded once in the master process before the
+workers are forked, so the workers share their memory instead of loading
+them again.
+
+Sending SIGHUP to the master reloads gracefully: the resources are loaded
+again and new workers replace the old ones once these finished their
+requests (within `SERVE_GRACEFUL_TIMEOUT` seconds).
+
+The playlists, the change events and the jobs are held in the memory of a
+worker. With more than one worker, every worker has its own playlist until
+this state is moved out of the process, so `SERVE_WORKERS` defaults to 1 and
+the requests are served by threads.
+
+gunicorn is optional (`pip install gunicorn`). Without it, the app is served
+by the threaded server of werkzeug in a single process.
+
+To run execute the following command from the root directory:
+
+`python -m musicCRS.backend.serve`
+"""
+
+import logging
+from typing import Any, Callable, Dict
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn is optional, werkzeug is used without it
+    BaseApplication = None
+
+from musicCRS import config
+from musicCRS.backend import resources
+from musicCRS.data import ann_index, feature_store
+
+logger = logging.getLogger(__name__)
+
+
+def preload_resources() -> None:
+    """Loads the shared read-only resources in the current process.
+
+    The resources are kept by `resources.get_resources`, so the app finds
+    them loaded, also in a worker forked from this process.
+    """
+    if config.PRELOAD_RESOURCES:
+        resources.get_resources(config.DB_PATH).warm_up()
+
+
+def reload_resources(server: Any) -> None:
+    """Loads the resources again before the workers are replaced.
+
+    Args:
+        server: The gunicorn arbiter (unused).
+    """
+    resources.clear_resources()
+    feature_store.clear_feature_stores()
+    ann_index.clear_ann_indexes()
+    preload_resources()
+
+
+def load_app() -> Callable:
+    """Imports the Flask app.
+
+    It is called in each worker, so that the threads of the app (journal,
+    jobs, logging) are started after the fork.
+    """
+    from musicCRS.backend.app import app
+
+    return app
+
+
+def gunicorn_options() -> Dict[str, Any]:
+    """Returns the gunicorn settings from `config`."""
+    return {
+        "bind": f"{config.SERVE_HOST}:{config.BACKEND_PORT}",
+        "workers": config.SERVE_WORKERS,
+        "threads": config.SERVE_THREADS,
+        "worker_class": "gthread",
+        "timeout": config.SERVE_TIMEOUT,
+        "graceful_timeout": config.SERVE_GRACEFUL_TIMEOUT,
+        "keepalive": config.SERVE_KEEPALIVE,
+        "on_reload": reload_resources,
+    }
+
+
+if BaseApplication is not None:
+
+    class GunicornApplication(BaseApplication):
+        """gunicorn application that serves the backend."""
+
+        def __init__(self, options: Dict[str, Any]) -> None:
+            """gunicorn application.
+
+            Args:
+                options: gunicorn settings.
+            """
+            self.options = options
+            super().__init__()
+
+        def load_config(self) -> None:
+            """Applies the settings."""
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Callable:
+            """Returns the app of a worker."""
+            return load_app()
+
+
+def main() -> None:
+    """Serves the backend."""
+    if config.SERVE_WORKERS > 1:
+        logger.warning(
+            "Every worker holds its own playlists and events",
+            extra={"workers": config.SERVE_WORKERS},
+        )
+    preload_resources()
+
+    if BaseApplication is None:
+        from werkzeug.serving import run_simple
+
+        logger.warning("gunicorn is not installed, serving with werkzeug")
+        run_simple(config.SERVE_HOST, config.BACKEND_PORT, load_app(), threaded=True)
+        return
+
+    GunicornApplication(gunicorn_options()).run()
+
+
+if __name__ == "__main__":
+    main()
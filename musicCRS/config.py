@@ -0,0 +1,193 @@
+"""Contains the runtime configuration of the musicCRS services.
+
+Every setting has a default that works for a local setup and can be
+overridden with an environment variable of the same name, prefixed with
+`MUSICCRS_` (e.g. `MUSICCRS_JOURNAL_FLUSH_INTERVAL=0.5`).
+"""
+
+import os
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
+
+
+def _env_str(name: str, default: str) -> str:
+    """Reads a string setting from the environment."""
+    return os.environ.get(f"MUSICCRS_{name}", default)
+
+
+def _env_int(name: str, default: int) -> int:
+    """Reads an integer setting from the environment."""
+    return int(os.environ.get(f"MUSICCRS_{name}", default))
+
+
+def _env_float(name: str, default: float) -> float:
+    """Reads a float setting from the environment."""
+    return float(os.environ.get(f"MUSICCRS_{name}", default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Reads a boolean setting from the environment."""
+    value = os.environ.get(f"MUSICCRS_{name}")
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Path to the music database
+DB_PATH = _env_str("DB_PATH", os.path.join(DATA_DIR, "final_database.db"))
+
+# Directory of the memory-mapped feature store built from the music database
+# (`python -m musicCRS.data.feature_store`)
+FEATURE_STORE_DIR = _env_str(
+    "FEATURE_STORE_DIR", os.path.join(DATA_DIR, "feature_store")
+)
+
+# Directory of the approximate nearest-neighbour index built from the feature
+# store (`python -m musicCRS.data.ann_index`). Without it, the neighbours of a
+# song are found by scoring it against all songs.
+ANN_INDEX_DIR = _env_str("ANN_INDEX_DIR", os.path.join(DATA_DIR, "ann_index"))
+
+# Additional buckets searched per hash table of the ANN index. More probes find
+# more of the true neighbours but take longer.
+ANN_PROBES = _env_int("ANN_PROBES", 2)
+
+# How the recommendations are generated. "neighbours" ranks the neighbours of
+# the playlist tracks, "centroid" the songs closest to the centroid of the
+# playlist, which takes the same time for any length of the playlist.
+RECOMMENDATION_MODE = _env_str("RECOMMENDATION_MODE", "neighbours")
+
+# Re-ranking of the recommendations for diversity. The best RERANK_POOL
+# candidates are re-ranked by maximal marginal relevance with the weight
+# RERANK_DIVERSITY (0 keeps the ranking) and at most RERANK_MAX_PER_ARTIST and
+# RERANK_MAX_PER_ALBUM songs per artist and album (0 for no limit).
+RERANK_POOL = _env_int("RERANK_POOL", 50)
+RERANK_DIVERSITY = _env_float("RERANK_DIVERSITY", 0.3)
+RERANK_MAX_PER_ARTIST = _env_int("RERANK_MAX_PER_ARTIST", 2)
+RERANK_MAX_PER_ALBUM = _env_int("RERANK_MAX_PER_ALBUM", 1)
+
+# Number of neighbours stored per song, by the offline build and for the
+# songs whose neighbours the backend computes on request. It does not depend
+# on the number of recommendations, so all songs weigh the same in the sums.
+NEIGHBOURS_K = _env_int("NEIGHBOURS_K", 10)
+
+# Number of songs the backend keeps in memory to rebuild songs from track ids
+SONG_CACHE_SIZE = _env_int("SONG_CACHE_SIZE", 10000)
+
+# Number of tracks whose neighbours the backend keeps in memory
+NEIGHBOUR_CACHE_SIZE = _env_int("NEIGHBOUR_CACHE_SIZE", 10000)
+
+# Number of playlists whose recommendations the backend keeps in memory
+RECOMMENDATION_CACHE_SIZE = _env_int("RECOMMENDATION_CACHE_SIZE", 1000)
+
+# Seconds between two batched writes of the neighbours the backend computed
+# on request (0 writes them within the request)
+NEIGHBOUR_FLUSH_INTERVAL = _env_float("NEIGHBOUR_FLUSH_INTERVAL", 1.0)
+
+# Seconds a write to the music database waits for the lock of another writer
+DB_BUSY_TIMEOUT = _env_float("DB_BUSY_TIMEOUT", 5.0)
+
+# Whether the backend loads the song features at startup instead of on the
+# first recommendation request
+PRELOAD_RESOURCES = _env_bool("PRELOAD_RESOURCES", True)
+
+# Minimum level of the log records, e.g. "DEBUG", "INFO" or "WARNING"
+LOG_LEVEL = _env_str("LOG_LEVEL", "INFO")
+
+# Share of the log records below WARNING that are written (1.0 writes all)
+LOG_SAMPLE_RATE = _env_float("LOG_SAMPLE_RATE", 1.0)
+
+# ----- Backend -----
+
+# Port of the backend server
+BACKEND_PORT = _env_int("BACKEND_PORT", 5002)
+
+# Base URL under which the agent reaches the backend
+BACKEND_URL = _env_str("BACKEND_URL", f"http://localhost:{BACKEND_PORT}")
+
+# How the agent talks to the backend. "http" for a backend in another process,
+# "local" to call the PlaylistService in the agent process directly.
+BACKEND_TRANSPORT = _env_str("BACKEND_TRANSPORT", "http")
+
+# Seconds to wait for a connection to the backend
+HTTP_CONNECT_TIMEOUT = _env_float("HTTP_CONNECT_TIMEOUT", 2.0)
+
+# Seconds to wait for a response of the backend (and default call deadline)
+HTTP_READ_TIMEOUT = _env_float("HTTP_READ_TIMEOUT", 30.0)
+
+# Number of retries of idempotent calls and the base delay between them
+HTTP_MAX_RETRIES = _env_int("HTTP_MAX_RETRIES", 2)
+HTTP_RETRY_BACKOFF = _env_float("HTTP_RETRY_BACKOFF", 0.1)
+
+# Number of kept-alive connections to the backend
+HTTP_POOL_SIZE = _env_int("HTTP_POOL_SIZE", 10)
+
+# Number of change events buffered per client of the /events stream. A client
+# that falls further behind gets a snapshot of the state instead.
+EVENTS_QUEUE_SIZE = _env_int("EVENTS_QUEUE_SIZE", 100)
+
+# Seconds between two keep-alive comments on an idle /events stream
+EVENTS_HEARTBEAT = _env_float("EVENTS_HEARTBEAT", 15.0)
+
+# Default and maximum number of entries per list on a page of /state
+STATE_PAGE_SIZE = _env_int("STATE_PAGE_SIZE", 100)
+STATE_MAX_PAGE_SIZE = _env_int("STATE_MAX_PAGE_SIZE", 1000)
+
+# Responses of /state from this size on are compressed
+COMPRESS_MIN_BYTES = _env_int("COMPRESS_MIN_BYTES", 1024)
+
+# Number of background jobs (playlist generation, recommendations) that run at
+# the same time, and number of finished jobs kept for polling
+JOB_WORKERS = _env_int("JOB_WORKERS", 2)
+JOB_HISTORY = _env_int("JOB_HISTORY", 100)
+
+# ----- Production server (musicCRS.backend.serve) -----
+
+# Interface the production server listens on
+SERVE_HOST = _env_str("SERVE_HOST", "127.0.0.1")
+
+# Number of worker processes and of threads per worker. Every worker holds
+# its own playlists, so more than one worker needs the state moved out of the
+# process first.
+SERVE_WORKERS = _env_int("SERVE_WORKERS", 1)
+SERVE_THREADS = _env_int("SERVE_THREADS", 8)
+
+# Seconds after which a silent worker is restarted, and seconds a worker gets
+# to finish its requests on a reload or shutdown
+SERVE_TIMEOUT = _env_int("SERVE_TIMEOUT", 60)
+SERVE_GRACEFUL_TIMEOUT = _env_int("SERVE_GRACEFUL_TIMEOUT", 30)
+
+# Seconds an idle keep-alive connection is kept open
+SERVE_KEEPALIVE = _env_int("SERVE_KEEPALIVE", 5)
+
+# ----- Agent -----
+
+# "sync" handles every utterance in the thread that received it, "async"
+# handles the utterances of all conversations on a shared event loop
+AGENT_MODE = _env_str("AGENT_MODE", "sync")
+
+# Size of the thread pool for the blocking work of the async agent
+AGENT_EXECUTOR_WORKERS = _env_int("AGENT_EXECUTOR_WORKERS", 8)
+
+# Port on which the agent process serves its metrics (0 disables it). The
+# backend serves its metrics on the /metrics endpoint.
+AGENT_METRICS_PORT = _env_int("AGENT_METRICS_PORT", 9102)
+
+# Interface on which the agent serves its metrics, like SERVE_HOST only the
+# local host by default
+AGENT_METRICS_HOST = _env_str("AGENT_METRICS_HOST", "127.0.0.1")
+
+# ----- Playlist persistence -----
+
+# Whether the backend persists the playlists between restarts
+PERSIST_PLAYLISTS = _env_bool("PERSIST_PLAYLISTS", True)
+
+# SQLite file holding the playlist operation log and snapshots
+PLAYLIST_STORE_PATH = _env_str(
+    "PLAYLIST_STORE_PATH", os.path.join(DATA_DIR, "playlists.db")
+)
+
+# Seconds between two flushes of the operation log (0 writes synchronously)
+JOURNAL_FLUSH_INTERVAL = _env_float("JOURNAL_FLUSH_INTERVAL", 1.0)
+
+# Number of logged operations after which a playlist gets a new snapshot
+JOURNAL_SNAPSHOT_EVERY = _env_int("JOURNAL_SNAPSHOT_EVERY", 200)
@@ -0,0 +1,321 @@
+"""Contains the LSHIndex class.
+
+The index finds similar songs approximately with random-projection locality
+sensitive hashing, instead of scoring a song against all songs. Every hash
+table hashes the normalized features of a song to the signs of their
+projections on a few random hyperplanes, so songs with a small angle between
+them are likely to share a bucket. The songs in the buckets of a query (the
+candidates) are scored exactly and the best are returned.
+
+More tables and fewer bits per table find more of the true neighbours (recall)
+but yield more candidates to score. At query time, `probes` also searches the
+buckets that differ from the query bucket in the least certain bits, which
+raises the recall without rebuilding the index.
+
+The index is built offline from the feature store and memory-mapped at serve
+time. To build it execute the following command from the root directory:
+
+`python -m musicCRS.data.ann_index`
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Set, Tuple, Union
+
+import numpy as np
+
+from musicCRS import config
+from musicCRS.data import versioned_dir
+from musicCRS.data.feature_store import FeatureStore, top_k
+
+logger = logging.getLogger(__name__)
+
+# Files of an index directory
+PLANES_FILE = "planes.npy"
+SORTED_CODES_FILE = "sorted_codes.npy"
+SORTED_ROWS_FILE = "sorted_rows.npy"
+BUILD_FILE = "build.json"
+
+
+class LSHIndex:
+    """Random-projection LSH index over the rows of a feature store.
+
+    Attributes:
+        planes: Normals of the random hyperplanes, one matrix of
+          `(bits, features)` per table.
+        sorted_codes: Bucket code of each song per table, sorted.
+        sorted_rows: Row of each song per table, in the order of the codes.
+        store_build_id: Build id of the feature store the index was built
+          from, None if it is unknown.
+    """
+
+    def __init__(
+        self,
+        planes: np.ndarray,
+        sorted_codes: np.ndarray,
+        sorted_rows: np.ndarray,
+        store_build_id: Union[str, None] = None,
+    ) -> None:
+        """LSH index.
+
+        Args:
+            planes: Normals of the hyperplanes, `(tables, bits, features)`.
+            sorted_codes: Sorted bucket codes, `(tables, songs)`.
+            sorted_rows: Rows in the order of the codes, `(tables, songs)`.
+            store_build_id (optional): Build id of the feature store.
+              Defaults to None.
+        """
+        self.planes = planes
+        self.sorted_codes = sorted_codes
+        self.sorted_rows = sorted_rows
+        self.store_build_id = store_build_id
+
+    @classmethod
+    def build(
+        cls, feature_store: FeatureStore, tables: int = 8, bits: int = 12, seed: int = 0
+    ) -> "LSHIndex":
+        """Builds the index of a feature store.
+
+        Args:
+            feature_store: The features of all songs.
+            tables (optional): Number of hash tables. Defaults to 8.
+            bits (optional): Number of hyperplanes per table. Defaults to 12.
+            seed (optional): Seed of the random hyperplanes. Defaults to 0.
+        """
+        rng = np.random.default_rng(seed)
+        dimensions = feature_store.normalized.shape[1]
+        planes = rng.standard_normal((tables, bits, dimensions)).astype(np.float32)
+
+        sorted_codes = np.empty((tables, len(feature_store)), dtype=np.int64)
+        sorted_rows = np.empty((tables, len(feature_store)), dtype=np.int32)
+        for table in range(tables):
+            codes = _codes(feature_store.normalized @ planes[table].T)
+            order = np.argsort(codes, kind="stable")
+            sorted_codes[table] = codes[order]
+            sorted_rows[table] = order
+        return cls(planes, sorted_codes, sorted_rows, feature_store.build_id)
+
+    @classmethod
+    def open(cls, index_dir: str) -> "LSHIndex":
+        """Opens a saved index memory-mapped and read-only.
+
+        Raises:
+            FileNotFoundError: If the directory holds no index.
+        """
+        version_dir = versioned_dir.resolve(index_dir)
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(version_dir, name), mmap_mode="r")
+
+        store_build_id = None
+        if os.path.exists(os.path.join(version_dir, BUILD_FILE)):
+            with open(os.path.join(version_dir, BUILD_FILE)) as file:
+                store_build_id = json.load(file)["store_build_id"]
+        return cls(
+            load(PLANES_FILE),
+            load(SORTED_CODES_FILE),
+            load(SORTED_ROWS_FILE),
+            store_build_id,
+        )
+
+    def save(self, index_dir: str) -> None:
+        """Saves the index, replacing the old one atomically as a whole."""
+        new_dir = versioned_dir.new_version(index_dir)
+        np.save(os.path.join(new_dir, PLANES_FILE), self.planes)
+        np.save(os.path.join(new_dir, SORTED_CODES_FILE), self.sorted_codes)
+        np.save(os.path.join(new_dir, SORTED_ROWS_FILE), self.sorted_rows)
+        with open(os.path.join(new_dir, BUILD_FILE), "w") as file:
+            json.dump({"store_build_id": self.store_build_id}, file)
+        versioned_dir.publish(index_dir, new_dir)
+
+    def candidates(self, vector: np.ndarray, probes: int = 0) -> np.ndarray:
+        """Returns the rows of the songs in the buckets of a vector.
+
+        Args:
+            vector: Normalized features of the query.
+            probes (optional): Number of additional buckets searched per
+              table, each differing from the query bucket in one of its least
+              certain bits. Defaults to 0.
+        """
+        found = []
+        for table in range(len(self.planes)):
+            projections = self.planes[table] @ vector
+            code = int(_codes(projections[None, :])[0])
+            codes = [code]
+            for bit in np.argsort(np.abs(projections))[:probes]:
+                codes.append(code ^ (1 << int(bit)))
+            for probe in codes:
+                left = np.searchsorted(self.sorted_codes[table], probe, side="left")
+                right = np.searchsorted(self.sorted_codes[table], probe, side="right")
+                found.append(self.sorted_rows[table][left:right])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, np.int32)
+
+    def similar(
+        self, feature_store: FeatureStore, row: int, top_n: int = 10, probes: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the most similar songs of a song approximately.
+
+        If the buckets hold fewer than `top_n` other songs, the song is scored
+        against all songs instead.
+
+        Args:
+            feature_store: The store the index was built from.
+            row: Row of the song.
+            top_n (optional): Number of similar songs. Defaults to 10.
+            probes (optional): See `candidates`. Defaults to 0.
+
+        Returns:
+            The rows of the similar songs (without the song itself) and their
+            similarities, most similar first.
+        """
+        return self.search(
+            feature_store,
+            feature_store.normalized[row],
+            top_n,
+            probes,
+            np.array([row]),
+        )
+
+    def search(
+        self,
+        feature_store: FeatureStore,
+        vector: np.ndarray,
+        top_n: int = 10,
+        probes: int = 0,
+        exclude: Union[np.ndarray, None] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the songs most similar to a vector approximately.
+
+        If the buckets hold fewer than `top_n` songs, all songs are scored.
+
+        Args:
+            feature_store: The store the index was built from.
+            vector: Query vector of unit length in the normalized space.
+            top_n (optional): Number of songs. Defaults to 10.
+            probes (optional): See `candidates`. Defaults to 0.
+            exclude (optional): Rows that are never returned. Defaults to
+              None.
+
+        Returns:
+            The rows of the songs and their similarities, most similar first.
+        """
+        candidates = self.candidates(vector, probes)
+        if exclude is not None and len(exclude):
+            candidates = candidates[~np.isin(candidates, exclude)]
+        if len(candidates) < top_n:
+            return feature_store.search(vector, top_n, exclude)
+        scores = feature_store.normalized[candidates] @ vector
+        top, top_scores = top_k(scores[None, :], top_n)
+        return candidates[top[0]].astype(np.int64), top_scores[0]
+
+    def __len__(self) -> int:
+        """Returns the number of indexed songs."""
+        return self.sorted_codes.shape[1]
+
+
+def _codes(projections: np.ndarray) -> np.ndarray:
+    """Turns the signs of projections `(songs, bits)` into bucket codes."""
+    weights = np.left_shift(1, np.arange(projections.shape[1], dtype=np.int64))
+    return (projections > 0).astype(np.int64) @ weights
+
+
+def build_ann_index(
+    store_dir: str, index_dir: str, tables: int = 8, bits: int = 12
+) -> LSHIndex:
+    """Builds the index of a feature store.
+
+    Args:
+        store_dir: Directory of the feature store.
+        index_dir: Directory of the index.
+        tables (optional): Number of hash tables. Defaults to 8.
+        bits (optional): Number of hyperplanes per table. Defaults to 12.
+
+    Returns:
+        The index, opened from the saved files.
+
+    Raises:
+        FileNotFoundError: If the feature store was not built.
+    """
+    start = time.perf_counter()
+    LSHIndex.build(FeatureStore.open(store_dir), tables, bits).save(index_dir)
+    index = LSHIndex.open(index_dir)
+    logger.info(
+        "Built the ANN index",
+        extra={
+            "songs": len(index),
+            "tables": tables,
+            "bits": bits,
+            "seconds": round(time.perf_counter() - start, 3),
+        },
+    )
+    return index
+
+
+_indexes: Dict[str, LSHIndex] = {}
+_indexes_lock = threading.Lock()
+_mismatched: Set[str] = set()
+
+
+def get_ann_index(
+    index_dir: Union[str, None] = None,
+    feature_store: Union[FeatureStore, None] = None,
+) -> Union[LSHIndex, None]:
+    """Returns the shared index of this process.
+
+    Args:
+        index_dir (optional): Directory of the index. Defaults to
+          `config.ANN_INDEX_DIR`.
+        feature_store (optional): The store the index is used with. An index
+          built from another store, or from an unsaved one, is not returned.
+          Defaults to None.
+
+    Returns:
+        The index, or None if it was not built (for this feature store).
+    """
+    index_dir = index_dir or config.ANN_INDEX_DIR
+    with _indexes_lock:
+        if index_dir not in _indexes:
+            try:
+                _indexes[index_dir] = LSHIndex.open(index_dir)
+            except FileNotFoundError:
+                return None
+        index = _indexes[index_dir]
+        if feature_store is not None and (
+            index.store_build_id is None
+            or index.store_build_id != feature_store.build_id
+        ):
+            if index_dir not in _mismatched:
+                _mismatched.add(index_dir)
+                logger.warning(
+                    "The ANN index does not match the feature store, rebuild it",
+                    extra={
+                        "index_build_id": index.store_build_id,
+                        "store_build_id": feature_store.build_id,
+                    },
+                )
+            return None
+        return index
+
+
+def clear_ann_indexes() -> None:
+    """Forgets the opened indexes, so a rebuilt index is opened."""
+    with _indexes_lock:
+        _indexes.clear()
+        _mismatched.clear()
+
+
+if __name__ == "__main__":
+    from musicCRS import log
+
+    log.setup_logging()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store-dir", default=config.FEATURE_STORE_DIR)
+    parser.add_argument("--index-dir", default=config.ANN_INDEX_DIR)
+    parser.add_argument("--tables", type=int, default=8)
+    parser.add_argument("--bits", type=int, default=12)
+    args = parser.parse_args()
+    build_ann_index(args.store_dir, args.index_dir, args.tables, args.bits)
@@ -1,78 +1,499 @@
+"""Computes the neighbours of all songs and stores them in the database.
+
+The neighbours of a song are the songs with the most similar standardized
+features by cosine similarity. They are stored with their similarities in the
+`song_neighbors` table, which `recommendations.get_recommendations` reads.
+
+The similarities are computed for blocks of songs at once, each block with one
+matrix product against all songs, and the top N of each row are selected with
+a partial sort. All rows are written in a single transaction.
+
+With `--incremental`, only the songs added to the music table since the
+feature store was built are computed. They are appended to the feature store
+with its saved standardization, and an existing song is only updated if a new
+song is more similar to it than its least similar stored neighbour. Removed
+songs and changed features need a full build.
+
+With `--processes`, the songs are split into shards that a pool of processes
+computes over the memory-mapped feature store. Each finished shard is saved
+as a checkpoint file, and the shards are merged into the table at the end. An
+interrupted build started again with the same settings only computes the
+shards without a checkpoint.
+
+To run execute the following command from the root directory:
+
+`python -m musicCRS.data.create_neighbours_db --db-path <path to database>`
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
 import sqlite3
+import time
+from concurrent import futures
+from typing import List, Tuple, Union
 
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
+import numpy as np
 
+from musicCRS import config
+from musicCRS.data import recommendations as rec
+from musicCRS.data import versioned_dir
+from musicCRS.data.feature_store import (
+    FEATURE_COLUMNS,
+    FeatureStore,
+    build_feature_store,
+    get_feature_store,
+    read_features,
+)
 
-def fetch_all_song_features(db_path: str) -> pd.DataFrame:
-    """Fetches all song features from the database."""
-    connection = sqlite3.connect(db_path)
-    query = """
-    SELECT track_id, danceability, energy, valence, acousticness,
-        instrumentalness, liveness, speechiness, tempo, loudness,
-        track_popularity, artist_popularity, album_popularity
-    FROM music;
+logger = logging.getLogger(__name__)
+
+# Key of the neighbour_state table that holds the content id of the feature
+# store the last refresh committed the neighbours of
+REFRESHED_STORE = "refreshed_store"
+
+
+def store_neighbours(
+    connection: sqlite3.Connection,
+    track_ids: np.ndarray,
+    start: int,
+    rows: np.ndarray,
+    scores: np.ndarray,
+) -> None:
+    """Writes the neighbours of consecutive songs to the song_neighbors table.
+
+    Args:
+        connection: Connection to the database. The caller commits.
+        track_ids: Track id of each row of the feature store.
+        start: Row of the first song.
+        rows: For each song, the rows of its neighbours.
+        scores: For each song, the similarities of its neighbours.
     """
-    all_features = pd.read_sql(query, connection)
-    connection.close()
-    return all_features
+    rec.store_song_neighbors(
+        connection,
+        (
+            (str(track_ids[start + i]), list(zip(track_ids[neighbours], similarities)))
+            for i, (neighbours, similarities) in enumerate(zip(rows, scores))
+        ),
+    )
 
 
-def compute_and_store_neighbors_one_by_one(db_path: str, top_n: int = 10) -> None:
-    """Computes and stores the top N neighbors for each song one at a time."""
-    # Fetch features for all songs and normalize
-    all_songs = fetch_all_song_features(db_path)
-    track_ids = all_songs["track_id"].values
-    features = all_songs.drop(columns=["track_id"])
+def compute_and_store_neighbors_blocked(
+    db_path: str,
+    top_n: int = 10,
+    block_size: int = 256,
+    feature_store: Union[FeatureStore, None] = None,
+) -> int:
+    """Computes and stores the top N neighbours of all songs.
 
-    scaler = StandardScaler()
-    features = scaler.fit_transform(features)
+    Args:
+        db_path: Path to the database.
+        top_n (optional): Number of neighbours per song. Defaults to 10.
+        block_size (optional): Number of songs per matrix product. A block
+          needs `block_size * number of songs * 4` bytes. Defaults to 256.
+        feature_store (optional): Standardized features of all songs.
+          Defaults to None (load them from the database).
+
+    Returns:
+        The number of songs whose neighbours were stored.
+    """
+    if feature_store is None:
+        feature_store = FeatureStore.from_dataframe(read_features(db_path))
+    track_ids = feature_store.track_ids
+    total = len(feature_store)
 
-    # Connect to the database
     connection = sqlite3.connect(db_path)
-    cursor = connection.cursor()
-
-    # Ensure similar_songs table exists
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS similar_songs (
-            track_id TEXT PRIMARY KEY,
-            similar_tracks TEXT
-        )
-        """
+    try:
+        rec.create_song_neighbors_table(connection)
+        start_time = time.perf_counter()
+        for start in range(0, total, block_size):
+            stop = min(start + block_size, total)
+            rows, scores = feature_store.similar_block(start, stop, top_n)
+            store_neighbours(connection, track_ids, start, rows, scores)
+
+            seconds = time.perf_counter() - start_time
+            logger.info(
+                "Computed neighbours",
+                extra={
+                    "songs": stop,
+                    "total": total,
+                    "songs_per_second": round(stop / seconds, 1) if seconds else None,
+                    "eta_seconds": round(seconds / stop * (total - stop), 1),
+                },
+            )
+        rec.bump_neighbours_generation(connection)
+        connection.commit()
+    finally:
+        connection.close()
+    rec.neighbours_changed(db_path)
+
+    logger.info(
+        "Stored the neighbours of all songs",
+        extra={"songs": total, "seconds": round(time.perf_counter() - start_time, 3)},
     )
+    return total
 
-    # Compute neighbors for each song individually
-    for idx, track_id in enumerate(track_ids):
-        # Compute cosine similarity between this song and all others
-        similarity_scores = cosine_similarity(
-            features[idx].reshape(1, -1), features
-        ).flatten()
-
-        # Get indices of the top N most similar songs (excluding the song itself)
-        similar_indices = similarity_scores.argsort()[-(top_n + 1) : -1][::-1]
-        similar_track_ids = [track_ids[i] for i in similar_indices if i != idx]
-
-        # Store results in database as a comma-separated string
-        similar_tracks_str = ",".join(similar_track_ids[:top_n])
-        cursor.execute(
-            """INSERT OR REPLACE INTO similar_songs (track_id, similar_tracks)
-               VALUES (?, ?)""",
-            (track_id, similar_tracks_str),
-        )
 
-        # Print progress
-        if (idx + 1) % 100 == 0:
-            print(f"Processed {idx + 1} of {len(track_ids)} songs.")
+def refresh_neighbours(
+    db_path: str, store_dir: str, top_n: int = 10, block_size: int = 256
+) -> int:
+    """Computes the neighbours of the songs added since the last build.
+
+    The added songs are appended to the feature store. Their neighbours are
+    computed against all songs, and the neighbours of an existing song are
+    updated if an added song scores above its least similar neighbour. Only
+    the rows of these songs are written. The ANN index does not match the
+    grown feature store and has to be rebuilt.
+
+    The grown feature store is saved after the neighbours were committed,
+    together with its `content_id`. If the refresh fails before the commit,
+    the next one computes the same songs again. If it fails after the
+    commit, the next one only saves the store.
+
+    Args:
+        db_path: Path to the database.
+        store_dir: Directory of the feature store the neighbours were
+          computed from.
+        top_n (optional): Number of neighbours per song. Defaults to 10.
+        block_size (optional): Number of songs per matrix product. Defaults
+          to 256.
+
+    Returns:
+        The number of songs whose neighbours were stored.
+
+    Raises:
+        FileNotFoundError: If the feature store was not built.
+    """
+    start_time = time.perf_counter()
+    feature_store = FeatureStore.open(store_dir)
+    all_features = read_features(db_path)
+    known = feature_store.rows(all_features["track_id"].astype(str).tolist()) >= 0
+    added = all_features[~known].drop_duplicates("track_id")
+    if added.empty:
+        logger.info("No songs were added")
+        return 0
+
+    old_total = len(feature_store)
+    feature_store = feature_store.extend(
+        added["track_id"].astype(str).tolist(),
+        added[list(FEATURE_COLUMNS)].to_numpy(dtype=np.float64),
+    )
+    track_ids = feature_store.track_ids
+    total = len(feature_store)
+    added_vectors = feature_store.normalized[old_total:]
+    store_id = feature_store.content_id()
+
+    connection = sqlite3.connect(db_path)
+    try:
+        if rec.get_neighbour_state(connection, REFRESHED_STORE) == store_id:
+            # A refresh committed the neighbours but failed to publish the store
+            logger.info("The neighbours were already refreshed")
+            feature_store.save(store_dir)
+            return 0
+
+        rec.create_song_neighbors_table(connection)
+        thresholds = _neighbour_thresholds(connection, feature_store, old_total, top_n)
+
+        for start in range(old_total, total, block_size):
+            stop = min(start + block_size, total)
+            rows, scores = feature_store.similar_block(start, stop, top_n)
+            store_neighbours(connection, track_ids, start, rows, scores)
+
+        updated = 0
+        for start in range(0, old_total, block_size):
+            stop = min(start + block_size, old_total)
+            scores = feature_store.normalized[start:stop] @ added_vectors.T
+            closer = scores > thresholds[start:stop, None]
+            changed_rows = np.flatnonzero(closer.any(axis=1))
+            if not len(changed_rows):
+                continue
+            # Only scored neighbours can be merged with the new ones
+            stored = rec.fetch_song_neighbors(
+                connection,
+                [str(track_ids[start + i]) for i in changed_rows],
+                legacy=False,
+            )
+            changed = []
+            for i in changed_rows:
+                track_id = str(track_ids[start + i])
+                neighbours = stored.get(track_id, []) + [
+                    (str(track_ids[old_total + j]), float(scores[i, j]))
+                    for j in np.flatnonzero(closer[i])
+                ]
+                neighbours.sort(key=lambda neighbour: neighbour[1], reverse=True)
+                changed.append((track_id, neighbours[:top_n]))
+            rec.store_song_neighbors(connection, changed)
+            updated += len(changed)
+        rec.set_neighbour_state(connection, REFRESHED_STORE, store_id)
+        rec.bump_neighbours_generation(connection)
+        connection.commit()
+    finally:
+        connection.close()
+    rec.neighbours_changed(db_path)
+    # Published last, so that a failed refresh finds the songs still added
+    feature_store.save(store_dir)
+
+    logger.info(
+        "Refreshed the neighbours",
+        extra={
+            "added_songs": total - old_total,
+            "updated_songs": updated,
+            "seconds": round(time.perf_counter() - start_time, 3),
+        },
+    )
+    return total - old_total + updated
+
 
-    # Commit changes and close connection
-    connection.commit()
-    cursor.close()
-    connection.close()
-    print("All neighbors computed and stored successfully.")
+def _neighbour_thresholds(
+    connection: sqlite3.Connection,
+    feature_store: FeatureStore,
+    total: int,
+    top_n: int,
+) -> np.ndarray:
+    """Returns the score a new song must exceed to be a neighbour of a song.
 
+    It is the score of the least similar stored neighbour, or -inf if a song
+    has fewer than `top_n` neighbours. Songs without stored neighbours (inf)
+    are left to be computed when they are requested.
 
-# Run the function
-db_path = "final_database.db"  # Update with the actual path to your database
-compute_and_store_neighbors_one_by_one(db_path, top_n=10)
+    Args:
+        connection: Connection to the database.
+        feature_store: The feature store.
+        total: Number of rows of the feature store to return thresholds for.
+        top_n: Number of neighbours per song.
+    """
+    thresholds = np.full(total, np.inf)
+    stored = connection.execute(
+        "SELECT track_id, MIN(score), COUNT(*) FROM song_neighbors GROUP BY track_id"
+    ).fetchall()
+    if not stored:
+        return thresholds
+    track_ids, minimum, count = zip(*stored)
+    rows = feature_store.rows(list(track_ids))
+    values = np.where(np.array(count) < top_n, -np.inf, np.array(minimum))
+    found = (rows >= 0) & (rows < total)
+    thresholds[rows[found]] = values[found]
+    return thresholds
+
+
+def compute_shard(
+    store_dir: str,
+    start: int,
+    stop: int,
+    top_n: int,
+    block_size: int,
+    checkpoint_path: str,
+) -> Tuple[int, int]:
+    """Computes the neighbours of a shard of songs and saves a checkpoint.
+
+    It runs in a worker process, which maps the feature store itself.
+
+    Args:
+        store_dir: Directory of the feature store.
+        start: First row of the shard.
+        stop: Row after the last row of the shard.
+        top_n: Number of neighbours per song.
+        block_size: Number of songs per matrix product.
+        checkpoint_path: File the neighbours of the shard are saved to.
+
+    Returns:
+        The first row and the row after the last row of the shard.
+    """
+    feature_store = get_feature_store(store_dir)
+    blocks = [
+        feature_store.similar_block(block, min(block + block_size, stop), top_n)
+        for block in range(start, stop, block_size)
+    ]
+    rows = np.concatenate([rows for rows, _ in blocks]).astype(np.int32)
+    scores = np.concatenate([scores for _, scores in blocks]).astype(np.float32)
+
+    # Written under another name first, so a checkpoint is always complete
+    partial_path = f"{checkpoint_path}.partial.npz"
+    np.savez(partial_path, rows=rows, scores=scores)
+    os.replace(partial_path, checkpoint_path)
+    return start, stop
+
+
+def _prepare_checkpoints(checkpoint_dir: str, settings: dict) -> None:
+    """Keeps the checkpoints of a build with the same settings, or removes them."""
+    manifest_path = os.path.join(checkpoint_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            if json.load(file) == settings:
+                return
+        logger.info("Discarding the checkpoints of a build with other settings")
+        shutil.rmtree(checkpoint_dir)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    with open(manifest_path, "w") as file:
+        json.dump(settings, file)
+
+
+def compute_and_store_neighbors_parallel(
+    db_path: str,
+    store_dir: str,
+    top_n: int = 10,
+    block_size: int = 256,
+    shard_size: int = 8192,
+    processes: Union[int, None] = None,
+    checkpoint_dir: Union[str, None] = None,
+) -> int:
+    """Computes the neighbours of all songs in a pool of processes.
+
+    The finished shards are saved in `checkpoint_dir`. If the build is
+    interrupted, running it again with the same settings resumes from them.
+    The checkpoints are removed once the neighbours are stored.
+
+    Args:
+        db_path: Path to the database.
+        store_dir: Directory of the feature store. It is built if it does not
+          exist.
+        top_n (optional): Number of neighbours per song. Defaults to 10.
+        block_size (optional): Number of songs per matrix product. Defaults
+          to 256.
+        shard_size (optional): Number of songs per checkpoint. Defaults to
+          8192.
+        processes (optional): Number of worker processes. Defaults to None
+          (one per CPU).
+        checkpoint_dir (optional): Directory of the checkpoints. Defaults to
+          the path of the database with the suffix ".neighbours".
+
+    Returns:
+        The number of songs whose neighbours were stored.
+    """
+    feature_store = get_feature_store(store_dir)
+    if feature_store is None:
+        feature_store = build_feature_store(db_path, store_dir)
+    total = len(feature_store)
+    checkpoint_dir = checkpoint_dir or f"{db_path}.neighbours"
+    _prepare_checkpoints(
+        checkpoint_dir,
+        {
+            "songs": total,
+            "top_n": top_n,
+            "shard_size": shard_size,
+            "store_version": versioned_dir.resolve(store_dir),
+        },
+    )
+
+    def checkpoint_path(start: int) -> str:
+        return os.path.join(checkpoint_dir, f"shard_{start:010d}.npz")
+
+    shards = [
+        (start, min(start + shard_size, total)) for start in range(0, total, shard_size)
+    ]
+    pending: List[Tuple[int, int]] = [
+        shard for shard in shards if not os.path.exists(checkpoint_path(shard[0]))
+    ]
+    logger.info(
+        "Computing the neighbours",
+        extra={"shards": len(shards), "resumed_shards": len(shards) - len(pending)},
+    )
+
+    start_time = time.perf_counter()
+    done = 0
+    with futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        tasks = [
+            executor.submit(
+                compute_shard,
+                store_dir,
+                start,
+                stop,
+                top_n,
+                block_size,
+                checkpoint_path(start),
+            )
+            for start, stop in pending
+        ]
+        for task in futures.as_completed(tasks):
+            start, stop = task.result()
+            done += stop - start
+            seconds = time.perf_counter() - start_time
+            logger.info(
+                "Computed a shard",
+                extra={
+                    "shard": start,
+                    "songs": done,
+                    "pending_songs": sum(b - a for a, b in pending) - done,
+                    "songs_per_second": round(done / seconds, 1),
+                },
+            )
+
+    connection = sqlite3.connect(db_path)
+    try:
+        rec.create_song_neighbors_table(connection)
+        for start, _ in shards:
+            with np.load(checkpoint_path(start)) as shard:
+                store_neighbours(
+                    connection,
+                    feature_store.track_ids,
+                    start,
+                    shard["rows"],
+                    shard["scores"],
+                )
+        rec.bump_neighbours_generation(connection)
+        connection.commit()
+    finally:
+        connection.close()
+    rec.neighbours_changed(db_path)
+    shutil.rmtree(checkpoint_dir)
+
+    logger.info(
+        "Stored the neighbours of all songs",
+        extra={"songs": total, "seconds": round(time.perf_counter() - start_time, 3)},
+    )
+    return total
+
+
+if __name__ == "__main__":
+    from musicCRS import log
+
+    log.setup_logging()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default=config.DB_PATH)
+    parser.add_argument("--top-n", type=int, default=config.NEIGHBOURS_K)
+    parser.add_argument("--block-size", type=int, default=256)
+    parser.add_argument(
+        "--store-dir",
+        default=config.FEATURE_STORE_DIR,
+        help="Feature store to read the features from, if it was built",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="Number of worker processes (0 computes in this process)",
+    )
+    parser.add_argument("--shard-size", type=int, default=8192)
+    parser.add_argument("--checkpoint-dir", default=None)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only compute the songs added since the feature store was built",
+    )
+    args = parser.parse_args()
+    if args.incremental:
+        refresh_neighbours(
+            args.db_path,
+            args.store_dir,
+            top_n=args.top_n,
+            block_size=args.block_size,
+        )
+    elif args.processes > 0:
+        compute_and_store_neighbors_parallel(
+            args.db_path,
+            args.store_dir,
+            top_n=args.top_n,
+            block_size=args.block_size,
+            shard_size=args.shard_size,
+            processes=args.processes,
+            checkpoint_dir=args.checkpoint_dir,
+        )
+    else:
+        compute_and_store_neighbors_blocked(
+            args.db_path,
+            top_n=args.top_n,
+            block_size=args.block_size,
+            feature_store=get_feature_store(args.store_dir),
+        )
@@ -1,11 +1,15 @@
 """Contains the DatabaseManager class."""
 
+import logging
 import os
 import sqlite3
 from typing import List, Tuple, Union
 
+from musicCRS import metrics
 from musicCRS.models.song import Song
 
+logger = logging.getLogger(__name__)
+
 
 class DatabaseManager:
     """Database Manager."""
@@ -22,6 +26,7 @@ class DatabaseManager:
         """
         self.db_path = os.path.abspath(db_path)
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def find_song_by_title_and_artist_both_given(
         self, song_title: str, artist: str
     ) -> Union[List[Song], None]:
@@ -53,7 +58,7 @@ class DatabaseManager:
             result = cursor.fetchone()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:
@@ -74,6 +79,7 @@ class DatabaseManager:
             return results
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def find_song_only_by_title(self, song_title: str) -> Union[List[Song], None]:
         """Finds a song in the database by title only.
 
@@ -99,7 +105,7 @@ class DatabaseManager:
             results = cursor.fetchall()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:
@@ -118,6 +124,7 @@ class DatabaseManager:
             return songs
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def find_album_release_date(self, album_name: str) -> Union[str, None]:
         """Fetches the release date of an album.
 
@@ -143,7 +150,7 @@ class DatabaseManager:
             result = cursor.fetchone()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:  # Tear down
@@ -151,10 +158,11 @@ class DatabaseManager:
             connection.close()
 
         if result:
-            print(result)
+            logger.debug("Release date of %s: %s", album_name, result[0])
             return result[0]
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def number_of_albums_by_artist(self, artist_name: str) -> Union[int, None]:
         """Fetches the number of albums by an artist.
 
@@ -181,7 +189,7 @@ class DatabaseManager:
             result = cursor.fetchone()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         if result[0] > 0 and result:
@@ -203,7 +211,7 @@ class DatabaseManager:
                 result = cursor.fetchone()
 
             except sqlite3.Error as e:
-                print(f"Error: {e}")
+                logger.error("Database error: %s", e)
                 return None
 
             finally:  # Tear down
@@ -216,6 +224,7 @@ class DatabaseManager:
 
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def number_of_songs_on_album(self, album_name: str) -> Union[int, None]:
         """Fetches the number of songs on an album.
 
@@ -240,7 +249,7 @@ class DatabaseManager:
             result = cursor.fetchone()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:  # Tear down
@@ -252,6 +261,7 @@ class DatabaseManager:
 
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def duration_of_album(self, album_name: str) -> Union[float, None]:
         """Fetches the duration of an album.
 
@@ -283,7 +293,7 @@ class DatabaseManager:
                 return None
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:  # Tear down
@@ -295,6 +305,7 @@ class DatabaseManager:
 
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def most_popular_song_by_artist(self, artist_name: str) -> Union[str, None]:
         """Fetches the most popular song by an artist.
 
@@ -339,7 +350,7 @@ class DatabaseManager:
                     result = cursor.fetchone()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:  # Tear down
@@ -350,6 +361,7 @@ class DatabaseManager:
             return result[0]
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def get_id_for_album(self, album_name: str) -> Union[str, None]:
         """Fetches the ID for an album.
 
@@ -375,7 +387,7 @@ class DatabaseManager:
             result = cursor.fetchone()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:  # Tear down
@@ -387,6 +399,7 @@ class DatabaseManager:
 
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def get_id_for_artist(self, artist_name: str) -> Union[str, None]:
         """Fetches the ID for an artist.
 
@@ -410,7 +423,7 @@ class DatabaseManager:
             result = cursor.fetchone()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:  # Tear down
@@ -421,6 +434,7 @@ class DatabaseManager:
             return result[0]
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def album_for_song(
         self, song_title: str
     ) -> Union[Tuple[str, str], Tuple[None, None]]:
@@ -466,7 +480,7 @@ class DatabaseManager:
                     return result[0], result[1]
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None, None
 
         finally:
@@ -477,6 +491,7 @@ class DatabaseManager:
 
     # ----- Functions for the Surface Dictionaries -----
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def fetch_transformed_artist_id(self, artist_name: str) -> Union[str, None]:
         """Fetches the transformed artist ID.
 
@@ -505,7 +520,7 @@ class DatabaseManager:
             result = cursor.fetchone()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:
@@ -516,6 +531,7 @@ class DatabaseManager:
             return result[0]
         return None  # artist not found
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def fetch_transformed_song_ids(self, song_name: str) -> Union[List[str], None]:
         """Fetches the transformed song IDs.
 
@@ -544,7 +560,7 @@ class DatabaseManager:
             results = cursor.fetchall()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:
@@ -556,6 +572,7 @@ class DatabaseManager:
 
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def fetch_transformed_songs_by_artist(
         self, song_name: str, artist_name: str
     ) -> Union[List[Song], None]:
@@ -600,7 +617,7 @@ class DatabaseManager:
             results = cursor.fetchall()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:
@@ -611,6 +628,7 @@ class DatabaseManager:
             return [Song(*result) for result in results]
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def fetch_transformed_songs_by_title(
         self, song_title: str
     ) -> Union[List[Song], None]:
@@ -643,7 +661,7 @@ class DatabaseManager:
             results = cursor.fetchall()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:
@@ -654,6 +672,7 @@ class DatabaseManager:
             return [Song(*result) for result in results]
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def fetch_transformed_song_name(self, song_name: str) -> Union[List[str], None]:
         """Fetches the song name for a misspelled name.
 
@@ -682,7 +701,7 @@ class DatabaseManager:
             result = cursor.fetchall()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return None
 
         finally:
@@ -693,6 +712,7 @@ class DatabaseManager:
             return result
         return None
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def create_similar_songs_table(self) -> None:
         """Creates the similar_songs table in the database.
 
@@ -712,6 +732,7 @@ class DatabaseManager:
         cursor.close()
         connection.close()
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def fetch_songs_by_track_ids(self, track_ids: List[str]) -> List[Song]:
         """Fetches songs by their track IDs.
 
@@ -732,7 +753,7 @@ class DatabaseManager:
             results = cursor.fetchall()
 
         except sqlite3.Error as e:
-            print(f"Error: {e}")
+            logger.error("Database error: %s", e)
             return []
 
         finally:
@@ -741,6 +762,7 @@ class DatabaseManager:
 
         return [Song(*result) for result in results]
 
+    @metrics.timed(metrics.DB_QUERY_SECONDS, "query")
     def query_songs_for_playlist_generation(
         self,
         tempo_range: List[int],
@@ -837,7 +859,7 @@ class DatabaseManager:
                 songs += select_songs_with_duration_check(results)
 
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
+            logger.error("Database error: %s", e)
 
         finally:
             if cursor:
@@ -0,0 +1,409 @@
+"""Contains the FeatureStore class.
+
+The feature store holds the standardized audio features of all songs as a
+float32 matrix in a `.npy` file, with the track ids of the rows alongside. It
+is built once from the music database and opened memory-mapped and
+read-only, so all worker processes of the backend share the pages of the
+matrix instead of each holding a copy of the features table.
+
+The mean and scale of the standardization are saved with the matrix, so
+songs added later are standardized the same way, and so is a copy of the
+matrix with rows of unit length, whose dot products are the cosine
+similarities of the songs.
+
+To build it execute the following command from the root directory:
+
+`python -m musicCRS.data.feature_store`
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from musicCRS import config
+from musicCRS.data import versioned_dir
+
+logger = logging.getLogger(__name__)
+
+# Columns of the music table that make up the feature vector of a song
+FEATURE_COLUMNS = (
+    "danceability",
+    "energy",
+    "valence",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "speechiness",
+    "tempo",
+    "loudness",
+    "track_popularity",
+    "artist_popularity",
+    "album_popularity",
+)
+
+# Files of a feature store directory
+FEATURES_FILE = "features.npy"
+NORMALIZED_FILE = "normalized.npy"
+SCALER_FILE = "scaler.json"
+TRACK_IDS_FILE = "track_ids.npy"
+SORTED_TRACK_IDS_FILE = "sorted_track_ids.npy"
+SORTED_ROWS_FILE = "sorted_rows.npy"
+
+
+def read_features(db_path: str) -> pd.DataFrame:
+    """Reads the track ids and the features of all songs from the database."""
+    connection = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql(
+            f"SELECT track_id, {', '.join(FEATURE_COLUMNS)} FROM music", connection
+        )
+    finally:
+        connection.close()
+
+
+class FeatureStore:
+    """Standardized features of all songs with a lookup by track id.
+
+    Attributes:
+        track_ids: Track id of each row.
+        features: Standardized features, one float32 row per song.
+        normalized: The standardized features scaled to unit length.
+        mean: Mean of each feature column before the standardization.
+        scale: Standard deviation of each feature column (1 if it is 0).
+        build_id: Hash of the track ids and features of a saved store, None
+          if the store was not saved.
+    """
+
+    def __init__(
+        self,
+        track_ids: np.ndarray,
+        features: np.ndarray,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        normalized: Union[np.ndarray, None] = None,
+        sorted_track_ids: Union[np.ndarray, None] = None,
+        sorted_rows: Union[np.ndarray, None] = None,
+        build_id: Union[str, None] = None,
+    ) -> None:
+        """Feature store.
+
+        Args:
+            track_ids: Track id of each row.
+            features: Standardized features, one row per song.
+            mean: Mean of each feature column before the standardization.
+            scale: Standard deviation of each feature column.
+            normalized (optional): The features scaled to unit length.
+              Defaults to None (scale them).
+            sorted_track_ids (optional): The track ids in sorted order.
+              Defaults to None (sort them).
+            sorted_rows (optional): Row of each of the sorted track ids.
+              Defaults to None (sort them).
+            build_id (optional): Hash of the saved store. Defaults to None.
+        """
+        self.track_ids = track_ids
+        self.features = features
+        self.mean = mean
+        self.scale = scale
+        if normalized is None:
+            normalized = normalize(features)
+        self.normalized = normalized
+        if sorted_track_ids is None or sorted_rows is None:
+            sorted_rows = np.argsort(track_ids, kind="stable")
+            sorted_track_ids = track_ids[sorted_rows]
+        self._sorted_track_ids = sorted_track_ids
+        self._sorted_rows = sorted_rows
+        self.build_id = build_id
+
+    @classmethod
+    def from_dataframe(cls, all_features: pd.DataFrame) -> "FeatureStore":
+        """Creates a feature store from the features of all songs.
+
+        Args:
+            all_features: DataFrame with the track ids and `FEATURE_COLUMNS`.
+        """
+        values = all_features[list(FEATURE_COLUMNS)].to_numpy(dtype=np.float64)
+        mean = values.mean(axis=0)
+        scale = values.std(axis=0)
+        scale[scale == 0] = 1.0
+        features = ((values - mean) / scale).astype(np.float32)
+        track_ids = all_features["track_id"].to_numpy().astype(str)
+        return cls(track_ids, features, mean, scale)
+
+    @classmethod
+    def open(cls, store_dir: str) -> "FeatureStore":
+        """Opens a saved feature store memory-mapped and read-only.
+
+        Args:
+            store_dir: Directory of the feature store.
+
+        Raises:
+            FileNotFoundError: If the directory holds no feature store.
+        """
+        version_dir = versioned_dir.resolve(store_dir)
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(version_dir, name), mmap_mode="r")
+
+        with open(os.path.join(version_dir, SCALER_FILE)) as file:
+            scaler = json.load(file)
+        return cls(
+            load(TRACK_IDS_FILE),
+            load(FEATURES_FILE),
+            np.array(scaler["mean"]),
+            np.array(scaler["scale"]),
+            load(NORMALIZED_FILE),
+            load(SORTED_TRACK_IDS_FILE),
+            load(SORTED_ROWS_FILE),
+            scaler.get("build_id"),
+        )
+
+    def save(self, store_dir: str) -> None:
+        """Saves the feature store.
+
+        The files are written to a new version of the directory that is then
+        published atomically (see `versioned_dir`), so that readers never see
+        a half-written or a missing store. Sets `build_id`, which indexes
+        built from the store record.
+
+        Args:
+            store_dir: Directory of the feature store.
+        """
+        self.build_id = self.content_id()
+        new_dir = versioned_dir.new_version(store_dir)
+        np.save(os.path.join(new_dir, TRACK_IDS_FILE), self.track_ids)
+        np.save(os.path.join(new_dir, FEATURES_FILE), self.features)
+        np.save(os.path.join(new_dir, NORMALIZED_FILE), self.normalized)
+        with open(os.path.join(new_dir, SCALER_FILE), "w") as file:
+            json.dump(
+                {
+                    "columns": FEATURE_COLUMNS,
+                    "mean": self.mean.tolist(),
+                    "scale": self.scale.tolist(),
+                    "build_id": self.build_id,
+                },
+                file,
+            )
+        np.save(os.path.join(new_dir, SORTED_TRACK_IDS_FILE), self._sorted_track_ids)
+        np.save(os.path.join(new_dir, SORTED_ROWS_FILE), self._sorted_rows)
+        versioned_dir.publish(store_dir, new_dir)
+
+    def content_id(self) -> str:
+        """Returns a hash of the track ids and the features.
+
+        It is the `build_id` the store gets when it is saved.
+        """
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(self.track_ids).tobytes())
+        digest.update(np.ascontiguousarray(self.features).tobytes())
+        return digest.hexdigest()
+
+    def transform(self, values: np.ndarray) -> np.ndarray:
+        """Standardizes raw feature rows like the rows of the store.
+
+        Args:
+            values: Raw features, one row per song in the order of
+              `FEATURE_COLUMNS`.
+        """
+        return ((np.asarray(values, dtype=np.float64) - self.mean) / self.scale).astype(
+            np.float32
+        )
+
+    def extend(self, track_ids: List[str], values: np.ndarray) -> "FeatureStore":
+        """Returns a feature store with songs appended.
+
+        The new rows are standardized with the mean and scale of this store,
+        so the rows already in it keep their values.
+
+        Args:
+            track_ids: Track ids of the new songs.
+            values: Raw features of the new songs, one row per song in the
+              order of `FEATURE_COLUMNS`.
+        """
+        features = self.transform(values).reshape(len(track_ids), -1)
+        return FeatureStore(
+            np.concatenate([self.track_ids, np.asarray(track_ids, dtype=str)]),
+            np.concatenate([self.features, features]),
+            self.mean,
+            self.scale,
+            np.concatenate([self.normalized, normalize(features)]),
+        )
+
+    def similar(self, row: int, top_n: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the most similar songs of a song by cosine similarity.
+
+        Args:
+            row: Row of the song.
+            top_n (optional): Number of similar songs. Defaults to 10.
+
+        Returns:
+            The rows of the similar songs (without the song itself) and their
+            similarities, most similar first.
+        """
+        rows, scores = self.similar_block(row, row + 1, top_n)
+        return rows[0], scores[0]
+
+    def search(
+        self,
+        vector: np.ndarray,
+        top_n: int = 10,
+        exclude: Union[np.ndarray, None] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the songs most similar to a vector by cosine similarity.
+
+        Args:
+            vector: Query vector of unit length in the normalized space.
+            top_n (optional): Number of songs. Defaults to 10.
+            exclude (optional): Rows that are never returned. Defaults to
+              None.
+
+        Returns:
+            The rows of the songs and their similarities, most similar first.
+        """
+        scores = self.normalized @ vector
+        if exclude is not None and len(exclude):
+            scores[exclude] = -np.inf
+        top, top_scores = top_k(scores[None, :], min(top_n, len(scores)))
+        found = np.isfinite(top_scores[0])
+        return top[0][found], top_scores[0][found]
+
+    def similar_block(
+        self, start: int, stop: int, top_n: int = 10
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the most similar songs of a block of consecutive rows.
+
+        The similarities of the block against all songs are computed with one
+        matrix product, which needs `(stop - start) * len(self) * 4` bytes.
+
+        Args:
+            start: First row of the block.
+            stop: Row after the last row of the block.
+            top_n (optional): Number of similar songs per row. Defaults to 10.
+
+        Returns:
+            For each row of the block, the rows of the similar songs (without
+            the song itself) and their similarities, most similar first.
+        """
+        scores = self.normalized[start:stop] @ self.normalized.T
+        scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        return top_k(scores, min(top_n, len(self) - 1))
+
+    def rows(self, track_ids: List[str]) -> np.ndarray:
+        """Returns the rows of the given track ids, -1 for unknown ids."""
+        if len(self._sorted_track_ids) == 0:
+            return np.full(len(track_ids), -1, dtype=np.int64)
+        wanted = np.asarray(track_ids, dtype=str)
+        positions = np.searchsorted(self._sorted_track_ids, wanted)
+        positions = np.minimum(positions, len(self._sorted_track_ids) - 1)
+        found = self._sorted_track_ids[positions] == wanted
+        return np.where(found, self._sorted_rows[positions], -1).astype(np.int64)
+
+    def row(self, track_id: str) -> Union[int, None]:
+        """Returns the row of a track id, or None if it is unknown."""
+        row = int(self.rows([track_id])[0])
+        return row if row >= 0 else None
+
+    def __len__(self) -> int:
+        """Returns the number of songs."""
+        return len(self.track_ids)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Selects the k highest scores of each row.
+
+    Args:
+        scores: Matrix of scores, one row per query.
+        k: Number of scores to select per row.
+
+    Returns:
+        The columns and the values of the selected scores, highest first.
+    """
+    if k <= 0:
+        empty = np.empty((len(scores), 0))
+        return empty.astype(np.int64), empty.astype(scores.dtype)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(
+        top_scores, order, axis=1
+    )
+
+
+def normalize(features: np.ndarray) -> np.ndarray:
+    """Scales the rows of a matrix to unit length (rows of zeros stay zero)."""
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (features / norms).astype(np.float32)
+
+
+def build_feature_store(db_path: str, store_dir: str) -> FeatureStore:
+    """Builds the feature store of a music database.
+
+    Args:
+        db_path: Path to the music database.
+        store_dir: Directory of the feature store.
+
+    Returns:
+        The feature store, opened from the saved files.
+    """
+    start = time.perf_counter()
+    FeatureStore.from_dataframe(read_features(db_path)).save(store_dir)
+    store = FeatureStore.open(store_dir)
+    logger.info(
+        "Built the feature store",
+        extra={
+            "songs": len(store),
+            "store_dir": store_dir,
+            "seconds": round(time.perf_counter() - start, 3),
+        },
+    )
+    return store
+
+
+_stores: Dict[str, FeatureStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_feature_store(store_dir: Union[str, None] = None) -> Union[FeatureStore, None]:
+    """Returns the shared feature store of this process.
+
+    Args:
+        store_dir (optional): Directory of the feature store. Defaults to
+          `config.FEATURE_STORE_DIR`.
+
+    Returns:
+        The feature store, or None if it was not built.
+    """
+    store_dir = store_dir or config.FEATURE_STORE_DIR
+    with _stores_lock:
+        if store_dir not in _stores:
+            try:
+                _stores[store_dir] = FeatureStore.open(store_dir)
+            except FileNotFoundError:
+                return None
+        return _stores[store_dir]
+
+
+def clear_feature_stores() -> None:
+    """Forgets the opened feature stores, so a rebuilt store is opened."""
+    with _stores_lock:
+        _stores.clear()
+
+
+if __name__ == "__main__":
+    from musicCRS import log
+
+    log.setup_logging()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default=config.DB_PATH)
+    parser.add_argument("--store-dir", default=config.FEATURE_STORE_DIR)
+    args = parser.parse_args()
+    build_feature_store(args.db_path, args.store_dir)
@@ -0,0 +1,139 @@
+"""Contains the NeighbourWriter class.
+
+The backend computes the neighbours of a song when they are requested and not
+stored yet. Instead of writing them to the database within the request, they
+are handed to the writer, which buffers them in memory and writes them in
+batches from a background thread. Each flush is a single transaction, so the
+requests of a process no longer contend for the write lock of SQLite.
+
+The database is switched to write-ahead logging, so that readers are not
+blocked while a batch is written, and a busy timeout lets a flush wait for
+the writers of other processes instead of failing.
+"""
+
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Union
+
+from musicCRS.data import recommendations as rec
+
+logger = logging.getLogger(__name__)
+
+
+class NeighbourWriter:
+    """Writes computed neighbours to the song_neighbors table in batches."""
+
+    def __init__(
+        self, db_path: str, flush_interval: float = 1.0, busy_timeout: float = 5.0
+    ) -> None:
+        """Neighbour writer.
+
+        Args:
+            db_path: Path to the music database.
+            flush_interval (optional): Seconds between two flushes. With 0
+              the neighbours are written synchronously. Defaults to 1.0.
+            busy_timeout (optional): Seconds a flush waits for the write lock
+              held by another connection. Defaults to 5.0.
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.busy_timeout = busy_timeout
+
+        self._pending: Dict[str, rec.Neighbours] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+        self._pid = os.getpid()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens a connection to the music database."""
+        connection = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _run(self) -> None:
+        """Flushes the pending neighbours until the writer is closed."""
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _start(self) -> None:
+        """Starts the background thread on the first write of a process.
+
+        It is not started in `__init__`, so that a worker forked from a
+        process with a writer starts its own thread.
+        """
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(
+            target=self._run, name="neighbour-writer", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, track_id: str, neighbours: rec.Neighbours) -> None:
+        """Stores the neighbours of a song.
+
+        The neighbours are only buffered. They are written on the next flush,
+        replacing neighbours of the same song that are still pending.
+
+        Args:
+            track_id: Track id of the song.
+            neighbours: The neighbours of the song.
+        """
+        with self._pending_lock:
+            self._pending[track_id] = neighbours
+        if self.flush_interval > 0 and not self._stop.is_set():
+            with self._flush_lock:
+                self._start()
+        else:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes all pending neighbours in a single transaction.
+
+        If the transaction fails, the neighbours are kept pending unless they
+        were replaced in the meantime, and the error is logged.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            try:
+                connection = self._connect()
+                try:
+                    with connection:
+                        rec.create_song_neighbors_table(connection)
+                        replaced = rec.store_song_neighbors(connection, pending.items())
+                finally:
+                    connection.close()
+                if replaced:
+                    rec.neighbours_changed(self.db_path)
+            except sqlite3.Error:
+                logger.exception(
+                    "Writing the neighbours failed", extra={"songs": len(pending)}
+                )
+                with self._pending_lock:
+                    self._pending = {**pending, **self._pending}
+
+    def close(self, timeout: Union[float, None] = None) -> None:
+        """Stops the background thread and writes the pending neighbours.
+
+        Args:
+            timeout (optional): Seconds to wait for the background thread.
+              Defaults to None (wait until it stopped).
+        """
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+
+    def __len__(self) -> int:
+        """Returns the number of songs whose neighbours are pending."""
+        return len(self._pending)
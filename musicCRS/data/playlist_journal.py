@@ -0,0 +1,294 @@
+"""Contains the PlaylistJournal class.
+
+The journal persists the state of the playlists of the backend. Every change
+of a playlist is appended to an operation log in a SQLite database. Once a
+playlist has accumulated enough operations, they are compacted into a
+snapshot, so that restoring a playlist only has to replay a few operations.
+
+Writes are buffered in memory and flushed in batches by a background thread.
+Each flush is a single transaction, which SQLite syncs to disk on commit.
+"""
+
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Tuple, Union
+
+from musicCRS.models.playlist import Playlist
+from musicCRS.models.song import Song
+
+logger = logging.getLogger(__name__)
+
+# Operations that can be recorded in the journal
+ADD = "add"
+DELETE = "delete"
+CLEAR = "clear"
+REORDER = "reorder"
+REPLACE = "replace"
+
+
+def apply_operation(songs: List[Song], operation: str, payload: Any) -> List[Song]:
+    """Applies a journal operation to a list of songs.
+
+    Args:
+        songs: The songs of the playlist before the operation.
+        operation: One of "add", "delete", "clear", "reorder" or "replace".
+        payload: The payload of the operation. The serialized song for "add",
+          the list of positions for "delete", the new order of the old
+          positions for "reorder" and the serialized songs for "replace".
+
+    Returns:
+        The songs of the playlist after the operation.
+
+    Raises:
+        ValueError: If the operation is unknown.
+    """
+    if operation == ADD:
+        songs.append(Song.deserialize(payload))
+    elif operation == DELETE:
+        for position in sorted(set(payload), reverse=True):
+            if 0 <= position < len(songs):
+                songs.pop(position)
+    elif operation == CLEAR:
+        songs = []
+    elif operation == REORDER:
+        if sorted(payload) == list(range(len(songs))):
+            songs = [songs[position] for position in payload]
+    elif operation == REPLACE:
+        songs = [Song.deserialize(data) for data in payload]
+    else:
+        raise ValueError(f"Unknown journal operation: {operation}")
+    return songs
+
+
+class PlaylistJournal:
+    """Append-only operation log with snapshots for playlists."""
+
+    def __init__(
+        self,
+        db_path: str,
+        flush_interval: float = 1.0,
+        snapshot_every: int = 200,
+    ) -> None:
+        """Playlist journal.
+
+        Args:
+            db_path: Path to the SQLite file of the journal. It is created if
+              it does not exist.
+            flush_interval (optional): Seconds between two flushes. With 0
+              every operation is written synchronously. Defaults to 1.0.
+            snapshot_every (optional): Number of operations of a playlist
+              after which it is compacted into a snapshot. Defaults to 200.
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+
+        self._pending: List[Tuple[str, str, str]] = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._ops_since_snapshot: Dict[str, int] = {}
+        self._stop = threading.Event()
+
+        self._create_tables()
+
+        self._thread = None
+        if self.flush_interval > 0:
+            self._thread = threading.Thread(
+                target=self._run, name="playlist-journal", daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens a connection to the journal database."""
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Sync the write-ahead log to disk on every commit
+        connection.execute("PRAGMA synchronous=FULL")
+        return connection
+
+    def _create_tables(self) -> None:
+        """Creates the tables of the journal if they do not exist."""
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS playlist_operations (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    playlist TEXT NOT NULL,
+                    operation TEXT NOT NULL,
+                    payload TEXT
+                )
+                """
+            )
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS playlist_snapshots (
+                    playlist TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL,
+                    songs TEXT NOT NULL
+                )
+                """
+            )
+        connection.close()
+
+    def _run(self) -> None:
+        """Flushes the pending operations until the journal is closed."""
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def record(self, playlist: str, operation: str, payload: Any = None) -> None:
+        """Appends an operation to the journal.
+
+        The operation is only buffered. It is written on the next flush.
+
+        Args:
+            playlist: Name of the playlist.
+            operation: One of "add", "delete", "clear", "reorder" or
+              "replace".
+            payload (optional): Payload of the operation, see
+              `apply_operation`. Defaults to None.
+        """
+        with self._pending_lock:
+            self._pending.append((playlist, operation, json.dumps(payload)))
+        if self._thread is None:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes all pending operations in a single transaction.
+
+        Playlists that reached the snapshot threshold are compacted afterwards.
+        If the transaction fails, the operations are kept pending ahead of the
+        ones recorded in the meantime, and the error is logged.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+
+            written = False
+            try:
+                connection = self._connect()
+                try:
+                    with connection:
+                        connection.executemany(
+                            """INSERT INTO playlist_operations
+                                   (playlist, operation, payload)
+                               VALUES (?, ?, ?)""",
+                            pending,
+                        )
+                    written = True
+
+                    for playlist, _, _ in pending:
+                        self._ops_since_snapshot[playlist] = (
+                            self._ops_since_snapshot.get(playlist, 0) + 1
+                        )
+                    for playlist, count in list(self._ops_since_snapshot.items()):
+                        if count >= self.snapshot_every:
+                            self._compact(connection, playlist)
+                finally:
+                    connection.close()
+            except sqlite3.Error:
+                logger.exception(
+                    "Writing the playlist journal failed",
+                    extra={"operations": len(pending), "written": written},
+                )
+                if not written:
+                    with self._pending_lock:
+                        self._pending = pending + self._pending
+
+    def compact(self, playlist: str) -> None:
+        """Folds the logged operations of a playlist into its snapshot.
+
+        Args:
+            playlist: Name of the playlist.
+        """
+        self.flush()
+        with self._flush_lock:
+            connection = self._connect()
+            self._compact(connection, playlist)
+            connection.close()
+
+    def _compact(self, connection: sqlite3.Connection, playlist: str) -> None:
+        """Compacts a playlist, the caller must hold the flush lock."""
+        with connection:
+            songs, seq = self._replay(connection, playlist)
+            connection.execute(
+                """INSERT OR REPLACE INTO playlist_snapshots (playlist, seq, songs)
+                   VALUES (?, ?, ?)""",
+                (playlist, seq, json.dumps([song.serialize() for song in songs])),
+            )
+            connection.execute(
+                "DELETE FROM playlist_operations WHERE playlist=? AND seq<=?",
+                (playlist, seq),
+            )
+        self._ops_since_snapshot[playlist] = 0
+
+    def _replay(
+        self, connection: sqlite3.Connection, playlist: str
+    ) -> Tuple[List[Song], int]:
+        """Rebuilds a playlist from its snapshot and the logged operations.
+
+        Returns:
+            A tuple of the songs and the sequence number of the last operation.
+        """
+        row = connection.execute(
+            "SELECT seq, songs FROM playlist_snapshots WHERE playlist=?",
+            (playlist,),
+        ).fetchone()
+        seq = row[0] if row else 0
+        songs = [Song.deserialize(data) for data in json.loads(row[1])] if row else []
+
+        operations = connection.execute(
+            """SELECT seq, operation, payload FROM playlist_operations
+               WHERE playlist=? AND seq>? ORDER BY seq""",
+            (playlist, seq),
+        ).fetchall()
+        for seq, operation, payload in operations:
+            songs = apply_operation(songs, operation, json.loads(payload))
+        return songs, seq
+
+    def load(self, playlist: str) -> List[Song]:
+        """Loads the persisted songs of a playlist.
+
+        Args:
+            playlist: Name of the playlist.
+
+        Returns:
+            The songs of the playlist, empty if nothing was persisted.
+        """
+        self.flush()
+        with self._flush_lock:
+            connection = self._connect()
+            songs, _ = self._replay(connection, playlist)
+            connection.close()
+        return songs
+
+    def attach(self, playlist: Playlist) -> None:
+        """Restores a playlist and records its future changes.
+
+        Args:
+            playlist: The Playlist object. Its songs are replaced by the
+              persisted ones.
+        """
+        # Compact on startup, so that the next restore is fast as well
+        self.compact(playlist.name)
+        playlist.songs = self.load(playlist.name)
+        playlist.version += 1
+        playlist.journal = self
+
+    def close(self, timeout: Union[float, None] = None) -> None:
+        """Stops the background thread and writes the pending operations.
+
+        Args:
+            timeout (optional): Seconds to wait for the background thread.
+              Defaults to None (wait until it stopped).
+        """
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
@@ -1,16 +1,202 @@
 """This module contains the functions that are used to generate recommadations.
 
 The recommendations are generated based on the current playlist.
+
+The neighbours of each song are stored in the `song_neighbors` table, one row
+per neighbour with its rank and its cosine similarity (score). Databases built
+before that have the neighbours as comma-joined track ids in the
+`similar_songs` table, which is still read if a song has no scored
+neighbours.
+
+`get_centroid_recommendations` is an alternative that needs no neighbours: it
+recommends the songs closest to the centroid of the playlist. Either ranking
+can be diversified with `rerank_mmr`. `get_recommendations_batch` ranks many
+playlists at once, e.g. for offline evaluations.
 """
 
+import hashlib
+import logging
 import sqlite3
-from typing import List
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import StandardScaler
 
+from musicCRS import metrics
+from musicCRS.data.ann_index import LSHIndex
+from musicCRS.data.feature_store import FeatureStore
+
+logger = logging.getLogger(__name__)
+
+# Neighbours of a song as (track id, score) pairs, most similar first
+Neighbours = List[Tuple[str, float]]
+
+# Score of the neighbours stored without a score in the similar_songs table
+LEGACY_SCORE = 1.0
+
+# Key of the neighbour_state table that counts the changes of stored
+# neighbours, see `neighbours_generation`
+GENERATION = "generation"
+
+# Seconds a process reuses the generation it read from a database
+GENERATION_CHECK_INTERVAL = 1.0
+
+# Generation of each database by path, with the time it was read
+_generations: Dict[str, Tuple[float, int]] = {}
+_generations_lock = threading.Lock()
+
+
+def create_song_neighbors_table(connection: sqlite3.Connection) -> None:
+    """Creates the song_neighbors table if it does not exist.
+
+    The rows are clustered by track id, so the neighbours of a song are read
+    with one range scan. The neighbour_state table next to it holds values
+    that are written in the same transactions as the neighbours (see
+    `get_neighbour_state`).
+    """
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS song_neighbors (
+            track_id TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            neighbor_id TEXT NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (track_id, rank)
+        ) WITHOUT ROWID
+        """
+    )
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS neighbour_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """
+    )
+
+
+def get_neighbour_state(connection: sqlite3.Connection, key: str) -> Union[str, None]:
+    """Returns a value of the neighbour_state table, or None if it is unset."""
+    try:
+        row = connection.execute(
+            "SELECT value FROM neighbour_state WHERE key = ?", (key,)
+        ).fetchone()
+    except sqlite3.OperationalError:  # no neighbour_state table yet
+        return None
+    return row[0] if row else None
+
+
+def set_neighbour_state(connection: sqlite3.Connection, key: str, value: str) -> None:
+    """Sets a value of the neighbour_state table, the caller commits."""
+    connection.execute(
+        "INSERT OR REPLACE INTO neighbour_state (key, value) VALUES (?, ?)",
+        (key, value),
+    )
+
+
+def store_song_neighbors(
+    connection: sqlite3.Connection, neighbours: Iterable[Tuple[str, Neighbours]]
+) -> bool:
+    """Replaces the stored neighbours of songs.
+
+    Args:
+        connection: Connection to the database. The caller commits.
+        neighbours: Pairs of a track id and the neighbours of the song.
+
+    Returns:
+        Whether neighbours were stored for any of the songs before. If so,
+        the generation was incremented (see `neighbours_generation`), and
+        `neighbours_changed` should be called after the commit.
+    """
+    neighbours = list(neighbours)
+    replaced = connection.executemany(
+        "DELETE FROM song_neighbors WHERE track_id = ?",
+        ((track_id,) for track_id, _ in neighbours),
+    ).rowcount
+    connection.executemany(
+        """INSERT INTO song_neighbors (track_id, rank, neighbor_id, score)
+           VALUES (?, ?, ?, ?)""",
+        (
+            (track_id, rank, str(neighbor_id), float(score))
+            for track_id, similar in neighbours
+            for rank, (neighbor_id, score) in enumerate(similar)
+        ),
+    )
+    if replaced > 0:
+        bump_neighbours_generation(connection)
+    return replaced > 0
+
+
+def bump_neighbours_generation(connection: sqlite3.Connection) -> None:
+    """Increments the generation of the stored neighbours.
 
+    Call it in the transaction that changes stored neighbours, the caller
+    commits. The neighbour_state table must exist.
+    """
+    connection.execute(
+        """INSERT INTO neighbour_state (key, value) VALUES (?, '1')
+           ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1""",
+        (GENERATION,),
+    )
+
+
+def neighbours_generation(db_path: str) -> int:
+    """Returns the generation of the stored neighbours of a database.
+
+    The generation is a counter in the database that every change of stored
+    neighbours increments, whichever process made it. It is part of the keys
+    of the cached recommendations and neighbours, so these are no longer
+    found once the neighbours changed. The value read is reused for
+    `GENERATION_CHECK_INTERVAL` seconds, so the changes of other processes
+    are seen with that delay.
+
+    Args:
+        db_path: Path to the database.
+    """
+    now = time.monotonic()
+    with _generations_lock:
+        checked = _generations.get(db_path)
+    if checked is not None and now - checked[0] < GENERATION_CHECK_INTERVAL:
+        return checked[1]
+
+    connection = sqlite3.connect(db_path)
+    try:
+        generation = int(get_neighbour_state(connection, GENERATION) or 0)
+    finally:
+        connection.close()
+    with _generations_lock:
+        _generations[db_path] = (now, generation)
+    return generation
+
+
+def neighbours_changed(db_path: str) -> None:
+    """Reads the generation again after this process changed neighbours.
+
+    Call it after the transaction was committed, so that the caches of this
+    process are invalidated at once (see `neighbours_generation`).
+
+    Args:
+        db_path: Path to the database.
+    """
+    with _generations_lock:
+        _generations.pop(db_path, None)
+
+
+def neighbour_cache_key(track_id: str, generation: int) -> str:
+    """Returns the key of the neighbours of a track in a neighbour cache.
+
+    Args:
+        track_id: Track id of the song.
+        generation: See `neighbours_generation`.
+    """
+    return f"{track_id}@{generation}"
+
+
+@metrics.timed(metrics.DB_QUERY_SECONDS, "query")
 def fetch_all_song_features(db_path: str) -> pd.DataFrame:
     """Fetches all song features from the database."""
     connection = sqlite3.connect(db_path)
@@ -25,7 +211,8 @@ def fetch_all_song_features(db_path: str) -> pd.DataFrame:
     return all_features
 
 
-def get_cached_neighbors(db_path: str, track_id: str) -> List[str]:
+@metrics.timed(metrics.DB_QUERY_SECONDS, "query")
+def get_cached_neighbors(db_path: str, track_id: str) -> Neighbours:
     """Retrieves cached similar tracks for a given track ID.
 
     Args:
@@ -33,71 +220,201 @@ def get_cached_neighbors(db_path: str, track_id: str) -> List[str]:
         track_id: The track ID for which to retrieve neighbors.
 
     Returns:
-        A list of similar track IDs. If no neighbors are cached, an empty list
-        is returned.
+        The similar tracks with their scores. If no neighbors are cached, an
+        empty list is returned.
     """
     connection = sqlite3.connect(db_path)
-    cursor = connection.cursor()
-    cursor.execute(
-        "SELECT similar_tracks FROM similar_songs WHERE track_id = ?", (track_id,)
+    try:
+        return connection.execute(
+            """SELECT neighbor_id, score FROM song_neighbors
+               WHERE track_id = ? ORDER BY rank""",
+            (track_id,),
+        ).fetchall() or _get_legacy_neighbors(connection, track_id)
+    except sqlite3.OperationalError:  # no song_neighbors table yet
+        return _get_legacy_neighbors(connection, track_id)
+    finally:
+        connection.close()
+
+
+def fetch_song_neighbors(
+    connection: sqlite3.Connection, track_ids: List[str], legacy: bool = True
+) -> Dict[str, Neighbours]:
+    """Reads the neighbours of many songs.
+
+    Like `get_cached_neighbors`, songs without scored neighbours fall back to
+    the similar_songs table.
+
+    Args:
+        connection: Connection to the database.
+        track_ids: The track IDs for which to retrieve neighbors.
+        legacy (optional): Whether to read the similar_songs table. Defaults
+          to True.
+
+    Returns:
+        The neighbours by track ID. Songs without neighbours are missing.
+    """
+    neighbours: Dict[str, Neighbours] = {}
+    track_ids = list(dict.fromkeys(track_ids))
+    # Queried in chunks below SQLite's limit of the number of parameters
+    for start in range(0, len(track_ids), 900):
+        chunk = track_ids[start : start + 900]
+        try:
+            rows = connection.execute(
+                f"""SELECT track_id, neighbor_id, score FROM song_neighbors
+                    WHERE track_id IN ({",".join(["?"] * len(chunk))})
+                    ORDER BY track_id, rank""",
+                chunk,
+            ).fetchall()
+        except sqlite3.OperationalError:  # no song_neighbors table yet
+            break
+        for track_id, neighbor_id, score in rows:
+            neighbours.setdefault(track_id, []).append((neighbor_id, score))
+
+    if legacy:
+        missing = [track_id for track_id in track_ids if track_id not in neighbours]
+        neighbours.update(_fetch_legacy_neighbors(connection, missing))
+    return neighbours
+
+
+def _fetch_legacy_neighbors(
+    connection: sqlite3.Connection, track_ids: List[str]
+) -> Dict[str, Neighbours]:
+    """Reads the neighbours of many songs from the similar_songs table."""
+    neighbours: Dict[str, Neighbours] = {}
+    for start in range(0, len(track_ids), 900):
+        chunk = track_ids[start : start + 900]
+        try:
+            rows = connection.execute(
+                f"""SELECT track_id, similar_tracks FROM similar_songs
+                    WHERE track_id IN ({",".join(["?"] * len(chunk))})""",
+                chunk,
+            ).fetchall()
+        except sqlite3.OperationalError:  # no similar_songs table
+            break
+        for track_id, similar_tracks in rows:
+            neighbours[track_id] = [
+                (neighbor_id, LEGACY_SCORE) for neighbor_id in similar_tracks.split(",")
+            ]
+    return neighbours
+
+
+def _get_legacy_neighbors(connection: sqlite3.Connection, track_id: str) -> Neighbours:
+    """Reads the neighbours of a song from the similar_songs table."""
+    try:
+        result = connection.execute(
+            "SELECT similar_tracks FROM similar_songs WHERE track_id = ?", (track_id,)
+        ).fetchone()
+    except sqlite3.OperationalError:  # no similar_songs table
+        return []
+    return (
+        [(neighbor_id, LEGACY_SCORE) for neighbor_id in result[0].split(",")]
+        if result
+        else []
     )
-    result = cursor.fetchone()
-    connection.close()
-    return result[0].split(",") if result else []
 
 
+@metrics.timed(metrics.DB_QUERY_SECONDS, "query")
 def compute_and_store_neighbors(
-    db_path: str, track_id: str, all_features: pd.DataFrame, top_n: int = 10
-) -> List[str]:
+    db_path: str,
+    track_id: str,
+    all_features: Union[pd.DataFrame, None] = None,
+    top_n: int = 10,
+    feature_store: Union[FeatureStore, None] = None,
+    ann_index: Union[LSHIndex, None] = None,
+    probes: int = 0,
+    writer: Any = None,
+) -> Neighbours:
     """Computes and stores the top N neighbors for a specific track ID.
 
     Args:
         db_path: Path to the database.
         track_id: The track ID for which to compute neighbors.
-        all_features: DataFrame containing all song features.
+        all_features (optional): DataFrame containing all song features.
+          Required without a feature store. Defaults to None.
         top_n (optional): Number of neighbors to return. Defaults to 10.
+        feature_store (optional): Features of all songs with the persisted
+          standardization, used instead of `all_features` if given. Defaults
+          to None.
+        ann_index (optional): Index of the feature store to find the
+          neighbours approximately instead of scoring all songs. Defaults to
+          None.
+        probes (optional): Additional buckets searched per table of the
+          index. Defaults to 0.
+        writer (optional): Background writer with `put` that stores the
+          neighbours later, so they are returned without waiting for the
+          database. Defaults to None (store them before returning).
 
     Returns:
-        A list of the top N similar track IDs.
+        The top N similar tracks with their cosine similarities.
     """
-    # Extract features for all songs
-    track_ids = all_features["track_id"].values
-    features = all_features.drop(columns=["track_id"])
+    if feature_store is not None:
+        # The store holds the standardized features scaled to unit length, so
+        # one matrix-vector product gives the cosine similarities
+        row = feature_store.row(track_id)
+        if ann_index is not None:
+            similar_indices, scores = ann_index.similar(
+                feature_store, row, top_n, probes
+            )
+        else:
+            similar_indices, scores = feature_store.similar(row, top_n)
+        similar_tracks = [
+            (str(feature_store.track_ids[i]), float(score))
+            for i, score in zip(similar_indices, scores)
+        ]
+    else:
+        # Extract features for all songs
+        track_ids = all_features["track_id"].values
+        features = all_features.drop(columns=["track_id"])
 
-    # Normalize features
-    scaler = StandardScaler()
-    features = scaler.fit_transform(features)
+        # Normalize features
+        scaler = StandardScaler()
+        features = scaler.fit_transform(features)
 
-    # Find the index of the track_id in the features dataset
-    song_idx = all_features[all_features["track_id"] == track_id].index[0]
+        # Find the index of the track_id in the features dataset
+        song_idx = all_features[all_features["track_id"] == track_id].index[0]
 
-    # Compute cosine similarity for this song against all others
-    similarity_scores = cosine_similarity(
-        features[song_idx].reshape(1, -1), features
-    ).flatten()
-    similar_indices = similarity_scores.argsort()[-(top_n + 1) : -1][
-        ::-1
-    ]  # Top N neighbors excluding itself
-    similar_track_ids = [track_ids[i] for i in similar_indices if i != song_idx]
+        # Compute cosine similarity for this song against all others
+        similarity_scores = cosine_similarity(
+            features[song_idx].reshape(1, -1), features
+        ).flatten()
+        similar_indices = similarity_scores.argsort()[-(top_n + 1) : -1][
+            ::-1
+        ]  # Top N neighbors excluding itself
+        similar_tracks = [
+            (track_ids[i], float(similarity_scores[i]))
+            for i in similar_indices
+            if i != song_idx
+        ]
 
     # Cache the result in the database
+    if writer is not None:
+        writer.put(track_id, similar_tracks)
+        return similar_tracks
     connection = sqlite3.connect(db_path)
-    cursor = connection.cursor()
-    similar_tracks_str = ",".join(similar_track_ids)
-    cursor.execute(
-        """INSERT OR REPLACE INTO similar_songs (track_id, similar_tracks)
-           VALUES (?, ?)""",
-        (track_id, similar_tracks_str),
-    )
-    connection.commit()
-    cursor.close()
-    connection.close()
+    try:
+        create_song_neighbors_table(connection)
+        replaced = store_song_neighbors(connection, [(track_id, similar_tracks)])
+        connection.commit()
+    finally:
+        connection.close()
+    if replaced:
+        neighbours_changed(db_path)
 
-    return similar_track_ids
+    return similar_tracks
 
 
 def get_recommendations(
-    db_path: str, playlist_track_ids: List[str], top_n: int = 10
+    db_path: str,
+    playlist_track_ids: List[str],
+    top_n: int = 10,
+    all_features: Union[pd.DataFrame, None] = None,
+    neighbour_cache: Any = None,
+    feature_store: Union[FeatureStore, None] = None,
+    ann_index: Union[LSHIndex, None] = None,
+    probes: int = 0,
+    result_cache: Any = None,
+    neighbour_writer: Any = None,
+    neighbours_k: int = 10,
 ) -> List[str]:
     """Generates ranked recommendations based on the current playlist.
 
@@ -106,48 +423,351 @@ def get_recommendations(
         playlist_track_ids: The track IDs in the current playlist.
         top_n (optional): Number of recommendations to retrieve. Defaults to
           10.
+        all_features (optional): The features of all songs, if they are
+          already loaded. Defaults to None (load them from the database).
+        neighbour_cache (optional): In-memory cache with `get` and `put` that
+          is checked before the database, keyed by `neighbour_cache_key`.
+          Defaults to None.
+        feature_store (optional): Standardized features of all songs. If
+          given, neighbours are computed from it and the features are never
+          loaded from the database. Tracks missing from it are skipped.
+          Defaults to None.
+        ann_index (optional): Index of the feature store, used to find the
+          neighbours that are not cached. Defaults to None (exact search).
+        probes (optional): Additional buckets searched per table of the
+          index. Defaults to 0.
+        result_cache (optional): In-memory cache with `get` and `put` for the
+          results by `playlist_fingerprint`. A playlist that is cached without
+          one of its tracks reuses the summed scores of that entry. Defaults
+          to None.
+        neighbour_writer (optional): Background writer of the computed
+          neighbours, see `compute_and_store_neighbors`. Defaults to None.
+        neighbours_k (optional): Number of neighbours computed for the tracks
+          without stored neighbours. It must match the stored ones, see
+          `config.NEIGHBOURS_K`, and not `top_n`. Defaults to 10.
+
+    Returns:
+        A list of the top N recommended track IDs. Ranked by the sum of the
+        scores of a song as a neighbour of the playlist tracks, then by the
+        popularity of the song.
+    """
+    generation = (
+        neighbours_generation(db_path)
+        if result_cache is not None or neighbour_cache is not None
+        else 0
+    )
+    fingerprint = playlist_fingerprint(playlist_track_ids, top_n, generation)
+    previous_scores = None
+    new_track_ids = playlist_track_ids
+    if result_cache is not None:
+        cached = result_cache.get(fingerprint)
+        if cached is not None:
+            metrics.CACHE_REQUESTS.inc(cache="recommendations", result="hit")
+            return list(cached[1])
+
+        # The scores are sums over the playlist tracks, so a playlist that grew
+        # by one track only needs the neighbours of that track. The track may
+        # have been added anywhere, so each track is tried
+        distinct = set(playlist_track_ids)
+        if len(distinct) == len(playlist_track_ids) > 1:
+            for track_id in playlist_track_ids:
+                previous = result_cache.get(
+                    playlist_fingerprint(list(distinct - {track_id}), top_n, generation)
+                )
+                if previous is not None:
+                    previous_scores = previous[0]
+                    new_track_ids = [track_id]
+                    break
+        metrics.CACHE_REQUESTS.inc(
+            cache="recommendations",
+            result="miss" if previous_scores is None else "incremental",
+        )
+
+    all_recommendations = _collect_neighbours(
+        db_path,
+        new_track_ids,
+        neighbours_k,
+        all_features,
+        neighbour_cache,
+        feature_store,
+        ann_index,
+        probes,
+        neighbour_writer,
+        generation,
+    )
+
+    # Sum the scores of each recommendation, so that songs that are close
+    # neighbours of many playlist tracks rank first
+    candidates = pd.DataFrame(all_recommendations, columns=["track_id", "score"])
+    recommendation_scores = candidates.groupby("track_id")["score"].sum()
+    if previous_scores is not None:
+        recommendation_scores = previous_scores.add(
+            recommendation_scores, fill_value=0.0
+        )
+
+    recommendations = _rank_recommendations(
+        db_path, recommendation_scores, playlist_track_ids, top_n
+    )
+    if result_cache is not None:
+        result_cache.put(fingerprint, (recommendation_scores, recommendations))
+    return recommendations
+
+
+def get_recommendations_batch(
+    db_path: str,
+    playlists: List[List[str]],
+    top_n: int = 10,
+    all_features: Union[pd.DataFrame, None] = None,
+    feature_store: Union[FeatureStore, None] = None,
+    ann_index: Union[LSHIndex, None] = None,
+    probes: int = 0,
+    neighbour_writer: Any = None,
+    neighbours_k: int = 10,
+) -> List[List[str]]:
+    """Generates the recommendations of many playlists at once.
+
+    The recommendations equal those of `get_recommendations` for each
+    playlist. The stored neighbours of all tracks and the popularity of all
+    candidates are read in one query each (per 900 tracks), and the scores
+    are summed and ranked for all playlists with group operations. Tracks
+    without stored neighbours are computed as in `get_recommendations`.
+
+    Args:
+        db_path: Path to the database.
+        playlists: The track IDs of each playlist.
+        top_n (optional): Number of recommendations per playlist. Defaults
+          to 10.
+        all_features (optional): See `get_recommendations`. Defaults to None.
+        feature_store (optional): See `get_recommendations`. Defaults to
+          None.
+        ann_index (optional): See `get_recommendations`. Defaults to None.
+        probes (optional): See `get_recommendations`. Defaults to 0.
+        neighbour_writer (optional): See `get_recommendations`. Defaults to
+          None.
+        neighbours_k (optional): See `get_recommendations`. Defaults to 10.
 
     Returns:
-        A list of the top N recommended track IDs. Ranked based on how often
-        songs have the same neighbors, or the popularity of the song.
+        The top N recommended track IDs of each playlist, in the order of the
+        playlists.
     """
-    all_features = fetch_all_song_features(db_path)
+    start_time = time.perf_counter()
+    track_ids = list(
+        dict.fromkeys(track_id for tracks in playlists for track_id in tracks)
+    )
+    connection = sqlite3.connect(db_path)
+    try:
+        neighbours = fetch_song_neighbors(connection, track_ids)
+    finally:
+        connection.close()
+
+    missing = [track_id for track_id in track_ids if track_id not in neighbours]
+    if missing and feature_store is None and all_features is None:
+        all_features = fetch_all_song_features(db_path)
+    for track_id in missing:
+        neighbours[track_id] = _collect_neighbours(
+            db_path,
+            [track_id],
+            neighbours_k,
+            all_features,
+            None,
+            feature_store,
+            ann_index,
+            probes,
+            neighbour_writer,
+        )
+
+    members = pd.DataFrame(
+        [(i, track_id) for i, tracks in enumerate(playlists) for track_id in tracks],
+        columns=["playlist", "track_id"],
+    )
+    edges = pd.DataFrame(
+        [
+            (track_id, neighbor_id, score)
+            for track_id, similar in neighbours.items()
+            for neighbor_id, score in similar
+        ],
+        columns=["track_id", "neighbor_id", "score"],
+    )
+    # Sum the scores of each candidate per playlist, as in get_recommendations
+    candidates = (
+        members.merge(edges, on="track_id")
+        .groupby(["playlist", "neighbor_id"], as_index=False)["score"]
+        .sum()
+    )
+    candidates["track_popularity"] = candidates["neighbor_id"].map(
+        _fetch_popularity(db_path, candidates["neighbor_id"].unique().tolist())
+    )
+    candidates.sort_values(
+        by=["playlist", "score", "track_popularity", "neighbor_id"],
+        ascending=[True, False, False, True],
+        inplace=True,
+    )
+    in_playlist = (
+        candidates.merge(
+            members.drop_duplicates().rename(columns={"track_id": "neighbor_id"}),
+            on=["playlist", "neighbor_id"],
+            how="left",
+            indicator=True,
+        )["_merge"]
+        == "both"
+    ).to_numpy()
+    ranked = (
+        candidates[~in_playlist]
+        .groupby("playlist")
+        .head(top_n)
+        .groupby("playlist")["neighbor_id"]
+        .agg(list)
+    )
+    # Songs of the playlist fill up the recommendations if there are too few
+    padding = candidates[in_playlist].groupby("playlist")["neighbor_id"].agg(sorted)
+
+    recommendations = []
+    for i in range(len(playlists)):
+        recommended = ranked.get(i, [])
+        if len(recommended) < top_n:
+            recommended = recommended + padding.get(i, [])[: top_n - len(recommended)]
+        recommendations.append(recommended)
+
+    seconds = time.perf_counter() - start_time
+    logger.info(
+        "Generated the recommendations of a batch of playlists",
+        extra={
+            "playlists": len(playlists),
+            "tracks": len(track_ids),
+            "computed_tracks": len(missing),
+            "seconds": round(seconds, 3),
+            "playlists_per_second": round(len(playlists) / seconds, 1)
+            if seconds
+            else None,
+        },
+    )
+    return recommendations
+
+
+def _fetch_popularity(db_path: str, track_ids: List[str]) -> pd.Series:
+    """Returns the popularity of the given tracks by track ID."""
+    connection = sqlite3.connect(db_path)
+    try:
+        chunks = [
+            pd.read_sql(
+                f"""SELECT track_id, track_popularity FROM music
+                    WHERE track_id IN ({",".join(["?"] * len(chunk))})""",
+                connection,
+                params=chunk,
+            )
+            for chunk in (
+                track_ids[start : start + 900]
+                for start in range(0, len(track_ids), 900)
+            )
+        ]
+    finally:
+        connection.close()
+    if not chunks:
+        return pd.Series(dtype=float)
+    popularity = pd.concat(chunks).drop_duplicates("track_id")
+    return popularity.set_index("track_id")["track_popularity"]
+
+
+def playlist_fingerprint(
+    playlist_track_ids: List[str], top_n: int, generation: int = 0
+) -> str:
+    """Returns a key of a playlist that does not depend on the track order.
+
+    Args:
+        playlist_track_ids: The track IDs in the playlist.
+        top_n: Number of recommendations.
+        generation (optional): Generation of the stored neighbours the
+          recommendations are computed from, see `neighbours_generation`.
+          Defaults to 0.
+    """
+    content = "\n".join(sorted(set(playlist_track_ids))) + f"\n{top_n}\n{generation}"
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def _collect_neighbours(
+    db_path: str,
+    track_ids: List[str],
+    neighbours_k: int,
+    all_features: Union[pd.DataFrame, None],
+    neighbour_cache: Any,
+    feature_store: Union[FeatureStore, None],
+    ann_index: Union[LSHIndex, None],
+    probes: int,
+    neighbour_writer: Any,
+    generation: int = 0,
+) -> Neighbours:
+    """Returns the neighbours of all given tracks (see `get_recommendations`)."""
     all_recommendations = []
 
     # For each track in the playlist, fetch or compute similar tracks
-    for track_id in playlist_track_ids:
-        similar_tracks = get_cached_neighbors(db_path, track_id)
+    for track_id in track_ids:
+        similar_tracks = None
+        cache_key = neighbour_cache_key(track_id, generation)
+        if neighbour_cache is not None:
+            similar_tracks = neighbour_cache.get(cache_key)
+        if not similar_tracks:
+            similar_tracks = get_cached_neighbors(db_path, track_id)
+        if not similar_tracks and feature_store is not None:
+            if feature_store.row(track_id) is None:
+                continue
+            similar_tracks = compute_and_store_neighbors(
+                db_path,
+                track_id,
+                top_n=neighbours_k,
+                feature_store=feature_store,
+                ann_index=ann_index,
+                probes=probes,
+                writer=neighbour_writer,
+            )
         if not similar_tracks:  # If not cached, compute and store
+            if all_features is None:
+                all_features = fetch_all_song_features(db_path)
             similar_tracks = compute_and_store_neighbors(
-                db_path, track_id, all_features, top_n
+                db_path, track_id, all_features, neighbours_k, writer=neighbour_writer
             )
+        if neighbour_cache is not None:
+            neighbour_cache.put(cache_key, similar_tracks)
         all_recommendations.extend(similar_tracks)
+    return all_recommendations
 
-    # Count occurrences of each recommendation
-    recommendation_counts = pd.Series(all_recommendations).value_counts()
 
+def _rank_recommendations(
+    db_path: str,
+    recommendation_scores: pd.Series,
+    playlist_track_ids: List[str],
+    top_n: int,
+) -> List[str]:
+    """Ranks the candidates by their score, then by their popularity.
+
+    Args:
+        db_path: Path to the database.
+        recommendation_scores: Summed score of each candidate by track ID.
+        playlist_track_ids: The track IDs in the playlist, which are only
+          recommended if there are not enough other candidates.
+        top_n: Number of recommendations.
+    """
     # Load track popularity for sorting
     connection = sqlite3.connect(db_path)
     popularity_query = (
         "SELECT track_id, track_popularity FROM music WHERE track_id IN ({})"
     )
-    format_strings = ",".join(["?"] * len(recommendation_counts.index))
+    format_strings = ",".join(["?"] * len(recommendation_scores.index))
     popularity_data = pd.read_sql(
         popularity_query.format(format_strings),
         connection,
-        params=recommendation_counts.index.tolist(),
+        params=recommendation_scores.index.tolist(),
     )
     connection.close()
 
-    # Merge counts and popularity for sorting
+    # Merge scores and popularity for sorting
     popularity_df = popularity_data.set_index("track_id").reindex(
-        recommendation_counts.index
+        recommendation_scores.index
     )
-    popularity_df["count"] = recommendation_counts.values
+    popularity_df["score"] = recommendation_scores.values
 
-    # Sort first by count (descending), then by track popularity (descending)
+    # Sort first by score (descending), then by track popularity (descending)
     popularity_df.sort_values(
-        by=["count", "track_popularity"], ascending=[False, False], inplace=True
+        by=["score", "track_popularity"], ascending=[False, False], inplace=True
     )
 
     # Filter out any songs that are already in the playlist
@@ -164,3 +784,130 @@ def get_recommendations(
             : top_n - len(recommended_songs)
         ]
     )
+
+
+def get_centroid_recommendations(
+    feature_store: FeatureStore,
+    playlist_track_ids: List[str],
+    top_n: int = 10,
+    weights: Union[List[float], None] = None,
+    ann_index: Union[LSHIndex, None] = None,
+    probes: int = 0,
+) -> List[str]:
+    """Generates recommendations close to the centroid of the playlist.
+
+    The centroid is the weighted mean of the normalized features of the
+    playlist tracks. All songs are scored against it with one matrix-vector
+    product (or only the candidates of the ANN index), and the playlist tracks
+    are excluded while scoring, so the time does not grow with the length of
+    the playlist and no neighbours are looked up.
+
+    Args:
+        feature_store: Standardized features of all songs.
+        playlist_track_ids: The track IDs in the current playlist.
+        top_n (optional): Number of recommendations to retrieve. Defaults to
+          10.
+        weights (optional): Weight of each playlist track, e.g. to favour the
+          recently added ones. Defaults to None (equal weights).
+        ann_index (optional): Index of the feature store. Defaults to None
+          (score all songs).
+        probes (optional): Additional buckets searched per table of the
+          index. Defaults to 0.
+
+    Returns:
+        A list of the top N recommended track IDs, closest first. Tracks
+        missing from the feature store are ignored.
+    """
+    rows = feature_store.rows(playlist_track_ids)
+    known = rows >= 0
+    if not known.any():
+        return []
+    weights = np.ones(len(rows)) if weights is None else np.asarray(weights, float)
+
+    centroid = weights[known] @ feature_store.normalized[rows[known]]
+    norm = np.linalg.norm(centroid)
+    if norm > 0:
+        centroid = centroid / norm
+    centroid = centroid.astype(np.float32)
+
+    if ann_index is not None:
+        found, _ = ann_index.search(
+            feature_store, centroid, top_n, probes, exclude=rows[known]
+        )
+    else:
+        found, _ = feature_store.search(centroid, top_n, exclude=rows[known])
+    return [str(feature_store.track_ids[row]) for row in found]
+
+
+def rerank_mmr(
+    track_ids: List[str],
+    feature_store: FeatureStore,
+    artists: Dict[str, str],
+    albums: Dict[str, str],
+    top_n: int = 10,
+    diversity: float = 0.3,
+    max_per_artist: int = 0,
+    max_per_album: int = 0,
+) -> List[str]:
+    """Re-ranks recommendations by maximal marginal relevance.
+
+    Songs are picked one at a time by their relevance (from their rank in
+    `track_ids`) minus `diversity` times their highest similarity to the songs
+    already picked, so near-duplicates of a picked song move down. Songs of an
+    artist or album that reached its cap are skipped, unless too few other
+    songs are left to fill the slate.
+
+    Args:
+        track_ids: The candidates, best first.
+        feature_store: Standardized features of all songs.
+        artists: Artist of each candidate.
+        albums: Album of each candidate.
+        top_n (optional): Number of songs to pick. Defaults to 10.
+        diversity (optional): Weight of the similarity to the picked songs,
+          from 0.0 (keep the ranking) to 1.0. Defaults to 0.3.
+        max_per_artist (optional): Maximum number of songs per artist, 0 for
+          no limit. Defaults to 0.
+        max_per_album (optional): Maximum number of songs per album, 0 for no
+          limit. Defaults to 0.
+
+    Returns:
+        The picked track IDs in the order they were picked.
+    """
+    if not track_ids:
+        return []
+    rows = feature_store.rows(track_ids)
+    vectors = np.where(
+        (rows >= 0)[:, None], feature_store.normalized[np.maximum(rows, 0)], 0.0
+    )
+    similarities = vectors @ vectors.T
+    relevance = 1.0 - np.arange(len(track_ids)) / len(track_ids)
+    max_similarity = np.zeros(len(track_ids))
+    available = np.ones(len(track_ids), dtype=bool)
+    artist_counts: Dict[str, int] = {}
+    album_counts: Dict[str, int] = {}
+
+    def capped(index: int) -> bool:
+        artist = artists.get(track_ids[index])
+        album = albums.get(track_ids[index])
+        return bool(
+            (max_per_artist and artist_counts.get(artist, 0) >= max_per_artist)
+            or (max_per_album and album_counts.get(album, 0) >= max_per_album)
+        )
+
+    picked: List[int] = []
+    while len(picked) < min(top_n, len(track_ids)):
+        scores = (1.0 - diversity) * relevance - diversity * max_similarity
+        scores[~available] = -np.inf
+        allowed = np.array([available[i] and not capped(i) for i in range(len(scores))])
+        if allowed.any():
+            scores[~allowed] = -np.inf
+        index = int(np.argmax(scores))
+
+        picked.append(index)
+        available[index] = False
+        max_similarity = np.maximum(max_similarity, similarities[:, index])
+        artist = artists.get(track_ids[index])
+        album = albums.get(track_ids[index])
+        artist_counts[artist] = artist_counts.get(artist, 0) + 1
+        album_counts[album] = album_counts.get(album, 0) + 1
+    return [track_ids[index] for index in picked]
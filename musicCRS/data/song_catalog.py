@@ -0,0 +1,108 @@
+"""Contains the SongCatalog class.
+
+The catalog looks up songs by track id. Songs that were looked up recently are
+kept in a bounded LRU cache, so the backend can rebuild songs from track ids
+without a database query per request.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Union
+
+from musicCRS import config, metrics
+from musicCRS.data import database_manager
+from musicCRS.models.song import Song
+
+
+class SongCatalog:
+    """Song catalog with an LRU cache in front of the music database."""
+
+    def __init__(self, db_path: str, cache_size: int = 10000) -> None:
+        """Song catalog.
+
+        Args:
+            db_path: Path to the music database.
+            cache_size (optional): Maximum number of cached songs. Defaults to
+              10000.
+        """
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, Song] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_songs(self, track_ids: List[str]) -> List[Song]:
+        """Returns the songs with the given track ids.
+
+        The songs are returned in the order of the track ids. Unknown track
+        ids are skipped.
+
+        Args:
+            track_ids: List of track ids.
+
+        Returns:
+            List of song objects.
+        """
+        found: Dict[str, Song] = {}
+        with self._lock:
+            for track_id in track_ids:
+                if track_id in self._cache:
+                    self._cache.move_to_end(track_id)
+                    found[track_id] = self._cache[track_id]
+
+        hits = sum(1 for track_id in track_ids if track_id in found)
+        metrics.CACHE_REQUESTS.inc(hits, cache="songs", result="hit")
+        metrics.CACHE_REQUESTS.inc(len(track_ids) - hits, cache="songs", result="miss")
+
+        missing = list(dict.fromkeys(i for i in track_ids if i not in found))
+        if missing:
+            db_manager = database_manager.DatabaseManager(self.db_path)
+            songs = db_manager.fetch_songs_by_track_ids(missing)
+            for song in songs:
+                found[song.track_id] = song
+            self.put(songs)
+
+        return [found[track_id] for track_id in track_ids if track_id in found]
+
+    def get_song(self, track_id: str) -> Union[Song, None]:
+        """Returns the song with the given track id, or None if it is unknown.
+
+        Args:
+            track_id: Track id of the song.
+        """
+        songs = self.get_songs([track_id])
+        return songs[0] if songs else None
+
+    def put(self, songs: List[Song]) -> None:
+        """Adds songs to the cache.
+
+        Args:
+            songs: The songs to cache.
+        """
+        with self._lock:
+            for song in songs:
+                self._cache[song.track_id] = song
+                self._cache.move_to_end(song.track_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def __len__(self) -> int:
+        """Returns the number of cached songs."""
+        return len(self._cache)
+
+
+_catalogs: Dict[str, SongCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(db_path: Union[str, None] = None) -> SongCatalog:
+    """Returns the shared catalog for a database.
+
+    Args:
+        db_path (optional): Path to the music database. Defaults to
+          `config.DB_PATH`.
+    """
+    db_path = db_path or config.DB_PATH
+    with _catalogs_lock:
+        if db_path not in _catalogs:
+            _catalogs[db_path] = SongCatalog(db_path, cache_size=config.SONG_CACHE_SIZE)
+        return _catalogs[db_path]
@@ -0,0 +1,84 @@
+"""Directories whose content is replaced atomically.
+
+A versioned directory holds every saved version in a subdirectory of its own
+and a `current` symlink to the latest one. A new version is written to a new
+subdirectory and then published by replacing the symlink with `os.replace`,
+which is atomic. A reader therefore finds either the old or the new version,
+and a crash while saving leaves the old version in place.
+
+The previous version is kept for readers that resolved the symlink just
+before it was replaced, older versions are removed. Only one process may save
+a directory at a time.
+"""
+
+import os
+import shutil
+import time
+import uuid
+
+# Name of the symlink to the current version
+CURRENT = "current"
+
+# Number of versions kept, including the current one
+KEEP_VERSIONS = 2
+
+# Prefix of the subdirectories of the versions
+_VERSION_PREFIX = "v"
+
+
+def new_version(root: str) -> str:
+    """Creates the subdirectory for a new version.
+
+    Args:
+        root: The versioned directory. It is created if it does not exist.
+
+    Returns:
+        The path of the empty subdirectory.
+    """
+    os.makedirs(root, exist_ok=True)
+    # Named by creation time, so the names sort from the oldest version
+    path = os.path.join(
+        root, f"{_VERSION_PREFIX}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    )
+    os.makedirs(path)
+    return path
+
+
+def publish(root: str, version_dir: str) -> None:
+    """Makes a written version the current one and removes older versions.
+
+    Args:
+        root: The versioned directory.
+        version_dir: Subdirectory of the version, see `new_version`.
+    """
+    name = os.path.basename(version_dir)
+    temporary = os.path.join(root, f".{CURRENT}-{uuid.uuid4().hex}")
+    os.symlink(name, temporary)
+    os.replace(temporary, os.path.join(root, CURRENT))
+
+    versions = sorted(
+        entry
+        for entry in os.listdir(root)
+        if entry.startswith(_VERSION_PREFIX) and entry <= name
+    )
+    for entry in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+def resolve(root: str) -> str:
+    """Returns the directory of the current version.
+
+    Read all files of a version from the returned path, so that they belong
+    to the same version even if a new one is published meanwhile.
+
+    Args:
+        root: The versioned directory.
+
+    Returns:
+        The subdirectory of the current version, or `root` itself if it holds
+        no versions (a directory saved before versioning).
+    """
+    link = os.path.join(root, CURRENT)
+    if os.path.islink(link):
+        return os.path.realpath(link)
+    return root
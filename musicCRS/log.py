@@ -0,0 +1,152 @@
+"""Structured, non-blocking logging for the musicCRS services.
+
+The modules log through standard loggers below "musicCRS", e.g.
+`logging.getLogger(__name__)`, and pass structured fields with `extra`:
+
+    logger.info("turn", extra={"session_id": session_id, "intent": intent})
+
+`setup_logging` sends the records through a queue to a background thread that
+writes them as JSON lines, so a logging call never waits for the output
+stream. Records below WARNING can be sampled to reduce the volume under load.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Union
+
+from musicCRS import config
+
+# Attributes every LogRecord has, everything else was passed with `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "taskName"}
+
+_listener: Union[QueueListener, None] = None
+_setup_lock = threading.Lock()
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as a JSON line with its structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Formats a record.
+
+        Args:
+            record: The log record.
+
+        Returns:
+            The JSON line.
+        """
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            {
+                key: value
+                for key, value in vars(record).items()
+                if key not in _RECORD_ATTRIBUTES
+            }
+        )
+        if record.levelno >= logging.WARNING:
+            entry["function"] = record.funcName
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """Queue handler that keeps the traceback apart from the message.
+
+    The stock handler formats the traceback into the message before the
+    record is queued, so the formatter of the listener cannot write it as a
+    field of its own.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Prepares a record for the queue.
+
+        The message is merged with its arguments and the traceback is
+        formatted into `exc_text`, so the queued record holds no references to
+        the arguments or the frames.
+
+        Args:
+            record: The log record.
+
+        Returns:
+            A copy of the record.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a share of the records below WARNING."""
+
+    def __init__(self, rate: float) -> None:
+        """Sampling filter.
+
+        Args:
+            rate: Share of the records below WARNING that are kept, from 0.0
+              to 1.0.
+        """
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Decides whether a record is kept."""
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def setup_logging(
+    level: Union[str, None] = None, sample_rate: Union[float, None] = None
+) -> None:
+    """Configures the "musicCRS" loggers to log asynchronously as JSON lines.
+
+    Calling it again has no effect.
+
+    Args:
+        level (optional): Minimum level, e.g. "INFO". Defaults to
+          `config.LOG_LEVEL`.
+        sample_rate (optional): Share of the records below WARNING that are
+          kept. Defaults to `config.LOG_SAMPLE_RATE`.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(JSONFormatter())
+
+        log_queue: queue.Queue[logging.LogRecord] = queue.Queue(-1)
+        queue_handler = StructuredQueueHandler(log_queue)
+        queue_handler.addFilter(
+            SamplingFilter(
+                config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+            )
+        )
+
+        logger = logging.getLogger("musicCRS")
+        logger.setLevel((level or config.LOG_LEVEL).upper())
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+        _listener = QueueListener(log_queue, stream_handler)
+        _listener.start()
+        atexit.register(_listener.stop)
@@ -0,0 +1,406 @@
+"""Metrics of the musicCRS services in the Prometheus text format.
+
+The metrics are collected in a process-wide registry. The backend serves them
+on its `/metrics` endpoint, the agent process with `start_http_server`.
+
+Example:
+    REQUESTS = metrics.counter("musiccrs_requests_total", "Requests.", ["route"])
+    REQUESTS.inc(route="/songs")
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+# Upper bounds of the latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+class Metric:
+    """Base class of the metrics.
+
+    Attributes:
+        name: Name of the metric.
+        documentation: Help text of the metric.
+        label_names: Names of the labels.
+    """
+
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, label_names: Sequence[str] = ()
+    ) -> None:
+        """Metric.
+
+        Args:
+            name: Name of the metric.
+            documentation: Help text of the metric.
+            label_names (optional): Names of the labels. Defaults to none.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, Any]) -> LabelValues:
+        """Returns the label values in the order of the label names.
+
+        Raises:
+            ValueError: If the labels do not match the label names.
+        """
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"{self.name} expects the labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        """Formats label values as `{name="value",...}`."""
+        pairs = [
+            f'{name}="{_escape(value)}"'
+            for name, value in zip(self.label_names, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        """Returns the sample lines of the metric."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Renders the metric in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """Value that only goes up, e.g. the number of requests."""
+
+    kind = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, label_names: Sequence[str] = ()
+    ) -> None:
+        """Counter. See `Metric`."""
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Increases the counter.
+
+        Args:
+            amount (optional): Amount to add. Defaults to 1.0.
+            **labels: The label values.
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        """Returns the value for the given labels."""
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        """Returns the sample lines of the metric."""
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Metric):
+    """Value that goes up and down, e.g. the number of active sessions.
+
+    Instead of being set, a gauge can read its value from a function when the
+    metrics are rendered (see `set_function`).
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, label_names: Sequence[str] = ()
+    ) -> None:
+        """Gauge. See `Metric`."""
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        """Sets the gauge to a value."""
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Increases the gauge."""
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        """Decreases the gauge."""
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels: Any) -> None:
+        """Reads the value from a function whenever the gauge is rendered."""
+        key = self._label_values(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def value(self, **labels: Any) -> float:
+        """Returns the value for the given labels."""
+        key = self._label_values(labels)
+        with self._lock:
+            function = self._functions.get(key)
+            value = self._values.get(key, 0.0)
+        return function() if function is not None else value
+
+    def samples(self) -> List[str]:
+        """Returns the sample lines of the metric."""
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        values.update({key: function() for key, function in functions.items()})
+        return [
+            f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. latencies."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        """Histogram. See `Metric`.
+
+        Args:
+            buckets (optional): Upper bounds of the buckets. Defaults to
+              `DEFAULT_BUCKETS`.
+        """
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: counts per bucket, sum and count
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Records a value.
+
+        Args:
+            value: The observed value.
+            **labels: The label values.
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observes the duration of the `with` block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: Any) -> int:
+        """Returns the number of observations for the given labels."""
+        with self._lock:
+            entry = self._values.get(self._label_values(labels))
+        return entry[2] if entry is not None else 0
+
+    def samples(self) -> List[str]:
+        """Returns the sample lines of the metric."""
+        with self._lock:
+            values = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            }
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = self._format_labels(key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = self._format_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics."""
+
+    def __init__(self) -> None:
+        """Registry."""
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds a metric, or returns the registered one with the same name.
+
+        Raises:
+            ValueError: If another kind of metric has the same name.
+        """
+        with self._lock:
+            registered = self._metrics.setdefault(metric.name, metric)
+        if type(registered) is not type(metric):
+            raise ValueError(
+                f"{metric.name} is already registered as {registered.kind}"
+            )
+        return registered
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+    """Creates a counter in the default registry."""
+    return REGISTRY.register(Counter(name, documentation, labels))
+
+
+def gauge(name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+    """Creates a gauge in the default registry."""
+    return REGISTRY.register(Gauge(name, documentation, labels))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labels: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    """Creates a histogram in the default registry."""
+    return REGISTRY.register(Histogram(name, documentation, labels, buckets))
+
+
+def timed(metric: Histogram, label: str) -> Callable:
+    """Decorator that observes the duration of every call of a function.
+
+    Args:
+        metric: Histogram with a single label.
+        label: Name of the label, its value is the name of the function.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with metric.time(**{label: function.__name__}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# ----- Metrics shared by the services -----
+
+DB_QUERY_SECONDS = histogram(
+    "musiccrs_db_query_duration_seconds",
+    "Duration of the queries of the music database.",
+    ["query"],
+)
+CACHE_REQUESTS = counter(
+    "musiccrs_cache_requests_total",
+    "Lookups in the in-memory caches by result (hit or miss).",
+    ["cache", "result"],
+)
+OLLAMA_SECONDS = histogram(
+    "musiccrs_ollama_request_duration_seconds",
+    "Duration of the calls of the language model.",
+    ["call"],
+)
+OLLAMA_TOKENS = counter(
+    "musiccrs_ollama_tokens_total",
+    "Tokens processed by the language model by kind (prompt or completion).",
+    ["call", "kind"],
+)
+ACTIVE_SESSIONS = gauge(
+    "musiccrs_active_sessions",
+    "Open sessions by kind (agent conversations or event streams).",
+    ["kind"],
+)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics of the default registry."""
+
+    def do_GET(self) -> None:
+        """Handles a GET request."""
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        """Silences the request log."""
+
+
+def start_http_server(
+    port: int, host: str = "127.0.0.1"
+) -> Union[ThreadingHTTPServer, None]:
+    """Serves the metrics over HTTP in a daemon thread.
+
+    It is used by processes without a Flask app, like the agent.
+
+    Args:
+        port: Port of the server. 0 disables the server.
+        host (optional): Interface to listen on. Defaults to "127.0.0.1" (only
+          the local host).
+
+    Returns:
+        The server, or None if it is disabled.
+    """
+    if port <= 0:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-exporter", daemon=True
+    ).start()
+    return server
+
+
+def _escape(value: str) -> str:
+    """Escapes a label value."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """Formats a sample value without a needless fraction."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
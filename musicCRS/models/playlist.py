@@ -1,22 +1,51 @@
 """Module for the Playlist class."""
 
-from typing import Union
+import logging
+from typing import Any, Callable, List, Union
 
 from musicCRS.models.song import Song
 
+logger = logging.getLogger(__name__)
+
 
 class Playlist:
     """Class to represent a playlist of songs.
 
+    All changes to the songs should go through the methods of this class, so
+    that they are recorded in the journal (if one is attached).
+
     Attributes:
         name (str): The name of the playlist.
         songs (list): A list of Song objects in the playlist.
+        journal (PlaylistJournal): Optional journal that persists the changes.
+        version (int): Number of changes so far. It increases with every change
+          and can be used to detect that the songs changed.
+        listeners (list): Functions that are called with the playlist, the
+          operation and its payload after every change.
     """
 
-    def __init__(self, name: str) -> None:
-        """Initialize the playlist with a name and an empty list of songs."""
+    def __init__(self, name: str, journal: Any = None) -> None:
+        """Initialize the playlist with a name and an empty list of songs.
+
+        Args:
+            name: The name of the playlist.
+            journal (optional): A PlaylistJournal that records the changes.
+              Defaults to None.
+        """
         self.name = name
         self.songs: list[Song] = []
+        self.journal = journal
+        self.version = 0
+        self.listeners: List[Callable[[Playlist, str, Any], None]] = []
+
+    def _record(self, operation: str, payload: Any = None) -> None:
+        """Records a change of the playlist in the journal and notifies the
+        listeners."""
+        self.version += 1
+        if self.journal is not None:
+            self.journal.record(self.name, operation, payload)
+        for listener in self.listeners:
+            listener(self, operation, payload)
 
     def add_song(self, song: Song) -> int:
         """Adds a song to the playlist.
@@ -32,15 +61,21 @@ class Playlist:
         """
         if isinstance(song, Song):
             if song in self.songs:
-                print(
-                    f"'{song.track_name}' by {song.artist_0} is already in the playlist."
+                logger.debug(
+                    "'%s' by %s is already in %s",
+                    song.track_name,
+                    song.artist_0,
+                    self.name,
                 )
                 return -1
             self.songs.append(song)
-            print(f"Added '{song.track_name}' by {song.artist_0} to the playlist.")
+            self._record("add", song.serialize())
+            logger.debug(
+                "Added '%s' by %s to %s", song.track_name, song.artist_0, self.name
+            )
             return 0
         else:
-            print("Error: Only Song objects can be added.")
+            logger.warning("Only Song objects can be added, got %r", song)
             return -2
 
     def remove_song(self, track_name: str, artists: Union[list, None] = None) -> int:
@@ -55,13 +90,14 @@ class Playlist:
             0: The song was successfully removed from the playlist.
             -1: The song was not found in the playlist.
         """
-        for song in self.songs:
+        for position, song in enumerate(self.songs):
             # Controlla se il nome della traccia coincide
             if song.track_name == track_name:
                 if artists == []:
                     # Rimuove la canzone basandosi solo sul nome della traccia se gli artisti non sono specificati
-                    self.songs.remove(song)
-                    print(f"Removed '{track_name}' from the playlist.")
+                    self.songs.pop(position)
+                    self._record("delete", [position])
+                    logger.debug("Removed '%s' from %s", track_name, self.name)
                     return 0
                 else:
                     # Controllo opzionale degli artisti se specificati
@@ -78,9 +114,13 @@ class Playlist:
 
                     if song_artists == artists:
                         # Rimuove la canzone solo se sia il nome della traccia sia gli artisti corrispondono
-                        self.songs.remove(song)
-                        print(
-                            f"Removed '{track_name}' by {', '.join(artists)} from the playlist."
+                        self.songs.pop(position)
+                        self._record("delete", [position])
+                        logger.debug(
+                            "Removed '%s' by %s from %s",
+                            track_name,
+                            ", ".join(artists),
+                            self.name,
                         )
                         return 0
         return -1
@@ -99,15 +139,59 @@ class Playlist:
         """
 
         if any(pos < 0 or pos >= len(self.songs) for pos in positions):
-            print("Error: Some positions are out of range.")
+            logger.debug("Some positions are out of range: %s", positions)
             return -1
 
-        for pos in sorted(positions, reverse=True):
+        for pos in sorted(set(positions), reverse=True):
             song = self.songs.pop(pos)
-            print(f"Removed '{song.track_name}' from the playlist.")
+            logger.debug("Removed '%s' from %s", song.track_name, self.name)
+        self._record("delete", sorted(set(positions), reverse=True))
 
         return 0
 
+    def pop_song(self, position: int = 0) -> Song:
+        """Removes a song from the playlist and returns it.
+
+        Args:
+            position (optional): The position of the song. Defaults to 0.
+
+        Returns:
+            The removed Song object.
+
+        Raises:
+            IndexError: If the position is out of range.
+        """
+        # Normalize negative positions before logging them
+        position = range(len(self.songs))[position]
+        song = self.songs.pop(position)
+        self._record("delete", [position])
+        return song
+
+    def set_songs(self, songs: List[Song]) -> None:
+        """Replaces all songs of the playlist.
+
+        Args:
+            songs: The new list of Song objects.
+        """
+        self.songs = list(songs)
+        # One change for all songs, instead of a clear and an add per song
+        self._record("replace", [song.serialize() for song in self.songs])
+        logger.debug("Replaced the songs of %s", self.name)
+
+    def sort_songs(self, key: Callable[[Song], Any], reverse: bool = False) -> None:
+        """Sorts the songs of the playlist in place.
+
+        Args:
+            key: Function that returns the sort key of a song.
+            reverse (optional): Whether to sort in descending order. Defaults to
+              False.
+        """
+        order = sorted(
+            range(len(self.songs)), key=lambda i: key(self.songs[i]), reverse=reverse
+        )
+        self.songs = [self.songs[i] for i in order]
+        self._record("reorder", order)
+
     def find_song(
         self, track_name: str, artists: Union[list, None] = None
     ) -> Union[Song, None]:
@@ -151,5 +235,5 @@ class Playlist:
     def clear(self) -> None:
         """Removes all songs from the playlist."""
         self.songs = []
-        print("All songs have been removed from the playlist.")
-        print("All songs have been removed from the playlist.")
+        self._record("clear")
+        logger.debug("All songs have been removed from %s", self.name)
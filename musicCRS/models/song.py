@@ -1,5 +1,6 @@
 """Module for the Song class."""
 
+import inspect
 from typing import Dict
 
 
@@ -202,6 +203,25 @@ class Song:
             "rn": self.rn,
         }
 
+    @classmethod
+    def deserialize(cls, data: Dict) -> "Song":
+        """Creates a Song object from its dictionary representation.
+
+        It is the inverse of `serialize`. Missing fields are set to None and
+        unknown keys are ignored.
+
+        Args:
+            data: Dictionary with the song attributes.
+
+        Returns:
+            The Song object.
+        """
+        fields = dict(data)
+        # `serialize` stores the track type under the key "type"
+        if "type" in fields and "track_type" not in fields:
+            fields["track_type"] = fields.pop("type")
+        return cls(**{key: fields.get(key) for key in SONG_FIELDS})
+
     def __eq__(self, other):
         if not isinstance(other, Song):
             return False
@@ -332,3 +352,7 @@ class Song:
             return f"{self.track_name} by {artist_string}"
         else:
             return f"{self.track_name} by Unknown Artist"
+
+
+# Names of the constructor arguments, in the order of the `music` table columns
+SONG_FIELDS = tuple(inspect.signature(Song.__init__).parameters)[1:]
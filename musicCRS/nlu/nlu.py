@@ -6,29 +6,87 @@ entities.
 Under the hood Ollama is used to query a LLAMA 3.2 model and get the response.
 """
 
-from typing import Any, Dict, Union
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, MutableMapping, Union
 
 import ollama
 
+from musicCRS import metrics
+
 from . import post_processing
 
+logger = logging.getLogger(__name__)
+
+# Async clients by event loop, their connection pools are bound to the loop
+_async_clients: MutableMapping[asyncio.AbstractEventLoop, ollama.AsyncClient] = (
+    weakref.WeakKeyDictionary()
+)
+_async_clients_lock = threading.Lock()
+
+
+def _observe_call(call: str, response: Any, seconds: float) -> None:
+    """Records the latency and the token counts of a model call."""
+    metrics.OLLAMA_SECONDS.observe(seconds, call=call)
+    metrics.OLLAMA_TOKENS.inc(
+        response.get("prompt_eval_count") or 0, call=call, kind="prompt"
+    )
+    metrics.OLLAMA_TOKENS.inc(
+        response.get("eval_count") or 0, call=call, kind="completion"
+    )
+
+
+def _chat(call: str, messages: List[Dict[str, str]]) -> str:
+    """Sends messages to the model and returns the content of the answer.
+
+    Args:
+        call: Name of the call for the metrics.
+        messages: The chat messages.
+    """
+    start = time.perf_counter()
+    response = ollama.chat(model="llama3.2", messages=messages)
+    _observe_call(call, response, time.perf_counter() - start)
+    return response["message"]["content"]
+
+
+def _get_async_client() -> ollama.AsyncClient:
+    """Returns the async client of the running event loop.
+
+    It is created on first use and reused by all calls on the loop, so the
+    connections to Ollama are kept alive between the calls.
+    """
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = ollama.AsyncClient()
+        return client
+
+
+async def _achat(call: str, messages: List[Dict[str, str]]) -> str:
+    """Asynchronous version of `_chat`."""
+    start = time.perf_counter()
+    response = await _get_async_client().chat(model="llama3.2", messages=messages)
+    _observe_call(call, response, time.perf_counter() - start)
+    return response["message"]["content"]
 
-def get_nlu_response(user_input: str) -> str:
-    """Provides the natural language understanding response.
+
+def nlu_messages(user_input: str) -> List[Dict[str, str]]:
+    """Builds the chat messages of the intent detection prompt.
 
     Args:
         user_input: The user input to process.
 
     Returns:
-        A JSON formatted response from the model containing the intent and
-        entities.
+        The messages sent to the model.
     """
-    response = ollama.chat(
-        model="llama3.2",
-        messages=[
-            {
-                "role": "user",
-                "content": f"""
+    return [
+        {
+            "role": "user",
+            "content": f"""
                         You are an assistant specializing in intent detection. Identify the user's intent and extract all relevant entities, filling in any entities not mentioned with an empty string. Maintain the exact case (uppercase or lowercase) as given by the user.
 
                         ### Intent Options:
@@ -165,27 +223,41 @@ def get_nlu_response(user_input: str) -> str:
                         REMEMBER TO DO NOT PROVIDE AN ARTIST IF IT'S NOT PROVIDED BY THE USER.
                         User command: '{user_input}'
                         """,
-            },
-        ],
-    )
-    return response["message"]["content"]
+        },
+    ]
 
 
-def get_playlist_songs(user_input: str) -> str:
-    """Queries the model to get parameters for playlist songs.
+def get_nlu_response(user_input: str) -> str:
+    """Provides the natural language understanding response.
 
     Args:
         user_input: The user input to process.
 
     Returns:
-        The JSON formatted response from the model.
+        A JSON formatted response from the model containing the intent and
+        entities.
     """
-    response = ollama.chat(
-        model="llama3.2",
-        messages=[
-            {
-                "role": "user",
-                "content": f"""
+    return _chat("nlu", nlu_messages(user_input))
+
+
+async def aget_nlu_response(user_input: str) -> str:
+    """Asynchronous version of `get_nlu_response`."""
+    return await _achat("nlu", nlu_messages(user_input))
+
+
+def playlist_songs_messages(user_input: str) -> List[Dict[str, str]]:
+    """Builds the chat messages of the playlist parameter prompt.
+
+    Args:
+        user_input: The description of the playlist.
+
+    Returns:
+        The messages sent to the model.
+    """
+    return [
+        {
+            "role": "user",
+            "content": f"""
                     You are a playlist creation assistant. Given a description of the playlist a user wants to create, you will analyze the mood, style, and intended vibe of the playlist and output a structured JSON response. Include fields only if they are important for accurately capturing the user's intent.
 
                     ### Field Descriptions:
@@ -285,11 +357,25 @@ def get_playlist_songs(user_input: str) -> str:
 
                     **User Description**: '{user_input}'
                     """,
-            }
-        ],
-    )
+        }
+    ]
 
-    return response["message"]["content"]
+
+def get_playlist_songs(user_input: str) -> str:
+    """Queries the model to get parameters for playlist songs.
+
+    Args:
+        user_input: The user input to process.
+
+    Returns:
+        The JSON formatted response from the model.
+    """
+    return _chat("playlist", playlist_songs_messages(user_input))
+
+
+async def aget_playlist_songs(user_input: str) -> str:
+    """Asynchronous version of `get_playlist_songs`."""
+    return await _achat("playlist", playlist_songs_messages(user_input))
 
 
 def interact_with_playlist_agent(user_preferences: str) -> str:
@@ -434,10 +520,26 @@ class NLUProcessor:
 
         # Parse the json response
         json_data = post_processing.post_process_response(response)
-        print(json_data)
+        logger.debug("Playlist parameters: %s", json_data)
 
         return json_data
 
+    async def aprocess_input(self, user_input: str) -> Union[Dict[str, Any], None]:
+        """Asynchronous version of `process_input`.
+
+        The event loop is not blocked while waiting for the model.
+        """
+        response = await aget_nlu_response(user_input)
+        return post_processing.post_process_response(response)
+
+    async def agenerate_playlist(self, user_input: str) -> Union[Dict[str, Any], None]:
+        """Asynchronous version of `generate_playlist`.
+
+        The event loop is not blocked while waiting for the model.
+        """
+        response = await aget_playlist_songs(user_input)
+        return post_processing.post_process_response(response)
+
 
 # TODO: Remove the following code
 if __name__ == "__main__":
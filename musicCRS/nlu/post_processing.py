@@ -6,9 +6,12 @@ intent and entities to the playlist agent.
 """
 
 import json
+import logging
 import re
 from typing import Any, Dict, Union
 
+logger = logging.getLogger(__name__)
+
 
 def extract_json_from_response(response: str) -> Union[Dict[str, Any], None]:
     """Extracts and parses the JSON object from the model response.
@@ -28,10 +31,10 @@ def extract_json_from_response(response: str) -> Union[Dict[str, Any], None]:
         if json_text:
             return json.loads(json_text.group())
         else:
-            print("No JSON object found in response:", response)
+            logger.warning("No JSON object found in response: %s", response)
             return None
     except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
+        logger.warning("Error decoding JSON: %s", e)
         return None
 
 
@@ -2,13 +2,14 @@
 
 import random
 
-import requests
 from dialoguekit.core.annotated_utterance import AnnotatedUtterance
 from dialoguekit.core.utterance import Utterance
 from dialoguekit.participant.participant import DialogueParticipant
 from dialoguekit.participant.user import User, UserType
 from user_simulation.user_profile import UserProfile
 
+from musicCRS.backend import backend_client
+
 
 class AdvancedUserSimulator(User):
     """Advanced user simulator that simply requests songs.
@@ -38,6 +39,7 @@ class AdvancedUserSimulator(User):
         self.max_turns = 20  # stopping criterion
         self.goal_songs_number = self.profile.goal
         self.last_command = ""
+        self.backend = backend_client.get_backend()
 
     def _generate_response(self) -> AnnotatedUtterance:
         """Generates a response.
@@ -110,7 +112,7 @@ class AdvancedUserSimulator(User):
         if self.last_command.startswith("/add"):
             if "Please select one in the suggestions list" in utterance.text:
                 # call endpoint
-                response = requests.get("http://localhost:5002/move_first_to_playlist")
+                response = self.backend.move_first_to_playlist()
                 print(
                     "***Simulating User choosing one song from the suggestions list***"
                 )
@@ -125,13 +127,10 @@ class AdvancedUserSimulator(User):
             self._num_songs = len(utterance.text.split("//"))
         elif self.last_command == "/recommend":
             # call endpoint to select 1 song
-            response = requests.post(
-                "http://localhost:5002/move_recommendation",
-                json={"artists": self.profile.prefered_artists},
-            )
+            response = self.backend.move_recommendation(self.profile.prefered_artists)
 
             if response.status_code == 200:
-                songs = response.json().get("songs", "")
+                songs = response.data.get("songs", "")
                 for song in songs:
                     print(
                         "***Simulating User choosing one song from the recommendations list***"
@@ -0,0 +1,106 @@
+"""Tests for the event broker."""
+
+import json
+
+from musicCRS.backend.events import EventBroker
+from musicCRS.backend.playlist_service import PlaylistService
+from musicCRS.models.song import Song
+
+
+def parse(message: str) -> dict:
+    """Decodes the data of a Server-Sent Event."""
+    return json.loads(message.split("data: ", 1)[1])
+
+
+def test_fan_out_to_all_sessions() -> None:
+    """Tests that every subscription of every session receives the events."""
+    broker = EventBroker()
+    first = broker.subscribe("s1")
+    second = broker.subscribe("s1")
+    other = broker.subscribe("s2")
+    assert broker.session_count() == 2
+
+    broker.publish({"type": "cleared"})
+    for subscription in (first, second, other):
+        assert subscription.get(timeout=0) == {"type": "cleared"}
+
+    broker.unsubscribe(first)
+    broker.unsubscribe(second)
+    assert broker.session_count() == 1
+
+
+def test_slow_client_gets_a_snapshot() -> None:
+    """Tests that a full buffer is replaced by a snapshot."""
+    broker = EventBroker(max_queued=2)
+    subscription = broker.subscribe()
+    stream = broker.stream(subscription, lambda: {"state": 1}, heartbeat=0)
+    assert parse(next(stream)) == {"type": "snapshot", "state": 1}
+
+    for _ in range(3):
+        broker.publish({"type": "cleared"})
+    assert subscription.stale
+    assert parse(next(stream))["type"] == "snapshot"
+
+    broker.publish({"type": "cleared"})
+    assert parse(next(stream)) == {"type": "cleared"}
+    stream.close()
+    assert broker.session_count() == 0
+
+
+def test_service_publishes_diffs(tmp_path) -> None:
+    """Tests that changes of the playlist are published as diff events."""
+    service = PlaylistService(str(tmp_path / "music.db"))
+    subscription = service.events.subscribe()
+
+    service.add_song(Song(track_id="a", track_name="A", artist_0="X"))
+    service.delete_songs_by_positions([0])
+
+    added = subscription.get(timeout=0)
+    assert added["type"] == "added"
+    assert added["entry"] == {"track_id": "a", "message": "A by X"}
+    removed = subscription.get(timeout=0)
+    assert removed == {
+        "list": "playlist",
+        "version": 2,
+        "type": "removed",
+        "positions": [0],
+    }
+    assert service.snapshot()["playlist"] == {"version": 2, "entries": []}
+
+
+def test_replacing_the_playlist_is_one_event(tmp_path) -> None:
+    """Tests that a generated playlist does not overflow the subscriptions."""
+    service = PlaylistService(
+        str(tmp_path / "music.db"), events=EventBroker(max_queued=2)
+    )
+    subscription = service.events.subscribe()
+    songs = [
+        Song(track_id=str(i), track_name=f"S{i}", artist_0="X") for i in range(150)
+    ]
+    service.playlist.set_songs(songs)
+
+    assert not subscription.stale
+    replaced = subscription.get(timeout=0)
+    assert replaced["type"] == "replaced"
+    assert len(replaced["entries"]) == 150
+    assert subscription.get(timeout=0) is None
+
+
+def test_suggestions_are_one_event(tmp_path) -> None:
+    """Tests that a slate of suggestions is published as one change."""
+    service = PlaylistService(
+        str(tmp_path / "music.db"), events=EventBroker(max_queued=2)
+    )
+    subscription = service.events.subscribe()
+    songs = [
+        Song(track_id=str(i), track_name=f"S{i}", artist_0="X", track_popularity=i)
+        for i in range(50)
+    ]
+    service.add_suggestions(songs + songs[:1])
+
+    replaced = subscription.get(timeout=0)
+    assert replaced["list"] == "suggestions"
+    assert [entry["track_id"] for entry in replaced["entries"]] == [
+        str(i) for i in reversed(range(50))
+    ]
+    assert subscription.get(timeout=0) is None
@@ -0,0 +1,106 @@
+"""Tests for the pooled HTTP client."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Iterator, List
+
+import pytest
+import requests
+
+from musicCRS import metrics
+from musicCRS.backend.backend_client import HTTPBackend
+from musicCRS.backend.http_client import CALL_FAILURES, CALL_SECONDS, HTTPClient
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers with the next status code of the server."""
+
+    def do_GET(self) -> None:
+        """Handles a GET request."""
+        self.server.requests += 1
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    do_POST = do_GET
+
+    def log_message(self, *args) -> None:
+        """Silences the request log."""
+
+
+@pytest.fixture
+def server() -> Iterator[HTTPServer]:
+    """HTTP server on a free port that answers with scripted status codes."""
+    server = HTTPServer(("127.0.0.1", 0), FlakyHandler)
+    server.statuses: List[int] = []
+    server.requests = 0
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server: HTTPServer) -> HTTPClient:
+    """Creates a client for the test server without retry delays."""
+    host, port = server.server_address
+    return HTTPClient(f"http://{host}:{port}", max_retries=2, backoff=0)
+
+
+def test_idempotent_call_is_retried(server: HTTPServer) -> None:
+    """Tests that an idempotent call is retried after a 503."""
+    server.statuses = [503, 200]
+    response = make_client(server).request("GET", "/songs", idempotent=True)
+    assert response.status_code == 200
+    assert server.requests == 2
+
+
+def test_non_idempotent_call_is_not_retried(server: HTTPServer) -> None:
+    """Tests that a non-idempotent call is sent only once."""
+    server.statuses = [503, 200]
+    response = make_client(server).request("POST", "/add_song")
+    assert response.status_code == 503
+    assert server.requests == 1
+
+
+def test_mutating_backend_calls_are_not_retried(server: HTTPServer) -> None:
+    """Tests that calls that add songs are sent only once."""
+    backend = HTTPBackend(make_client(server))
+    server.statuses = [502, 502]
+    assert backend.add_recommendations().status_code == 502
+    assert backend.add_suggestions([]).status_code == 502
+    assert server.requests == 2
+
+
+def test_retries_are_bounded(server: HTTPServer) -> None:
+    """Tests that the last response is returned when all retries fail."""
+    server.statuses = [503, 503, 503, 503]
+    response = make_client(server).request("GET", "/songs", idempotent=True)
+    assert response.status_code == 503
+    assert server.requests == 3
+
+
+def test_latency_is_recorded(server: HTTPServer) -> None:
+    """Tests that the calls are counted in the metrics registry."""
+    client = make_client(server)
+    calls = CALL_SECONDS.count(endpoint="GET /recorded")
+    failures = CALL_FAILURES.value(endpoint="GET /recorded")
+    client.request("GET", "/recorded")
+    server.statuses = [500]
+    client.request("GET", "/recorded")
+    assert CALL_SECONDS.count(endpoint="GET /recorded") == calls + 2
+    assert CALL_FAILURES.value(endpoint="GET /recorded") == failures + 1
+    assert "musiccrs_http_client_duration_seconds_count" in metrics.REGISTRY.render()
+
+
+def test_unreachable_server_raises() -> None:
+    """Tests that an unreachable server raises after the retries."""
+    client = HTTPClient("http://127.0.0.1:9", connect_timeout=0.2, backoff=0)
+    failures = CALL_FAILURES.value(endpoint="GET /unreachable")
+    with pytest.raises(requests.ConnectionError):
+        client.request("GET", "/unreachable", idempotent=True)
+    assert CALL_FAILURES.value(endpoint="GET /unreachable") == failures + 1
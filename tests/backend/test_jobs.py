@@ -0,0 +1,69 @@
+"""Tests for the job queue."""
+
+import threading
+
+from musicCRS.backend.jobs import Job, JobQueue
+
+
+def test_identical_jobs_are_deduplicated() -> None:
+    """Tests that a job with the key of an in-flight job joins it."""
+    release = threading.Event()
+    calls = []
+
+    def work() -> tuple:
+        calls.append(1)
+        release.wait(5)
+        return {"done": True}, 201
+
+    queue = JobQueue(max_workers=1)
+    first = queue.submit("key", work)
+    second = queue.submit("key", work)
+    assert first is second
+
+    release.set()
+    assert queue.wait(first, timeout=5)
+    assert (first.status, first.body, first.status_code) == (
+        "succeeded",
+        {"done": True},
+        201,
+    )
+    assert calls == [1]
+
+    # A finished job is not joined anymore
+    third = queue.submit("key", work)
+    assert third is not first
+    queue.wait(third, timeout=5)
+
+
+def test_failed_job(caplog) -> None:
+    """Tests that an exception marks the job as failed, is logged and notifies."""
+    finished = []
+    queue = JobQueue(on_finished=finished.append)
+
+    def fail() -> tuple:
+        raise RuntimeError("boom")
+
+    job = queue.submit("key", fail)
+    queue.wait(job, timeout=5)
+    assert job.status == "failed"
+    assert job.to_dict()["result"] == {"error": "boom"}
+    assert queue.get(job.id) is job
+    assert finished == [job]
+    (record,) = [r for r in caplog.records if r.name == "musicCRS.backend.jobs"]
+    assert (record.job_id, record.key) == (job.id, "key")
+    assert record.exc_info[0] is RuntimeError
+
+
+def test_finished_jobs_are_bounded() -> None:
+    """Tests that only the latest finished jobs are kept."""
+    queue = JobQueue(max_finished=2)
+    jobs = []
+    for index in range(4):
+        job = queue.submit(str(index), lambda: ({}, 200))
+        queue.wait(job, timeout=5)
+        jobs.append(job)
+    queue.submit("last", lambda: ({}, 200))
+
+    assert queue.get(jobs[0].id) is None
+    assert queue.get(jobs[1].id) is None
+    assert isinstance(queue.get(jobs[3].id), Job)
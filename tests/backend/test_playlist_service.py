@@ -0,0 +1,148 @@
+"""Tests for the playlist service."""
+
+import pytest
+
+from musicCRS.backend.playlist_service import PlaylistService, parse_song_string
+from musicCRS.models.song import Song
+
+
+@pytest.fixture
+def service(tmp_path) -> PlaylistService:
+    """Service without persistence and with an empty database."""
+    return PlaylistService(str(tmp_path / "music.db"))
+
+
+def make_song(track_id: str, artist: str = "Artist", popularity: int = 0) -> Song:
+    """Creates a minimal song for the tests."""
+    return Song(
+        track_id=track_id,
+        track_name=f"Song {track_id}",
+        artist_0=artist,
+        track_popularity=popularity,
+    )
+
+
+def test_add_song_twice(service: PlaylistService) -> None:
+    """Tests that adding the same song twice is rejected."""
+    _, status = service.add_song(make_song("a"))
+    assert status == 201
+    body, status = service.add_song(make_song("a"))
+    assert status == 401
+    assert "already in the playlist" in body["error"]
+    assert service.get_songs() == ["Song a by Artist"]
+
+
+def test_suggestions_sorted_and_flagged(service: PlaylistService) -> None:
+    """Tests that suggestions are sorted by popularity and flagged."""
+    service.add_song(make_song("b"))
+    service.add_suggestions(
+        [make_song("a", popularity=10), make_song("b", popularity=50)]
+    )
+    assert service.get_suggestions() == [
+        {"message": "Song b by Artist", "disabled": True},
+        {"message": "Song a by Artist", "disabled": False},
+    ]
+
+
+def test_move_first_to_playlist(service: PlaylistService) -> None:
+    """Tests moving the first suggestion to the playlist."""
+    _, status = service.move_first_to_playlist()
+    assert status == 400
+
+    service.add_suggestions([make_song("a", popularity=10), make_song("b")])
+    _, status = service.move_first_to_playlist()
+    assert status == 200
+    assert service.get_songs_string() == "Song a by Artist"
+
+
+def test_delete_songs_by_positions(service: PlaylistService) -> None:
+    """Tests deleting songs by their positions."""
+    for track_id in "abc":
+        service.add_song(make_song(track_id))
+    _, status = service.delete_songs_by_positions([0, 2])
+    assert status == 200
+    assert service.get_songs() == ["Song b by Artist"]
+
+    _, status = service.delete_songs_by_positions([5])
+    assert status == 401
+
+
+def test_move_recommendation_by_artist(service: PlaylistService) -> None:
+    """Tests that recommendations by preferred artists are moved."""
+    service.recommendations.set_songs(
+        [make_song("a", artist="Queen"), make_song("b", artist="Toto")]
+    )
+    body, status = service.move_recommendation(["Toto"])
+    assert status == 200
+    assert body == {"songs": ["Song b by Toto"]}
+
+    _, status = service.move_recommendation("Toto")
+    assert status == 400
+
+
+def test_parse_song_string() -> None:
+    """Tests parsing a rendered song."""
+    assert parse_song_string("Africa by TOTO, Someone") == (
+        "Africa",
+        ["TOTO", "Someone"],
+    )
+    assert parse_song_string("Africa") == (None, [])
+
+
+def test_add_by_track_ids(service: PlaylistService) -> None:
+    """Tests adding songs by track id through the catalog."""
+    service.catalog.put([make_song("a", popularity=10), make_song("b")])
+
+    _, status = service.add_song_by_id("a")
+    assert status == 201
+    _, status = service.add_song_by_id("x")
+    assert status == 404
+
+    body, status = service.add_suggestions_by_ids(["b", "a", "x"])
+    assert status == 201
+    assert body[-1] == {"error": "Unknown track id 'x'"}
+    assert [entry["message"] for entry in service.get_suggestions()] == [
+        "Song a by Artist",
+        "Song b by Artist",
+    ]
+
+
+def test_render_is_cached_per_version(service: PlaylistService) -> None:
+    """Tests that a view is rendered again only after a change."""
+    etag, payload = service.render("suggestions")
+    assert payload == b"[]"
+    assert service.render("suggestions") == (etag, payload)
+
+    # A change of the playlist changes the disabled flags of the suggestions
+    service.add_song(make_song("a"))
+    new_etag, _ = service.render("suggestions")
+    assert new_etag != etag
+    assert service.render("songs")[1] == b'["Song a by Artist"]'
+
+
+def test_state_pages(service: PlaylistService) -> None:
+    """Tests paging through the playlist with the state cursor."""
+    for track_id in "abc":
+        service.add_song(make_song(track_id))
+
+    body, status = service.get_state(fields=["playlist"], limit=2)
+    assert status == 200
+    assert body["playlist"]["total"] == 3
+    assert body["playlist"]["entries"] == ["Song a by Artist", "Song b by Artist"]
+
+    body, _ = service.get_state(cursor=body["next_cursor"], limit=2)
+    assert body["playlist"]["entries"] == ["Song c by Artist"]
+    assert body["next_cursor"] is None
+
+
+def test_state_cursor_of_changed_list(service: PlaylistService) -> None:
+    """Tests that a cursor of a list that changed is rejected."""
+    for track_id in "abc":
+        service.add_song(make_song(track_id))
+    body, _ = service.get_state(limit=1)
+    service.clear_playlist()
+
+    _, status = service.get_state(cursor=body["next_cursor"], limit=1)
+    assert status == 409
+    _, status = service.get_state(fields=["songs"])
+    assert status == 400
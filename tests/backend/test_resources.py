@@ -0,0 +1,119 @@
+"""Tests for the shared resources."""
+
+import sqlite3
+import threading
+
+from musicCRS import config
+from musicCRS.backend.jobs import JobQueue
+from musicCRS.backend.playlist_service import PlaylistService
+from musicCRS.backend.resources import (
+    NeighbourCache,
+    Resources,
+    clear_resources,
+    get_resources,
+)
+
+
+def test_health(music_db: str, tmp_path) -> None:
+    """Tests the health checks with and without a database."""
+    resources = Resources(music_db)
+    assert resources.health()["checks"]["features"] == "not loaded"
+    resources.warm_up()
+    health = resources.health()
+    assert health["status"] == "ok"
+    assert health["checks"]["features"] == "ok: 30 songs"
+
+    missing = Resources(str(tmp_path / "missing.db"))
+    missing.warm_up()
+    assert missing.health()["status"] == "failing"
+
+
+def test_neighbour_cache_is_bounded() -> None:
+    """Tests that the least recently used neighbours are evicted."""
+    cache = NeighbourCache(max_size=2)
+    cache.put("a", ["b"])
+    cache.put("b", ["a"])
+    cache.get("a")
+    cache.put("c", ["a"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["b"]
+
+
+def test_recommendations_reuse_the_resources(music_db: str) -> None:
+    """Tests that recommendations fill the neighbour cache and skip the playlist."""
+    service = PlaylistService(music_db, resources=Resources(music_db))
+    service.add_song_by_id("t0")
+    service.add_song_by_id("t1")
+
+    _, status = service.add_recommendations()
+    assert status == 201
+    recommended = [song.track_id for song in service.recommendations.songs]
+    assert len(recommended) == 10
+    assert not {"t0", "t1"} & set(recommended)
+    assert len(service.resources.neighbours) == 2
+
+
+def test_recommendation_jobs_are_keyed_by_tracks(music_db: str) -> None:
+    """Tests that a job recommends for the tracks at submission."""
+    jobs = JobQueue(max_workers=1)
+    release = threading.Event()
+    jobs.submit("blocker", lambda: (release.wait(5), ({}, 200))[1])
+    service = PlaylistService(music_db, resources=Resources(music_db), jobs=jobs)
+
+    service.add_song_by_id("t0")
+    first = service.add_recommendations_job()
+    service.add_song_by_id("t1")
+    service.delete_songs_by_positions([1])
+    assert service.add_recommendations_job() is first
+    service.add_song_by_id("t1")
+    second = service.add_recommendations_job()
+    assert second is not first
+
+    release.set()
+    assert jobs.wait(first, timeout=5) and jobs.wait(second, timeout=5)
+    assert first.status_code == second.status_code == 201
+    recommended = [song.track_id for song in service.recommendations.songs]
+    assert not {"t0", "t1"} & set(recommended)
+
+
+def test_stored_neighbours_do_not_depend_on_the_pool(
+    music_db: str, monkeypatch
+) -> None:
+    """Tests that re-ranking widens the ranking but not the neighbours."""
+    monkeypatch.setattr(config, "NEIGHBOUR_FLUSH_INTERVAL", 0)
+    for pool, track_id in [(25, "t0"), (15, "t1")]:
+        monkeypatch.setattr(config, "RERANK_POOL", pool)
+        service = PlaylistService(music_db, resources=Resources(music_db))
+        service.add_song_by_id(track_id)
+        _, status = service.add_recommendations()
+        assert status == 201
+
+    connection = sqlite3.connect(music_db)
+    counts = connection.execute(
+        "SELECT track_id, COUNT(*) FROM song_neighbors GROUP BY track_id"
+    ).fetchall()
+    connection.close()
+    assert counts == [("t0", config.NEIGHBOURS_K), ("t1", config.NEIGHBOURS_K)]
+
+
+def test_centroid_recommendations(music_db: str, monkeypatch) -> None:
+    """Tests the recommendations in centroid mode, which needs no neighbours."""
+    monkeypatch.setattr(config, "RECOMMENDATION_MODE", "centroid")
+    service = PlaylistService(music_db, resources=Resources(music_db))
+    service.add_song_by_id("t0")
+    service.add_song_by_id("t1")
+
+    _, status = service.add_recommendations()
+    assert status == 201
+    recommended = [song.track_id for song in service.recommendations.songs]
+    assert len(recommended) == 10
+    assert not {"t0", "t1"} & set(recommended)
+    assert len(service.resources.neighbours) == 0
+
+
+def test_clear_resources(music_db: str) -> None:
+    """Tests that cleared resources are created again."""
+    resources = get_resources(music_db)
+    assert get_resources(music_db) is resources
+    clear_resources()
+    assert get_resources(music_db) is not resources
@@ -0,0 +1,78 @@
+"""Shared fixtures of the tests."""
+
+import random
+import sqlite3
+
+import pytest
+
+from musicCRS import config
+from musicCRS.models.song import SONG_FIELDS, Song
+
+FEATURES = (
+    "danceability",
+    "energy",
+    "valence",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "speechiness",
+    "tempo",
+    "loudness",
+    "track_popularity",
+    "artist_popularity",
+    "album_popularity",
+)
+
+
+def make_music_db(path: str, size: int = 30, seed: int = 0) -> None:
+    """Creates a music database with random songs "t0", "t1", ...
+
+    Args:
+        path: Path of the database file.
+        size (optional): Number of songs. Defaults to 30.
+        seed (optional): Seed of the random features. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    connection.execute(f"CREATE TABLE music ({', '.join(SONG_FIELDS)})")
+    connection.execute(
+        "CREATE TABLE similar_songs (track_id TEXT PRIMARY KEY, similar_tracks TEXT)"
+    )
+    for index in range(size):
+        song = Song(
+            track_id=f"t{index}",
+            track_name=f"Song {index}",
+            artist_0=f"Artist {index % 5}",
+            album_name=f"Album {index % 7}",
+            **{feature: rng.random() for feature in FEATURES},
+        )
+        connection.execute(
+            f"INSERT INTO music VALUES ({', '.join(['?'] * len(SONG_FIELDS))})",
+            [getattr(song, field) for field in SONG_FIELDS],
+        )
+    connection.commit()
+    connection.close()
+
+
+@pytest.fixture
+def music_db(tmp_path) -> str:
+    """Path to a music database with 30 random songs."""
+    path = str(tmp_path / "music.db")
+    make_music_db(path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def feature_store_dir(tmp_path, monkeypatch) -> str:
+    """Directory of the feature store, empty unless a test builds it."""
+    path = str(tmp_path / "feature_store")
+    monkeypatch.setattr(config, "FEATURE_STORE_DIR", path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def ann_index_dir(tmp_path, monkeypatch) -> str:
+    """Directory of the ANN index, empty unless a test builds it."""
+    path = str(tmp_path / "ann_index")
+    monkeypatch.setattr(config, "ANN_INDEX_DIR", path)
+    return path
@@ -0,0 +1,88 @@
+"""Tests for the ANN index."""
+
+import numpy as np
+import pandas as pd
+
+from musicCRS.data.ann_index import (
+    LSHIndex,
+    build_ann_index,
+    clear_ann_indexes,
+    get_ann_index,
+)
+from musicCRS.data.feature_store import (
+    FEATURE_COLUMNS,
+    FeatureStore,
+    build_feature_store,
+)
+
+
+def _random_store(size: int = 2000) -> FeatureStore:
+    """Returns a feature store of random songs."""
+    rng = np.random.default_rng(1)
+    features = pd.DataFrame(
+        rng.random((size, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS
+    )
+    features.insert(0, "track_id", [f"t{i}" for i in range(size)])
+    return FeatureStore.from_dataframe(features)
+
+
+def _recall(index: LSHIndex, store: FeatureStore, probes: int) -> float:
+    """Returns the share of the exact top 10 that the index finds."""
+    found = 0
+    for row in range(0, len(store), 20):
+        exact, _ = store.similar(row, 10)
+        approximate, _ = index.similar(store, row, 10, probes)
+        found += len(set(exact) & set(approximate))
+    return found / (10 * len(range(0, len(store), 20)))
+
+
+def test_recall_grows_with_probes() -> None:
+    """Tests that the index finds most true neighbours, more with probes."""
+    store = _random_store()
+    index = LSHIndex.build(store, tables=8, bits=8)
+    without_probes = _recall(index, store, probes=0)
+    with_probes = _recall(index, store, probes=3)
+    assert with_probes >= without_probes
+    assert with_probes > 0.8
+
+
+def test_similar_never_returns_the_song_itself() -> None:
+    """Tests the result of a query, also when the buckets are too small."""
+    store = _random_store(200)
+    index = LSHIndex.build(store, tables=1, bits=16)
+    rows, scores = index.similar(store, 7, 10)
+    assert len(rows) == 10
+    assert 7 not in rows
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_build_and_open(
+    music_db: str, feature_store_dir: str, ann_index_dir: str
+) -> None:
+    """Tests that the built index is mapped and must match the store."""
+    store = build_feature_store(music_db, feature_store_dir)
+    assert get_ann_index(ann_index_dir) is None
+
+    built = build_ann_index(feature_store_dir, ann_index_dir, tables=4, bits=4)
+    opened = get_ann_index(ann_index_dir, store)
+    assert isinstance(opened.sorted_codes, np.memmap)
+    assert np.array_equal(opened.similar(store, 3, 5)[0], built.similar(store, 3, 5)[0])
+    assert get_ann_index(ann_index_dir, _random_store(31)) is None
+
+
+def test_index_of_another_store_is_refused(
+    feature_store_dir: str, ann_index_dir: str
+) -> None:
+    """Tests that an index is refused after its store was rebuilt."""
+    store = _random_store(50)
+    store.save(feature_store_dir)
+    build_ann_index(feature_store_dir, ann_index_dir, tables=2, bits=4)
+    assert get_ann_index(ann_index_dir, FeatureStore.open(feature_store_dir))
+
+    # Same number of songs, but in another order
+    FeatureStore(
+        store.track_ids[::-1], store.features[::-1], store.mean, store.scale
+    ).save(feature_store_dir)
+    clear_ann_indexes()
+    assert get_ann_index(ann_index_dir, FeatureStore.open(feature_store_dir)) is None
+    assert get_ann_index(ann_index_dir, store) is not None
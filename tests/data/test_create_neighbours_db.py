@@ -0,0 +1,168 @@
+"""Tests for the blocked neighbour computation."""
+
+import functools
+import os
+import sqlite3
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from musicCRS.data import create_neighbours_db
+from musicCRS.data import recommendations as rec
+from musicCRS.data.create_neighbours_db import (
+    compute_and_store_neighbors_blocked,
+    compute_and_store_neighbors_parallel,
+    refresh_neighbours,
+)
+from musicCRS.data.feature_store import FeatureStore, build_feature_store
+
+
+def test_blocks_match_the_single_track_computation(music_db: str) -> None:
+    """Tests that the blocked neighbours equal the neighbours of single tracks."""
+    assert compute_and_store_neighbors_blocked(music_db, top_n=5, block_size=7) == 30
+
+    stored = _read_neighbours(music_db)
+    assert len(stored) == 30
+
+    all_features = rec.fetch_all_song_features(music_db)
+    for track_id in ("t0", "t13", "t29"):
+        expected = rec.compute_and_store_neighbors(
+            music_db, track_id, all_features, top_n=5
+        )
+        assert stored[track_id] == [neighbour for neighbour, _ in expected]
+
+
+def test_parallel_build_resumes(
+    music_db: str, feature_store_dir: str, tmp_path
+) -> None:
+    """Tests the parallel build and that it resumes from its checkpoints."""
+    compute_and_store_neighbors_blocked(music_db, top_n=5)
+    expected = _read_neighbours(music_db)
+    _clear_neighbours(music_db)
+
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    build = functools.partial(
+        compute_and_store_neighbors_parallel,
+        music_db,
+        feature_store_dir,
+        top_n=5,
+        block_size=4,
+        shard_size=8,
+        processes=2,
+        checkpoint_dir=checkpoint_dir,
+    )
+
+    # An interrupted build keeps the checkpoints of its finished shards
+    interrupt = mock.patch.object(
+        create_neighbours_db, "store_neighbours", side_effect=KeyboardInterrupt
+    )
+    with interrupt, pytest.raises(KeyboardInterrupt):
+        build()
+    shards = sorted(name for name in os.listdir(checkpoint_dir) if name.endswith("npz"))
+    assert len(shards) == 4
+    assert _read_neighbours(music_db) == {}
+
+    # The resumed build computes the missing shard and reuses the others
+    os.remove(os.path.join(checkpoint_dir, shards[0]))
+    reused = os.path.join(checkpoint_dir, shards[1])
+    with np.load(reused) as shard:
+        rows, scores = shard["rows"], shard["scores"]
+    np.savez(reused, rows=np.zeros_like(rows), scores=scores)
+
+    assert build() == 30
+    stored = _read_neighbours(music_db)
+    assert stored["t0"] == expected["t0"]
+    assert stored["t8"] == ["t0"] * 5
+    assert not os.path.exists(checkpoint_dir)
+
+
+def test_refresh_matches_a_full_build(music_db: str, feature_store_dir: str) -> None:
+    """Tests that refreshing the added songs equals building all songs."""
+    connection = sqlite3.connect(music_db)
+    connection.execute("CREATE TABLE added AS SELECT * FROM music WHERE rowid > 25")
+    connection.execute("DELETE FROM music WHERE rowid > 25")
+    connection.commit()
+    build_feature_store(music_db, feature_store_dir)
+    compute_and_store_neighbors_blocked(
+        music_db, top_n=5, feature_store=FeatureStore.open(feature_store_dir)
+    )
+    assert refresh_neighbours(music_db, feature_store_dir, top_n=5) == 0
+
+    connection.execute("INSERT INTO music SELECT * FROM added")
+    connection.commit()
+    connection.close()
+    before = _read_neighbours(music_db)
+    updated = refresh_neighbours(music_db, feature_store_dir, top_n=5, block_size=4)
+    refreshed = _read_neighbours(music_db)
+    assert len(FeatureStore.open(feature_store_dir)) == 30
+
+    compute_and_store_neighbors_blocked(
+        music_db, top_n=5, feature_store=FeatureStore.open(feature_store_dir)
+    )
+    assert refreshed == _read_neighbours(music_db)
+    changed = [
+        track_id for track_id in before if before[track_id] != refreshed[track_id]
+    ]
+    assert updated == 5 + len(changed)
+
+
+def test_failed_refresh_is_finished_by_the_next(
+    music_db: str, feature_store_dir: str
+) -> None:
+    """Tests that a refresh that failed before or after its commit is finished."""
+    connection = sqlite3.connect(music_db)
+    connection.execute("CREATE TABLE added AS SELECT * FROM music WHERE rowid > 25")
+    connection.execute("DELETE FROM music WHERE rowid > 25")
+    connection.commit()
+    build_feature_store(music_db, feature_store_dir)
+    compute_and_store_neighbors_blocked(
+        music_db, top_n=5, feature_store=FeatureStore.open(feature_store_dir)
+    )
+    connection.execute("INSERT INTO music SELECT * FROM added")
+    connection.commit()
+    connection.close()
+
+    # Fails while computing: nothing is committed or published
+    fail_compute = mock.patch.object(
+        create_neighbours_db, "store_neighbours", side_effect=RuntimeError
+    )
+    with fail_compute, pytest.raises(RuntimeError):
+        refresh_neighbours(music_db, feature_store_dir, top_n=5)
+    assert len(FeatureStore.open(feature_store_dir)) == 25
+
+    # Fails after the commit: the next refresh only publishes the store
+    fail_publish = mock.patch.object(FeatureStore, "save", side_effect=OSError)
+    with fail_publish, pytest.raises(OSError):
+        refresh_neighbours(music_db, feature_store_dir, top_n=5)
+    assert len(FeatureStore.open(feature_store_dir)) == 25
+    refreshed = _read_neighbours(music_db)
+    assert refresh_neighbours(music_db, feature_store_dir, top_n=5) == 0
+    assert len(FeatureStore.open(feature_store_dir)) == 30
+    assert _read_neighbours(music_db) == refreshed
+
+    compute_and_store_neighbors_blocked(
+        music_db, top_n=5, feature_store=FeatureStore.open(feature_store_dir)
+    )
+    assert _read_neighbours(music_db) == refreshed
+
+
+def _read_neighbours(db_path: str) -> dict:
+    """Returns the stored neighbours by track id."""
+    connection = sqlite3.connect(db_path)
+    rows = connection.execute(
+        "SELECT track_id, neighbor_id FROM song_neighbors ORDER BY track_id, rank"
+    ).fetchall()
+    connection.close()
+    neighbours = {}
+    for track_id, neighbor_id in rows:
+        neighbours.setdefault(track_id, []).append(neighbor_id)
+    return neighbours
+
+
+def _clear_neighbours(db_path: str) -> None:
+    """Removes the stored neighbours."""
+    connection = sqlite3.connect(db_path)
+    connection.execute("DELETE FROM song_neighbors")
+    connection.commit()
+    connection.close()
@@ -0,0 +1,82 @@
+"""Tests for the feature store."""
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from musicCRS.data import recommendations as rec
+from musicCRS.data.feature_store import (
+    FEATURE_COLUMNS,
+    FeatureStore,
+    build_feature_store,
+    get_feature_store,
+)
+
+
+def test_build_and_open(music_db: str, feature_store_dir: str) -> None:
+    """Tests that the built store is mapped read-only and standardized."""
+    assert get_feature_store(feature_store_dir) is None
+
+    build_feature_store(music_db, feature_store_dir)
+    store = FeatureStore.open(feature_store_dir)
+    assert len(store) == 30
+    assert isinstance(store.features, np.memmap)
+    assert not store.features.flags.writeable
+    assert store.features.dtype == np.float32
+    assert np.allclose(store.features.mean(axis=0), 0.0, atol=1e-5)
+
+
+def test_rows(music_db: str, feature_store_dir: str) -> None:
+    """Tests the lookup of rows by track id."""
+    store = build_feature_store(music_db, feature_store_dir)
+    rows = store.rows(["t3", "unknown", "t29"])
+    assert store.track_ids[rows[0]] == "t3"
+    assert rows[1] == -1
+    assert store.track_ids[rows[2]] == "t29"
+    assert store.row("unknown") is None
+
+
+def test_neighbours_match_the_features_table(
+    music_db: str, feature_store_dir: str
+) -> None:
+    """Tests that the store gives the same neighbours as the features table."""
+    store = build_feature_store(music_db, feature_store_dir)
+    all_features = rec.fetch_all_song_features(music_db)
+    for track_id in ("t0", "t7"):
+        expected = rec.compute_and_store_neighbors(music_db, track_id, all_features)
+        found = rec.compute_and_store_neighbors(music_db, track_id, feature_store=store)
+        assert [neighbour for neighbour, _ in found] == [
+            neighbour for neighbour, _ in expected
+        ]
+        assert np.allclose([score for _, score in found], [s for _, s in expected])
+
+
+def test_scaler_is_persisted(music_db: str, feature_store_dir: str) -> None:
+    """Tests that the saved scaler standardizes raw features like the store."""
+    build_feature_store(music_db, feature_store_dir)
+    store = FeatureStore.open(feature_store_dir)
+    raw = rec.fetch_all_song_features(music_db)
+    expected = StandardScaler().fit(raw.drop(columns=["track_id"]))
+    assert np.allclose(store.mean, expected.mean_)
+    assert np.allclose(store.scale, expected.scale_)
+
+    row = store.row("t5")
+    values = raw[raw["track_id"] == "t5"][list(FEATURE_COLUMNS)].to_numpy()
+    assert np.allclose(store.transform(values)[0], store.features[row], atol=1e-5)
+    assert np.allclose(np.linalg.norm(store.normalized, axis=1), 1.0, atol=1e-5)
+
+
+def test_recommendations_skip_the_features_table(
+    music_db: str, feature_store_dir: str, monkeypatch
+) -> None:
+    """Tests that recommendations with a store never read the features table."""
+    store = build_feature_store(music_db, feature_store_dir)
+
+    def fail(db_path: str) -> None:
+        raise AssertionError("the features table was read")
+
+    monkeypatch.setattr(rec, "fetch_all_song_features", fail)
+    recommended = rec.get_recommendations(
+        music_db, ["t0", "t1", "unknown"], feature_store=store
+    )
+    assert len(recommended) == 10
+    assert not {"t0", "t1"} & set(recommended)
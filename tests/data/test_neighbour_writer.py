@@ -0,0 +1,58 @@
+"""Tests for the background writer of the neighbours."""
+
+import sqlite3
+
+from musicCRS.data import recommendations as rec
+from musicCRS.data.neighbour_writer import NeighbourWriter
+
+
+def test_writes_in_batches(music_db: str) -> None:
+    """Tests that the neighbours are only written when flushed."""
+    writer = NeighbourWriter(music_db, flush_interval=3600)
+    writer.put("t0", [("t1", 0.9)])
+    writer.put("t2", [("t3", 0.5)])
+    writer.put("t0", [("t4", 0.8)])
+    assert len(writer) == 2
+    assert rec.get_cached_neighbors(music_db, "t0") == []
+
+    writer.close()
+    assert len(writer) == 0
+    assert rec.get_cached_neighbors(music_db, "t0") == [("t4", 0.8)]
+    assert rec.get_cached_neighbors(music_db, "t2") == [("t3", 0.5)]
+
+    connection = sqlite3.connect(music_db)
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    connection.close()
+
+    # A closed writer writes synchronously
+    writer.put("t5", [("t6", 0.1)])
+    assert rec.get_cached_neighbors(music_db, "t5") == [("t6", 0.1)]
+
+
+def test_failed_flush_keeps_the_neighbours(music_db: str) -> None:
+    """Tests that neighbours stay pending while the database is locked."""
+    writer = NeighbourWriter(music_db, flush_interval=0, busy_timeout=0)
+    writer.put("t0", [("t1", 0.9)])
+    locker = sqlite3.connect(music_db)
+    locker.execute("BEGIN IMMEDIATE")
+    writer.put("t2", [("t3", 0.5)])
+    assert len(writer) == 1
+
+    locker.rollback()
+    locker.close()
+    writer.flush()
+    assert rec.get_cached_neighbors(music_db, "t2") == [("t3", 0.5)]
+
+
+def test_recommendations_use_the_writer(music_db: str) -> None:
+    """Tests that computed neighbours are returned before they are written."""
+    writer = NeighbourWriter(music_db, flush_interval=3600)
+    recommended = rec.get_recommendations(
+        music_db, ["t0", "t1"], top_n=5, neighbour_writer=writer
+    )
+    assert len(recommended) == 5
+    assert len(writer) == 2
+    assert rec.get_cached_neighbors(music_db, "t0") == []
+
+    writer.close()
+    assert rec.get_recommendations(music_db, ["t0", "t1"], top_n=5) == recommended
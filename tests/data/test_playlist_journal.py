@@ -0,0 +1,123 @@
+"""Tests for the playlist journal."""
+
+import sqlite3
+
+import pytest
+
+from musicCRS.data.playlist_journal import PlaylistJournal, apply_operation
+from musicCRS.models.playlist import Playlist
+from musicCRS.models.song import Song
+
+
+def make_song(track_id: str, popularity: int = 0) -> Song:
+    """Creates a minimal song for the tests."""
+    return Song(
+        track_id=track_id,
+        track_name=f"Song {track_id}",
+        artist_0="Artist",
+        track_popularity=popularity,
+    )
+
+
+@pytest.fixture
+def journal_path(tmp_path) -> str:
+    """Path to a fresh journal database."""
+    return str(tmp_path / "playlists.db")
+
+
+def test_restore_after_restart(journal_path: str) -> None:
+    """Tests that all operations are restored by a new journal."""
+    journal = PlaylistJournal(journal_path, flush_interval=0)
+    playlist = Playlist("My Playlist")
+    journal.attach(playlist)
+
+    for track_id, popularity in [("a", 10), ("b", 30), ("c", 20), ("d", 5)]:
+        playlist.add_song(make_song(track_id, popularity))
+    playlist.remove_song("Song a", [])
+    playlist.sort_songs(key=lambda song: song.track_popularity, reverse=True)
+    playlist.remove_songs_by_positions([2])
+    journal.close()
+
+    restored = Playlist("My Playlist")
+    PlaylistJournal(journal_path, flush_interval=0).attach(restored)
+    assert [song.track_id for song in restored.songs] == ["b", "c"]
+
+
+def test_restore_after_clear(journal_path: str) -> None:
+    """Tests that a cleared playlist is restored as empty."""
+    journal = PlaylistJournal(journal_path, flush_interval=0)
+    playlist = Playlist("My Playlist")
+    journal.attach(playlist)
+    playlist.set_songs([make_song("a"), make_song("b")])
+    playlist.clear()
+    journal.close()
+
+    assert PlaylistJournal(journal_path, flush_interval=0).load("My Playlist") == []
+
+
+def test_replace_is_one_operation(journal_path: str) -> None:
+    """Tests that replacing the songs is journaled as a single operation."""
+    journal = PlaylistJournal(journal_path, flush_interval=0)
+    playlist = Playlist("My Playlist")
+    journal.attach(playlist)
+    playlist.add_song(make_song("a"))
+    version = playlist.version
+    playlist.set_songs([make_song(str(i)) for i in range(150)])
+    journal.close()
+
+    restored = PlaylistJournal(journal_path, flush_interval=0).load("My Playlist")
+    assert [song.track_id for song in restored] == [str(i) for i in range(150)]
+    assert playlist.version == version + 1
+
+
+def test_batched_writes_are_flushed_on_close(journal_path: str) -> None:
+    """Tests that buffered operations are written when the journal closes."""
+    journal = PlaylistJournal(journal_path, flush_interval=60)
+    playlist = Playlist("My Playlist")
+    journal.attach(playlist)
+    playlist.add_song(make_song("a"))
+    journal.close(timeout=1)
+
+    songs = PlaylistJournal(journal_path, flush_interval=0).load("My Playlist")
+    assert [song.track_id for song in songs] == ["a"]
+
+
+def test_failed_flush_keeps_the_operations(journal_path: str, monkeypatch) -> None:
+    """Tests that operations stay pending and in order while writes fail."""
+    journal = PlaylistJournal(journal_path, flush_interval=0)
+    playlist = Playlist("My Playlist")
+    journal.attach(playlist)
+    playlist.add_song(make_song("a"))
+
+    def locked() -> sqlite3.Connection:
+        raise sqlite3.OperationalError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(journal, "_connect", locked)
+        playlist.add_song(make_song("b"))
+        playlist.add_song(make_song("c"))
+    assert len(journal._pending) == 2
+
+    playlist.remove_songs_by_positions([0])
+    assert not journal._pending
+    assert [song.track_id for song in journal.load("My Playlist")] == ["b", "c"]
+
+
+def test_compaction_keeps_state(journal_path: str) -> None:
+    """Tests that compacting into snapshots does not change the playlist."""
+    journal = PlaylistJournal(journal_path, flush_interval=0, snapshot_every=3)
+    playlist = Playlist("My Playlist")
+    journal.attach(playlist)
+    for track_id in "abcdefg":
+        playlist.add_song(make_song(track_id))
+    playlist.pop_song(-1)
+    journal.close()
+
+    songs = PlaylistJournal(journal_path, flush_interval=0).load("My Playlist")
+    assert [song.track_id for song in songs] == list("abcdef")
+
+
+def test_apply_operation_unknown() -> None:
+    """Tests that an unknown operation raises an error."""
+    with pytest.raises(ValueError):
+        apply_operation([], "shuffle", None)
@@ -0,0 +1,242 @@
+"""Tests for the recommendations."""
+
+import sqlite3
+
+import numpy as np
+
+from musicCRS import metrics
+from musicCRS.backend.resources import LRUCache
+from musicCRS.data import recommendations as rec
+from musicCRS.data.create_neighbours_db import compute_and_store_neighbors_blocked
+from musicCRS.data.feature_store import FeatureStore, read_features
+from musicCRS.data.neighbour_writer import NeighbourWriter
+
+
+def _store(db_path: str, neighbours: dict) -> None:
+    """Stores scored neighbours."""
+    connection = sqlite3.connect(db_path)
+    rec.create_song_neighbors_table(connection)
+    rec.store_song_neighbors(connection, neighbours.items())
+    connection.commit()
+    connection.close()
+
+
+def test_cached_neighbours_have_scores(music_db: str) -> None:
+    """Tests reading scored and legacy neighbours."""
+    assert rec.get_cached_neighbors(music_db, "t0") == []
+
+    connection = sqlite3.connect(music_db)
+    connection.execute("INSERT INTO similar_songs VALUES ('t1', 't2,t3')")
+    connection.commit()
+    connection.close()
+    assert rec.get_cached_neighbors(music_db, "t1") == [("t2", 1.0), ("t3", 1.0)]
+
+    _store(music_db, {"t0": [("t4", 0.9), ("t5", 0.5)]})
+    _store(music_db, {"t0": [("t6", 0.8)]})
+    assert rec.get_cached_neighbors(music_db, "t0") == [("t6", 0.8)]
+
+
+def test_recommendations_are_weighted_by_score(music_db: str) -> None:
+    """Tests that one close neighbour outranks two distant ones."""
+    _store(
+        music_db,
+        {
+            "t0": [("t10", 0.95), ("t11", 0.2)],
+            "t1": [("t12", 0.3), ("t11", 0.2)],
+        },
+    )
+    recommended = rec.get_recommendations(music_db, ["t0", "t1"], top_n=3)
+    assert recommended == ["t10", "t11", "t12"]
+
+
+def test_recommendation_cache(music_db: str) -> None:
+    """Tests cache hits and that an incremental update equals a full one."""
+    assert rec.playlist_fingerprint(["t0", "t1"], 5) == rec.playlist_fingerprint(
+        ["t1", "t0", "t1"], 5
+    )
+    assert rec.playlist_fingerprint(["t0"], 5) != rec.playlist_fingerprint(["t0"], 6)
+
+    store = FeatureStore.from_dataframe(read_features(music_db))
+    cache = LRUCache(max_size=10)
+    first = rec.get_recommendations(
+        music_db, ["t0", "t1"], top_n=5, feature_store=store, result_cache=cache
+    )
+    assert (
+        rec.get_recommendations(
+            music_db, ["t1", "t0"], top_n=5, feature_store=store, result_cache=cache
+        )
+        == first
+    )
+    assert len(cache) == 1
+
+    updates = metrics.CACHE_REQUESTS.value(
+        cache="recommendations", result="incremental"
+    )
+    incremental = rec.get_recommendations(
+        music_db, ["t1", "t0", "t2"], top_n=5, feature_store=store, result_cache=cache
+    )
+    full = rec.get_recommendations(music_db, ["t0", "t1", "t2"], top_n=5)
+    assert incremental == full
+    assert len(cache) == 2
+    assert (
+        metrics.CACHE_REQUESTS.value(cache="recommendations", result="incremental")
+        == updates + 1
+    )
+
+
+def test_recommendation_cache_follows_the_neighbours(music_db: str) -> None:
+    """Tests a track added in the middle and that changed neighbours are used."""
+    _store(
+        music_db,
+        {
+            "t0": [("t10", 0.9), ("t11", 0.1)],
+            "t1": [("t12", 0.8)],
+            "t2": [("t13", 0.7)],
+        },
+    )
+    cache = LRUCache(max_size=10)
+    neighbours = LRUCache(max_size=10)
+    caches = {"result_cache": cache, "neighbour_cache": neighbours}
+    rec.get_recommendations(music_db, ["t0", "t2"], top_n=2, **caches)
+    updates = metrics.CACHE_REQUESTS.value(
+        cache="recommendations", result="incremental"
+    )
+    assert rec.get_recommendations(
+        music_db, ["t0", "t1", "t2"], top_n=2, **caches
+    ) == rec.get_recommendations(music_db, ["t0", "t1", "t2"], top_n=2)
+    assert (
+        metrics.CACHE_REQUESTS.value(cache="recommendations", result="incremental")
+        == updates + 1
+    )
+
+    # Neighbours stored by the writer replace those the entries were built from
+    writer = NeighbourWriter(music_db, flush_interval=0)
+    writer.put("t0", [("t11", 0.95)])
+    assert rec.get_recommendations(music_db, ["t0", "t1"], top_n=2, **caches) == [
+        "t11",
+        "t12",
+    ]
+
+
+def test_caches_follow_the_neighbours_of_other_processes(
+    music_db: str, monkeypatch
+) -> None:
+    """Tests that neighbours replaced by another process reach the caches."""
+    _store(music_db, {"t0": [("t10", 0.9)], "t1": [("t12", 0.8)]})
+    caches = {"result_cache": LRUCache(), "neighbour_cache": LRUCache()}
+    assert rec.get_recommendations(music_db, ["t0", "t1"], top_n=2, **caches) == [
+        "t10",
+        "t12",
+    ]
+    generation = rec.neighbours_generation(music_db)
+
+    # Written like another process does, without neighbours_changed
+    _store(music_db, {"t0": [("t11", 0.95)]})
+    assert rec.get_recommendations(music_db, ["t0", "t1"], top_n=2, **caches) == [
+        "t10",
+        "t12",
+    ]
+    monkeypatch.setattr(rec, "GENERATION_CHECK_INTERVAL", 0)
+    assert rec.neighbours_generation(music_db) == generation + 1
+    assert rec.get_recommendations(music_db, ["t0", "t1"], top_n=2, **caches) == [
+        "t11",
+        "t12",
+    ]
+
+
+def test_fetch_song_neighbors_reads_legacy_neighbours(music_db: str) -> None:
+    """Tests that songs without scored neighbours fall back to similar_songs."""
+    connection = sqlite3.connect(music_db)
+    connection.execute("INSERT INTO similar_songs VALUES ('t1', 't2,t3')")
+    connection.commit()
+    legacy = {"t1": [("t2", 1.0), ("t3", 1.0)]}
+    assert rec.fetch_song_neighbors(connection, ["t0", "t1"]) == legacy
+
+    _store(music_db, {"t0": [("t4", 0.9)]})
+    assert rec.fetch_song_neighbors(connection, ["t0", "t1", "t5"]) == {
+        "t0": [("t4", 0.9)],
+        **legacy,
+    }
+    assert rec.fetch_song_neighbors(connection, ["t0", "t1"], legacy=False) == {
+        "t0": [("t4", 0.9)]
+    }
+    connection.close()
+
+    assert rec.get_recommendations_batch(music_db, [["t0", "t1"]], top_n=3) == [
+        rec.get_recommendations(music_db, ["t0", "t1"], top_n=3)
+    ]
+
+
+def test_batch_matches_single_playlists(music_db: str) -> None:
+    """Tests that the batch equals the recommendations of each playlist."""
+    store = FeatureStore.from_dataframe(read_features(music_db))
+    compute_and_store_neighbors_blocked(music_db, top_n=5, feature_store=store)
+    _store(music_db, {"t9": [("t10", 0.5), ("t11", 0.5)], "t10": [("t9", 0.5)]})
+    connection = sqlite3.connect(music_db)
+    # Tracks without stored neighbours are computed
+    connection.execute("DELETE FROM song_neighbors WHERE track_id IN ('t20', 't21')")
+    connection.commit()
+    connection.close()
+
+    playlists = [
+        ["t0", "t1", "t2"],
+        ["t3"],
+        ["t9", "t10"],
+        ["t5", "t20", "t5"],
+        ["unknown"],
+        [],
+        ["t21"],
+    ]
+    batch = rec.get_recommendations_batch(
+        music_db, playlists, top_n=5, feature_store=store
+    )
+    assert batch == [
+        rec.get_recommendations(music_db, playlist, top_n=5, feature_store=store)
+        for playlist in playlists
+    ]
+    assert batch[2] == ["t11", "t10", "t9"]
+
+
+def test_centroid_recommendations(music_db: str) -> None:
+    """Tests that the closest songs to the playlist centroid are recommended."""
+    store = FeatureStore.from_dataframe(read_features(music_db))
+    playlist = ["t0", "t3", "unknown"]
+    recommended = rec.get_centroid_recommendations(store, playlist, top_n=5)
+
+    centroid = store.normalized[store.rows(["t0", "t3"])].mean(axis=0)
+    scores = store.normalized @ (centroid / np.linalg.norm(centroid))
+    expected = [
+        track_id
+        for track_id in store.track_ids[np.argsort(-scores)]
+        if track_id not in playlist
+    ][:5]
+    assert recommended == expected
+
+    weighted = rec.get_centroid_recommendations(
+        store, ["t0", "t3"], top_n=1, weights=[1.0, 0.0]
+    )
+    assert weighted == [
+        rec.compute_and_store_neighbors(music_db, "t0", top_n=1, feature_store=store)[
+            0
+        ][0]
+    ]
+    assert rec.get_centroid_recommendations(store, ["unknown"]) == []
+
+
+def test_rerank_mmr(music_db: str) -> None:
+    """Tests the caps and that no diversity keeps the ranking."""
+    store = FeatureStore.from_dataframe(read_features(music_db))
+    candidates = [f"t{i}" for i in range(20)]
+    artists = {track_id: "Same artist" for track_id in candidates[:10]}
+    artists.update({track_id: track_id for track_id in candidates[10:]})
+    albums = {track_id: track_id for track_id in candidates}
+
+    assert rec.rerank_mmr(candidates, store, artists, albums, 5, 0.0) == candidates[:5]
+
+    picked = rec.rerank_mmr(
+        candidates, store, artists, albums, 5, diversity=0.0, max_per_artist=2
+    )
+    assert picked == ["t0", "t1", "t10", "t11", "t12"]
+
+    diverse = rec.rerank_mmr(candidates, store, artists, albums, 20, 0.9, 2)
+    assert sorted(diverse) == sorted(candidates)  # the caps are relaxed to fill
@@ -0,0 +1,28 @@
+"""Tests for the song catalog."""
+
+from musicCRS.data.song_catalog import SongCatalog
+
+
+def test_songs_in_requested_order(music_db: str) -> None:
+    """Tests that songs are returned in the order of the track ids."""
+    catalog = SongCatalog(music_db)
+    songs = catalog.get_songs(["t2", "x", "t0"])
+    assert [song.track_id for song in songs] == ["t2", "t0"]
+    assert catalog.get_song("x") is None
+
+
+def test_cache_is_bounded(music_db: str) -> None:
+    """Tests that the least recently used songs are evicted."""
+    catalog = SongCatalog(music_db, cache_size=2)
+    catalog.get_songs(["t0", "t1"])
+    catalog.get_song("t0")
+    catalog.get_song("t2")
+    assert list(catalog._cache) == ["t0", "t2"]
+
+
+def test_cached_songs_skip_the_database(music_db: str) -> None:
+    """Tests that cached songs are served without the database."""
+    catalog = SongCatalog(music_db)
+    song = catalog.get_song("t0")
+    catalog.db_path = "/nonexistent/music.db"
+    assert catalog.get_song("t0") is song
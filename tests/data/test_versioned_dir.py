@@ -0,0 +1,38 @@
+"""Tests for the atomically replaced directories."""
+
+import os
+
+from musicCRS.data import versioned_dir
+from musicCRS.data.feature_store import FeatureStore, read_features
+
+
+def test_save_replaces_the_current_version(
+    music_db: str, feature_store_dir: str
+) -> None:
+    """Tests that a saved store is published and old versions are removed."""
+    store = FeatureStore.from_dataframe(read_features(music_db))
+    store.save(feature_store_dir)
+    first = versioned_dir.resolve(feature_store_dir)
+    opened = FeatureStore.open(feature_store_dir)
+
+    # An unpublished version, e.g. of a crashed build, is not read
+    versioned_dir.new_version(feature_store_dir)
+    assert versioned_dir.resolve(feature_store_dir) == first
+
+    store.save(feature_store_dir)
+    store.save(feature_store_dir)
+    current = versioned_dir.resolve(feature_store_dir)
+    assert current != first
+    assert os.path.islink(os.path.join(feature_store_dir, versioned_dir.CURRENT))
+    versions = [name for name in os.listdir(feature_store_dir) if name.startswith("v")]
+    assert len(versions) == versioned_dir.KEEP_VERSIONS
+    assert os.path.basename(current) in versions
+
+    # A store opened before keeps its mapping
+    assert len(opened) == len(FeatureStore.open(feature_store_dir)) == 30
+    assert opened.features[0, 0] == store.features[0, 0]
+
+
+def test_unversioned_directory(tmp_path) -> None:
+    """Tests that a directory without versions resolves to itself."""
+    assert versioned_dir.resolve(str(tmp_path)) == str(tmp_path)
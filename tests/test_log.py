@@ -0,0 +1,59 @@
+"""Tests for the structured logging."""
+
+import json
+import logging
+
+from musicCRS import log
+from musicCRS.log import JSONFormatter, SamplingFilter
+
+
+def make_record(level: int, **extra) -> logging.LogRecord:
+    """Creates a log record with structured fields."""
+    record = logging.LogRecord(
+        "musicCRS.test", level, __file__, 1, "turn %s", ("x",), None
+    )
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_lines_contain_the_fields() -> None:
+    """Tests that the fields passed with `extra` are written."""
+    line = JSONFormatter().format(
+        make_record(logging.INFO, session_id="abc", latency_ms=12.5)
+    )
+    entry = json.loads(line)
+    assert entry["message"] == "turn x"
+    assert entry["level"] == "INFO"
+    assert entry["session_id"] == "abc"
+    assert entry["latency_ms"] == 12.5
+    assert "function" not in entry
+
+
+def test_sampling_keeps_warnings() -> None:
+    """Tests that sampling drops only records below WARNING."""
+    sampling = SamplingFilter(rate=0.0)
+    assert not sampling.filter(make_record(logging.INFO))
+    assert sampling.filter(make_record(logging.ERROR))
+    assert SamplingFilter(rate=1.0).filter(make_record(logging.DEBUG))
+
+
+def test_queued_records_keep_the_traceback(capsys, monkeypatch) -> None:
+    """Tests that the traceback of a queued record is a field of its own."""
+    logger = logging.getLogger("musicCRS")
+    handlers, level, propagate = list(logger.handlers), logger.level, logger.propagate
+    monkeypatch.setattr(log, "_listener", None)
+    try:
+        log.setup_logging(level="INFO", sample_rate=1.0)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logging.getLogger("musicCRS.test").exception("failed %s", "x")
+        logger.handlers[-1].queue.join()
+    finally:
+        logger.handlers = handlers
+        logger.setLevel(level)
+        logger.propagate = propagate
+
+    entry = json.loads(capsys.readouterr().err.strip().splitlines()[-1])
+    assert entry["message"] == "failed x"
+    assert "ValueError: boom" in entry["exception"]
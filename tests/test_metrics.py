@@ -0,0 +1,81 @@
+"""Tests for the metrics registry."""
+
+import socket
+import urllib.request
+
+import pytest
+
+from musicCRS import metrics
+
+
+def test_counter_and_gauge_rendering() -> None:
+    """Tests the text format of counters and gauges."""
+    registry = metrics.Registry()
+    requests = registry.register(
+        metrics.Counter("requests_total", "Requests.", ["route"])
+    )
+    sessions = registry.register(metrics.Gauge("sessions", "Sessions."))
+    requests.inc(route="/songs")
+    requests.inc(2, route='/a"b')
+    sessions.set_function(lambda: 3)
+
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route="/a\\"b"} 2\n'
+        'requests_total{route="/songs"} 1\n'
+        "# HELP sessions Sessions.\n"
+        "# TYPE sessions gauge\n"
+        "sessions 3\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    """Tests that an observation counts in all buckets above it."""
+    histogram = metrics.Histogram("latency", "Latency.", buckets=(0.1, 1.0))
+    histogram.observe(0.5)
+    histogram.observe(0.05)
+    assert histogram.samples() == [
+        'latency_bucket{le="0.1"} 1',
+        'latency_bucket{le="1"} 2',
+        'latency_bucket{le="+Inf"} 2',
+        "latency_sum 0.55",
+        "latency_count 2",
+    ]
+
+
+def test_wrong_labels_are_rejected() -> None:
+    """Tests that the labels have to match the declared ones."""
+    counter = metrics.Counter("requests_total", "Requests.", ["route"])
+    with pytest.raises(ValueError):
+        counter.inc(status=200)
+
+
+def test_timed_decorator() -> None:
+    """Tests that the decorator observes each call under the function name."""
+    histogram = metrics.Histogram("calls", "Calls.", ["function"])
+
+    @metrics.timed(histogram, "function")
+    def work() -> int:
+        return 1
+
+    assert work() == 1
+    assert histogram.count(function="work") == 1
+
+
+def test_exporter_serves_the_registry() -> None:
+    """Tests the HTTP exporter of the agent process."""
+    assert metrics.start_http_server(0) is None
+
+    metrics.counter("musiccrs_test_total", "Test counter.").inc()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = metrics.start_http_server(port)
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert "musiccrs_test_total 1" in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()